@@ -0,0 +1,27 @@
+"""
+Load benchmark harness.
+
+Everything runs against a local stack: a database seeded by `bench seed`, a
+stand-in for the Cloudinary upload API and img.youtube.com served by
+`bench fakes`, and the app itself under `bench.settings`. Nothing talks to
+the production database or to Cloudinary.
+
+    # 1. fake Cloudinary/YouTube on :8900 (leave running)
+    python -m bench fakes
+
+    # 2. schema + data (about 3.5M rows at the default scale)
+    DJANGO_SETTINGS_MODULE=bench.settings python manage.py migrate
+    python -m bench seed --users 50000
+
+    # 3. the app under test, as the Procfile serves it by default (or
+    #    music.asgi with -k uvicorn_worker.UvicornWorker, as it does with
+    #    WEB_SERVER=asgi, to compare the two)
+    DJANGO_SETTINGS_MODULE=bench.settings gunicorn music.wsgi -w 4 -b 127.0.0.1:8000
+
+    # 4. drive it, then compare two runs
+    python -m bench run --users 50 --duration 60
+    python -m bench compare bench/results/<before>.json bench/results/<after>.json
+
+`BENCH_DATABASE_URL` points the app and the seeder at another database
+(e.g. a local Postgres); the default is bench/bench.sqlite3.
+"""
@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import sys
+
+
+def _django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bench.settings')
+    import django
+    from django.conf import settings
+    django.setup()
+    if not settings.SETTINGS_MODULE.startswith('bench.'):
+        sys.exit(f"Refusing to seed through {settings.SETTINGS_MODULE}; use bench.settings")
+
+
+def seed(args):
+    _django()
+    from .seed import seed
+    seed(users=args.users, journey_users=args.journey_users, random_seed=args.seed)
+
+
+def fakes(args):
+    from .fakes import serve
+    print(f"Fake Cloudinary/YouTube on http://{args.host}:{args.port}")
+    serve(args.host, args.port, latency=args.latency)
+
+
+def run(args):
+    from .runner import format_report, run, save
+    report = run(args.base_url, users=args.users, duration=args.duration, spawn_rate=args.spawn_rate,
+                 think_time=args.think_time, journey_users=args.journey_users, seed=args.seed)
+    print(format_report(report))
+    print(f"\nSaved to {save(report, args.output)}")
+    if report['errors']:
+        print("\nFirst errors:\n  " + '\n  '.join(report['errors']))
+
+
+def compare(args):
+    from .runner import compare
+    with open(args.before) as before, open(args.after) as after:
+        print(compare(json.load(before), json.load(after)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description="Load benchmark harness")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('seed', help="Fill the benchmark database")
+    command.add_argument('--users', type=int, default=50_000)
+    command.add_argument('--journey-users', type=int, default=500,
+                         help="Accounts the journeys log in as (their feeds are built)")
+    command.add_argument('--seed', type=int, default=0)
+    command.set_defaults(handler=seed)
+
+    command = commands.add_parser('fakes', help="Serve the fake Cloudinary/YouTube endpoints")
+    command.add_argument('--host', default='127.0.0.1')
+    command.add_argument('--port', type=int, default=8900)
+    command.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    command.set_defaults(handler=fakes)
+
+    command = commands.add_parser('run', help="Run the journeys against a server")
+    command.add_argument('--base-url', default='http://127.0.0.1:8000')
+    command.add_argument('--users', type=int, default=20)
+    command.add_argument('--duration', type=float, default=60, help="Measured seconds, after ramp-up")
+    command.add_argument('--spawn-rate', type=float, default=10, help="Users started per second")
+    command.add_argument('--think-time', type=float, default=0.5, help="Max seconds between journeys")
+    command.add_argument('--journey-users', type=int, default=500)
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--output', help="Report path (default bench/results/<time>-<commit>.json)")
+    command.set_defaults(handler=run)
+
+    command = commands.add_parser('compare', help="Compare two saved reports")
+    command.add_argument('before')
+    command.add_argument('after')
+    command.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
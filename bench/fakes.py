@@ -0,0 +1,102 @@
+"""
+Local stand-ins for the HTTP services the app calls out to.
+
+- `POST /v1_1/<cloud>/<resource_type>/upload` answers like the Cloudinary
+  upload API, so `songs.storage.CloudinaryStorage` runs unchanged with
+  `upload_prefix` pointed here (see bench.settings).
+- `HEAD|GET /vi/<video id>/<quality>.jpg` answers like img.youtube.com;
+  `maxresdefault` is missing, as it is for most real videos, so thumbnail
+  resolution probes more than once.
+- Any other GET returns a few bytes, for delivery URLs.
+
+`latency` (seconds) is added to every response, to stand in for the round
+trip to the real services.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MISSING_THUMBNAILS = ('maxresdefault',)
+PLACEHOLDER = b'\xff\xd8\xff\xe0bench\xff\xd9'
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/octet-stream', head=False):
+        time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _thumbnail(self, head):
+        quality = self.path.rsplit('/', 1)[-1].split('.')[0]
+        if quality in MISSING_THUMBNAILS:
+            return self._send(404, head=head)
+        return self._send(200, PLACEHOLDER, 'image/jpeg', head=head)
+
+    def do_HEAD(self):
+        if self.path.startswith('/vi/'):
+            return self._thumbnail(head=True)
+        return self._send(200, head=True)
+
+    def do_GET(self):
+        if self.path.startswith('/vi/'):
+            return self._thumbnail(head=False)
+        return self._send(200, PLACEHOLDER)
+
+    def do_POST(self):
+        # /v1_1/<cloud>/<resource_type>/upload
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 4 or parts[3] != 'upload':
+            return self._send(404)
+        # The multipart body is read and thrown away; only its size matters
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 64 * 1024)))
+
+        cloud, resource_type = parts[1], parts[2]
+        if resource_type == 'auto':
+            resource_type = 'image'
+        public_id = f'bench/{uuid.uuid4().hex}'
+        version = int(time.time())
+        url = f'res.cloudinary.com/{cloud}/{resource_type}/upload/v{version}/{public_id}.jpg'
+        body = {
+            'public_id': public_id,
+            'version': version,
+            'resource_type': resource_type,
+            'type': 'upload',
+            'format': 'jpg',
+            'width': 1280,
+            'height': 720,
+            'bytes': int(self.headers.get('Content-Length') or 0),
+            'url': f'http://{url}',
+            'secure_url': f'https://{url}',
+        }
+        if resource_type == 'video':
+            body['duration'] = 30.0
+        self._send(200, json.dumps(body).encode(), 'application/json')
+
+
+def serve(host='127.0.0.1', port=8900, latency=0.0, background=False):
+    """Start the fake services; blocks unless `background`, which returns the server."""
+    handler = type('Handler', (FakeServicesHandler,), {'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,128 @@
+"""
+Scripted user journeys, in the spirit of a locustfile.
+
+Each virtual user logs in once through `TokenObtainPairView` and then keeps
+picking a journey, weighted by `@journey(weight)`, until the run ends.
+Journeys find the ids they act on by reading the API like the app does
+(the feed for posts, the product list for the cart), never from the
+database.
+
+Requests are recorded under a name with ids replaced by `{id}`, so every
+post shares one `POST /api/social-posts/{id}/like/` line in the report.
+"""
+import time
+
+import requests
+
+# Seeded accounts (see bench.seed)
+BENCH_PASSWORD = 'bench-password'
+JOURNEYS = []
+
+
+def username(n):
+    return f'bench{n}'
+
+
+def journey(weight):
+    def register(function):
+        JOURNEYS.append((function, weight))
+        return function
+    return register
+
+
+class RequestFailed(Exception):
+    pass
+
+
+class VirtualUser:
+    def __init__(self, base_url, account, stats, rng):
+        self.base_url = base_url.rstrip('/')
+        self.account = account
+        self.stats = stats
+        self.rng = rng
+        self.session = requests.Session()
+        self.post_ids = []
+        self.track_ids = []
+        self.product_ids = []
+
+    def request(self, method, path, name=None, expect=(200, 201), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=30, **kwargs)
+        except requests.RequestException as exc:
+            self.stats.record(f'{method} {name or path}', time.perf_counter() - started, False)
+            raise RequestFailed(str(exc)) from exc
+        ok = response.status_code in expect
+        self.stats.record(f'{method} {name or path}', time.perf_counter() - started, ok,
+                          len(response.content))
+        if not ok:
+            raise RequestFailed(f'{method} {path}: {response.status_code}')
+        return response.json() if response.content else None
+
+    def get(self, path, name=None, **kwargs):
+        return self.request('GET', path, name, **kwargs)
+
+    def post(self, path, name=None, **kwargs):
+        return self.request('POST', path, name, **kwargs)
+
+    def login(self):
+        tokens = self.post('/api/auth/token/', json={
+            'username': username(self.account),
+            'password': BENCH_PASSWORD,
+        })
+        self.session.headers['Authorization'] = f"Bearer {tokens['access']}"
+
+    def run_one(self):
+        functions, weights = zip(*JOURNEYS)
+        self.rng.choices(functions, weights)[0](self)
+
+
+def _results(payload):
+    return payload['results'] if isinstance(payload, dict) else payload
+
+
+@journey(5)
+def browse_feed(user):
+    posts = _results(user.get('/api/social-posts/feed/'))
+    user.post_ids = [post['id'] for post in posts] or user.post_ids
+    user.get('/api/notifications/unread_count/')
+
+
+@journey(3)
+def like_post(user):
+    if not user.post_ids:
+        return browse_feed(user)
+    post_id = user.rng.choice(user.post_ids)
+    user.post(f'/api/social-posts/{post_id}/like/', '/api/social-posts/{id}/like/')
+
+
+@journey(2)
+def comment_on_post(user):
+    if not user.post_ids:
+        return browse_feed(user)
+    post_id = user.rng.choice(user.post_ids)
+    user.post(f'/api/social-posts/{post_id}/comment/', '/api/social-posts/{id}/comment/',
+              json={'content': 'Benchmark comment'})
+    user.get(f'/api/social-posts/{post_id}/comments/', '/api/social-posts/{id}/comments/')
+
+
+@journey(3)
+def browse_tracks(user):
+    tracks = _results(user.get('/api/tracks/'))
+    user.track_ids = [track['id'] for track in tracks] or user.track_ids
+    if user.track_ids:
+        track_id = user.rng.choice(user.track_ids)
+        user.get(f'/api/tracks/{track_id}/', '/api/tracks/{id}/')
+        user.post(f'/api/tracks/{track_id}/toggle-like/', '/api/tracks/{id}/toggle-like/')
+
+
+@journey(1)
+def shop_and_checkout(user):
+    products = _results(user.get('/api/marketplace/products/'))
+    user.product_ids = [product['id'] for product in products] or user.product_ids
+    if not user.product_ids:
+        return
+    for product_id in user.rng.sample(user.product_ids, min(2, len(user.product_ids))):
+        user.post('/api/marketplace/cart/add-item/', json={'product_id': product_id, 'quantity': 1})
+    user.get('/api/marketplace/cart/my_cart/')
+    user.post('/api/marketplace/cart/checkout/')
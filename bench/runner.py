@@ -0,0 +1,178 @@
+"""
+Runs the journeys against a live server and reports per-endpoint latency
+percentiles and throughput.
+
+Each virtual user is a thread. Users start `spawn_rate` per second, log in,
+then run journeys with up to `think_time` seconds between them until
+`duration` runs out. Requests are only recorded once the last user has
+been started, so the ramp-up doesn't skew the numbers.
+
+Reports are JSON, named after the time and commit they were taken at, so
+two runs can be put side by side with `compare`.
+"""
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .journeys import RequestFailed, VirtualUser
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+PERCENTILES = (50, 95, 99)
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.recording = False
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    def record(self, name, seconds, ok, size=0):
+        if not self.recording:
+            return
+        with self._lock:
+            self.latencies[name].append(seconds * 1000)
+            self.bytes[name] += size
+            if not ok:
+                self.failures[name] += 1
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def _summary(latencies, failures, size, elapsed):
+    ordered = sorted(latencies)
+    summary = {
+        'requests': len(ordered),
+        'failures': failures,
+        'rps': round(len(ordered) / elapsed, 2),
+        'mean_ms': round(sum(ordered) / len(ordered), 2) if ordered else None,
+        'max_ms': round(ordered[-1], 2) if ordered else None,
+        'avg_bytes': size // len(ordered) if ordered else 0,
+    }
+    for p in PERCENTILES:
+        value = percentile(ordered, p)
+        summary[f'p{p}_ms'] = round(value, 2) if value is not None else None
+    return summary
+
+
+def _commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def _virtual_user(base_url, account, stats, seed, deadline, think_time, errors):
+    user = VirtualUser(base_url, account, stats, random.Random(seed))
+    try:
+        user.login()
+    except RequestFailed as exc:
+        errors.append(str(exc))
+        return
+    while time.monotonic() < deadline:
+        try:
+            user.run_one()
+        except RequestFailed as exc:
+            errors.append(str(exc))
+        if think_time:
+            time.sleep(user.rng.uniform(0, think_time))
+
+
+def run(base_url, users=20, duration=60, spawn_rate=10, think_time=0.5, journey_users=500, seed=0):
+    stats, errors = Stats(), []
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    ramp_up = users / spawn_rate
+    deadline = time.monotonic() + ramp_up + duration
+    threads = []
+    for n in range(users):
+        thread = threading.Thread(
+            target=_virtual_user,
+            args=(base_url, n % journey_users, stats, seed + n, deadline, think_time, errors),
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+        time.sleep(1 / spawn_rate)
+
+    stats.recording = True
+    measured_from = time.monotonic()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - measured_from
+
+    endpoints = {
+        name: _summary(latencies, stats.failures[name], stats.bytes[name], elapsed)
+        for name, latencies in sorted(stats.latencies.items())
+    }
+    everything = [latency for latencies in stats.latencies.values() for latency in latencies]
+    return {
+        'commit': _commit(),
+        'started_at': started_at,
+        'base_url': base_url,
+        'users': users,
+        'duration_s': round(elapsed, 1),
+        'think_time_s': think_time,
+        'total': _summary(everything, sum(stats.failures.values()), sum(stats.bytes.values()), elapsed),
+        'endpoints': endpoints,
+        'errors': errors[:20],
+    }
+
+
+def save(report, path=None):
+    if path is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = report['started_at'].replace(':', '').replace('+0000', 'Z')
+        path = RESULTS_DIR / f"{stamp}-{report['commit']}.json"
+    Path(path).write_text(json.dumps(report, indent=2) + '\n')
+    return path
+
+
+def format_report(report):
+    header = f"{'endpoint':<48} {'reqs':>7} {'fail':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    lines = [f"{report['commit']}  {report['users']} users  {report['duration_s']}s", header]
+    rows = list(report['endpoints'].items()) + [('total', report['total'])]
+    for name, row in rows:
+        lines.append(
+            f"{name:<48} {row['requests']:>7} {row['failures']:>5} {row['rps']:>8} "
+            f"{row['p50_ms'] or '-':>8} {row['p95_ms'] or '-':>8} {row['p99_ms'] or '-':>8}"
+        )
+    return '\n'.join(lines)
+
+
+def _change(before, after):
+    if not before or after is None:
+        return '-'
+    return f'{(after - before) / before * 100:+.0f}%'
+
+
+def compare(before, after):
+    """Per-endpoint p95 and throughput of `after` relative to `before` (both reports)."""
+    header = f"{'endpoint':<48} {'p95 before':>10} {'p95 after':>10} {'':>6} {'rps before':>10} {'rps after':>10} {'':>6}"
+    lines = [f"{before['commit']} -> {after['commit']}", header]
+    names = sorted(set(before['endpoints']) | set(after['endpoints']))
+    for name in names + ['total']:
+        old = before['total'] if name == 'total' else before['endpoints'].get(name, {})
+        new = after['total'] if name == 'total' else after['endpoints'].get(name, {})
+        lines.append(
+            f"{name:<48} {old.get('p95_ms') or '-':>10} {new.get('p95_ms') or '-':>10} "
+            f"{_change(old.get('p95_ms'), new.get('p95_ms')):>6} "
+            f"{old.get('rps', '-'):>10} {new.get('rps', '-'):>10} "
+            f"{_change(old.get('rps'), new.get('rps')):>6}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,178 @@
+"""
+Bulk data generator for the benchmark database.
+
+Rows are written with bulk_create in batches, which skips model signals, so
+the denormalized counters are reconciled and the feeds of the journey
+accounts rebuilt once everything is in. Output is deterministic for a given
+`random_seed`.
+
+Accounts are named `bench<n>` and share the password `BENCH_PASSWORD`; the
+first `journey_users` of them are the ones the load journeys log in as.
+"""
+import random
+import sys
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from songs.counters import reconcile_counters
+from songs.feed import rebuild_feed
+from songs.models import (
+    Comment, Like, Notification, Playlist, PostComment, PostLike, PostSave,
+    Product, ProductCategory, ProductImage, Profile, SocialPost, Track, User,
+)
+
+from .journeys import BENCH_PASSWORD, username
+
+BATCH_SIZE = 5000
+
+# Rows per user; at 50,000 users this comes to about 3.5M rows
+PER_USER = {
+    'follows': 20,
+    'tracks': 1,
+    'track_likes': 5,
+    'track_comments': 2,
+    'playlists': 0.5,
+    'posts': 3,
+    'post_likes': 20,
+    'post_comments': 5,
+    'post_saves': 2,
+    'products': 0.4,
+    'notifications': 10,
+}
+
+
+def _insert(model, rows, stdout, ignore_conflicts=False):
+    """bulk_create `rows` (an iterable) in batches; returns the number written."""
+    started, written, batch = time.monotonic(), 0, []
+
+    def flush():
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=BATCH_SIZE, ignore_conflicts=ignore_conflicts)
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            flush()
+            written += len(batch)
+            batch = []
+    if batch:
+        flush()
+        written += len(batch)
+    stdout.write(f"  {model.__name__}: {written} rows in {time.monotonic() - started:.1f}s\n")
+    return written
+
+
+def _ids(queryset):
+    return list(queryset.order_by('id').values_list('id', flat=True))
+
+
+def _pairs(rng, count, left, right):
+    """`count` random (left, right) id pairs; duplicates are dropped on insert."""
+    for _ in range(count):
+        yield rng.choice(left), rng.choice(right)
+
+
+def seed(users=50_000, journey_users=500, random_seed=0, stdout=None):
+    stdout = stdout or sys.stdout
+    rng = random.Random(random_seed)
+    if User.objects.filter(username=username(0)).exists():
+        raise SystemExit("The benchmark database is already seeded; flush it first")
+
+    def count(name):
+        return int(users * PER_USER[name])
+
+    password = make_password(BENCH_PASSWORD)
+    _insert(User, (
+        User(username=username(n), email=f'{username(n)}@bench.invalid', password=password,
+             bio=f'Benchmark account {n}')
+        for n in range(users)
+    ), stdout)
+    user_ids = _ids(User.objects.filter(email__endswith='@bench.invalid'))
+    _insert(Profile, (Profile(user_id=user_id, bio='Benchmark profile') for user_id in user_ids), stdout)
+
+    # `a.followers` holds the users following `a`: from_user is the one followed
+    Follow = User.followers.through
+    _insert(Follow, (
+        Follow(from_user_id=followed, to_user_id=follower)
+        for followed, follower in _pairs(rng, count('follows'), user_ids, user_ids)
+        if followed != follower
+    ), stdout, ignore_conflicts=True)
+
+    _insert(Track, (
+        Track(title=f'Bench track {n}', slug=f'bench-track-{n}', artist_id=rng.choice(user_ids),
+              audio_file=f'bench/audio/{n}', cover_image=f'bench/covers/{n}',
+              album=f'Album {n % 1000}', views=rng.randrange(10_000))
+        for n in range(count('tracks'))
+    ), stdout)
+    track_ids = _ids(Track.objects.filter(slug__startswith='bench-track-'))
+    _insert(Like, (
+        Like(user_id=user_id, track_id=track_id)
+        for user_id, track_id in _pairs(rng, count('track_likes'), user_ids, track_ids)
+    ), stdout, ignore_conflicts=True)
+    _insert(Comment, (
+        Comment(user_id=user_id, track_id=track_id, content='Benchmark comment')
+        for user_id, track_id in _pairs(rng, count('track_comments'), user_ids, track_ids)
+    ), stdout)
+    _insert(Playlist, (
+        Playlist(user_id=rng.choice(user_ids), name=f'Bench playlist {n}')
+        for n in range(count('playlists'))
+    ), stdout)
+    playlist_ids = _ids(Playlist.objects.filter(name__startswith='Bench playlist'))
+    PlaylistTrack = Playlist.tracks.through
+    _insert(PlaylistTrack, (
+        PlaylistTrack(playlist_id=playlist_id, track_id=track_id)
+        for playlist_id in playlist_ids
+        for track_id in rng.sample(track_ids, min(10, len(track_ids)))
+    ), stdout, ignore_conflicts=True)
+
+    _insert(SocialPost, (
+        SocialPost(user_id=rng.choice(user_ids), content_type='image',
+                   media_file=f'bench/social_media/{n}', caption=f'Bench post {n}',
+                   song_id=rng.choice(track_ids) if n % 4 == 0 else None,
+                   width=1280, height=720)
+        for n in range(count('posts'))
+    ), stdout)
+    post_ids = _ids(SocialPost.objects.filter(caption__startswith='Bench post'))
+    _insert(PostLike, (
+        PostLike(user_id=user_id, post_id=post_id)
+        for user_id, post_id in _pairs(rng, count('post_likes'), user_ids, post_ids)
+    ), stdout, ignore_conflicts=True)
+    _insert(PostComment, (
+        PostComment(user_id=user_id, post_id=post_id, content='Benchmark comment')
+        for user_id, post_id in _pairs(rng, count('post_comments'), user_ids, post_ids)
+    ), stdout)
+    _insert(PostSave, (
+        PostSave(user_id=user_id, post_id=post_id)
+        for user_id, post_id in _pairs(rng, count('post_saves'), user_ids, post_ids)
+    ), stdout, ignore_conflicts=True)
+
+    category, _ = ProductCategory.objects.get_or_create(name='Bench')
+    _insert(Product, (
+        Product(seller_id=rng.choice(user_ids), title=f'Bench product {n}', slug=f'bench-product-{n}',
+                description='Benchmark product', price=rng.randrange(100, 10_000) / 100,
+                quantity=1_000_000, category=category)
+        for n in range(count('products'))
+    ), stdout)
+    product_ids = _ids(Product.objects.filter(slug__startswith='bench-product-'))
+    _insert(ProductImage, (
+        ProductImage(product_id=product_id, image=f'bench/products/{product_id}-{i}', is_primary=i == 0)
+        for product_id in product_ids
+        for i in range(2)
+    ), stdout)
+
+    kinds = ('like', 'comment', 'follow')
+    _insert(Notification, (
+        Notification(recipient_id=recipient, sender_id=sender, notification_type=kinds[n % 3],
+                     message='Benchmark notification',
+                     post_id=rng.choice(post_ids) if n % 3 != 2 else None)
+        for n, (recipient, sender) in enumerate(_pairs(rng, count('notifications'), user_ids, user_ids))
+    ), stdout)
+
+    started = time.monotonic()
+    for model_name, field, drifted in reconcile_counters():
+        stdout.write(f"  {model_name}.{field}: {drifted} counters set\n")
+    for user in User.objects.filter(id__in=user_ids[:journey_users]):
+        rebuild_feed(user)
+    stdout.write(f"  counters and {min(journey_users, users)} feeds in {time.monotonic() - started:.1f}s\n")
@@ -0,0 +1,56 @@
+"""
+Settings for running the app under benchmark: the regular settings, with the
+database and every outside service pointed at local stand-ins.
+"""
+import os
+
+import cloudinary
+import dj_database_url
+
+from music.settings import *  # noqa: F401,F403
+from music.settings import BASE_DIR
+
+# Never the DATABASE_URL from .env
+DATABASES = {
+    'default': dj_database_url.parse(
+        os.getenv('BENCH_DATABASE_URL', f"sqlite:///{BASE_DIR / 'bench' / 'bench.sqlite3'}"),
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', 600)),
+    )
+}
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Concurrent writers otherwise fail with "database is locked"; use
+    # Postgres for numbers worth comparing with production
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': 30,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+    }
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+FAKE_SERVICES_URL = os.getenv('BENCH_FAKES_URL', 'http://127.0.0.1:8900').rstrip('/')
+
+# Uploads go through the real Cloudinary client to the fake upload API
+cloudinary.config(
+    cloud_name='bench',
+    api_key='bench',
+    api_secret='bench',
+    upload_prefix=FAKE_SERVICES_URL,
+    secure=True,
+)
+CLOUDINARY_STORAGE = {
+    'CLOUD_NAME': 'bench',
+    'API_KEY': 'bench',
+    'API_SECRET': 'bench',
+}
+MEDIA_STORAGE_BACKEND = 'songs.storage.CloudinaryStorage'
+YOUTUBE_THUMBNAIL_BASE_URL = f'{FAKE_SERVICES_URL}/vi'
+
+# Logging every request to debug.log would be what we measure
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+}
@@ -2,6 +2,11 @@
 ASGI config for music project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The Procfile serves it through uvicorn workers under gunicorn when
+WEB_SERVER=asgi; WSGI stays the default. Views that await I/O (uploads,
+the feed, live event creation; see songs.asyncviews) then do not hold a
+worker while they wait, and request bodies from slow clients are read on
+the event loop before any view runs.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -14,3 +19,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music.settings')
 
 application = get_asgi_application()
+
+# Build the typeahead index (songs.autocomplete) as the worker starts, and
+# flush written-behind hit counters (songs.hits) on a timer and at exit
+from songs import autocomplete, hits  # noqa: E402
+
+autocomplete.warm()
+hits.start_flusher()
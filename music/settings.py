@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from datetime import timedelta
 import cloudinary
 import cloudinary.uploader
@@ -89,6 +90,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'songs.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -104,6 +106,9 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.MultiPartParser',
         'rest_framework.parsers.FormParser',
     ),
+    # Keyset pagination on (created_at, id) for every list endpoint
+    'DEFAULT_PAGINATION_CLASS': 'songs.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 20,
 }
 ROOT_URLCONF = 'music.urls'
 
@@ -141,7 +146,13 @@ SIMPLE_JWT = {
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv('DATABASE_URL'),
-        conn_max_age=600,
+        # Connections are kept per thread. Under WSGI that is one per
+        # gunicorn worker. Under ASGI (WEB_SERVER=asgi, see music/asgi.py)
+        # sync code runs in executor threads, each holding its own
+        # connection for up to this long, so a worker can keep several
+        # open. Set DB_CONN_MAX_AGE=0 there if that outgrows the database's
+        # connection limit, at the cost of a new connection per request.
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', 600)),
         ssl_require=True  # Essential for Supabase
     )
 }
@@ -182,13 +193,48 @@ USE_TZ = True
 
 # Cache hymns API for 1 hour
 HYMN_CACHE_TIMEOUT = 60 * 60
+
+# Shared cache so every worker sees the same entries. Redis when REDIS_URL
+# is set (needs the `redis` package), otherwise a directory on local disk
+# shared by the workers of one host. Test runs use a private in-memory cache.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'light2',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / '.django_cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+# Unread badge counters (songs.unread_counts) are shifted with INCR, which
+# the file-based cache does as a read then a write, so concurrent workers
+# lose updates. Without Redis the badge is counted in the database instead.
+UNREAD_COUNT_CACHED = bool(REDIS_URL)
+if 'test' in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    UNREAD_COUNT_CACHED = True
+# Lifetime of cache-aside entries for categories, churches, choirs, studios
+CACHE_ASIDE_TIMEOUT = 60 * 15
 STATIC_URL = 'static/'
 
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
+# Larger files are streamed to a temporary file instead of held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
 
@@ -217,30 +263,100 @@ CLOUDINARY_UPLOAD_OPTIONS = {
     'timeout': 30000  # 30 seconds timeout
 }
 
-# In your settings.py
+# Logging (see songs.log): request threads only queue records, a listener
+# thread writes them as JSON lines. Records below WARNING are kept at
+# LOG_SAMPLE_RATE; LOG_LEVELS sets levels per module, e.g.
+# LOG_LEVELS="songs.views=DEBUG,django.db.backends=DEBUG"
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+LOG_LEVELS = dict(
+    item.strip().split('=', 1) for item in os.getenv('LOG_LEVELS', '').split(',') if '=' in item
+)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'songs.log.JsonFormatter'},
+        'message': {'format': '%(message)s'},
+    },
+    'filters': {
+        'sample': {'()': 'songs.log.SamplingFilter', 'rate': LOG_SAMPLE_RATE},
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
+            'formatter': 'json',
         },
         'file': {
-            'level': 'DEBUG',
             'class': 'logging.FileHandler',
             'filename': 'debug.log',
+            'formatter': 'json',
+        },
+        'profiling': {
+            'class': 'logging.FileHandler',
+            'filename': 'profiling.jsonl',
+            'formatter': 'message',
+        },
+        # Named to sort after the handlers they feed
+        'queue': {
+            '()': 'songs.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'filters': ['sample'],
+        },
+        'queue_profiling': {
+            '()': 'songs.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.profiling'],
         },
     },
     'loggers': {
         '': {  # root logger
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': True,
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
         },
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        # One JSON line per sampled request, see songs.profiling
+        'songs.profiling': {
+            'handlers': ['queue_profiling'],
             'level': 'INFO',
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
+for name, level in LOG_LEVELS.items():
+    LOGGING['loggers'].setdefault(name, {})['level'] = level.strip().upper()
+# Posts copied into a follower's feed when they follow someone
+FEED_BACKFILL_LIMIT = 200
+# Worker threads for slow side work such as thumbnail probes
+BACKGROUND_WORKERS = 4
+BACKGROUND_TASKS_EAGER = False
+# Text search configuration for track search on PostgreSQL (songs.search);
+# run rebuild_search_index after changing it
+SEARCH_CONFIG = 'english'
+# Workers rebuild their in-memory typeahead index (songs.autocomplete) this
+# often, in seconds, to pick up changes saved by other workers
+AUTOCOMPLETE_REFRESH_INTERVAL = 300
+# Track/product/live event view counters are written behind (songs.hits):
+# hits are flushed this often, or once this many hits are pending
+HIT_COUNTERS_FLUSH_INTERVAL = 10
+HIT_COUNTERS_MAX_PENDING = 5000
+# /api/tracks/analytics/ covers an artist's latest this many tracks
+ANALYTICS_MAX_TRACKS = 50
+YOUTUBE_THUMBNAIL_BASE_URL = 'https://img.youtube.com/vi'
+# Upload pipeline: files are spooled here, then pushed to MEDIA_STORAGE_BACKEND
+# by background workers (songs.storage.LocalFileStorage keeps them under MEDIA_ROOT)
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR')
+MEDIA_STORAGE_BACKEND = os.getenv('MEDIA_STORAGE_BACKEND', 'songs.storage.CloudinaryStorage')
+# recover_uploads fails rows still pending, and deletes spooled files, after
+# this many minutes: their worker died before finishing the upload
+UPLOAD_STALE_MINUTES = 30
+# Per-request profiling (songs.profiling): Server-Timing headers on every
+# response; this share of requests, and every one slower than
+# PROFILING_SLOW_MS, is written to profiling.jsonl
+PROFILING_ENABLED = True
+PROFILING_SERVER_TIMING = True
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_SLOW_MS = 500
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music.settings')
 
 application = get_wsgi_application()
+
+# Build the typeahead index (songs.autocomplete) as the worker starts, and
+# flush written-behind hit counters (songs.hits) on a timer and at exit
+from songs import autocomplete, hits  # noqa: E402
+
+autocomplete.warm()
+hits.start_flusher()
@@ -0,0 +1,64 @@
+"""
+`async def` handlers and actions on DRF views.
+
+DRF's APIView dispatch is synchronous. `AsyncViewMixin` replaces it with a
+coroutine: authentication, permissions and throttling still run as DRF
+does them (in a worker thread, since they may hit the database), then an
+`async def` handler is awaited on the event loop while any remaining sync
+handler of the same view (a viewset's `list`, say) runs in a thread. So a
+viewset can make just its slow actions async.
+
+Under ASGI (see music/asgi.py) a request waiting on an async handler holds
+no thread. Under WSGI Django runs the coroutine to completion in the
+request's own thread, and sync handlers keep using that thread's database
+connection, so nothing changes for the test client or a sync deployment.
+
+Inside async handlers, use the async ORM (`aget`, `acreate`, `async for`)
+and wrap serializer work in `sync_to_async`: serializers read the database
+lazily.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+
+class AsyncViewMixin:
+    # Tells Django's View.as_view the view is a coroutine function
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        view = super().as_view(*args, **initkwargs)
+        # ViewSetMixin.as_view builds its own view function, unmarked
+        return markcoroutinefunction(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = await sync_to_async(self.handle_exception)(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def request_data(request):
+    """`request.data`; parsing a multipart body writes the files out to disk."""
+    return await sync_to_async(lambda: request.data)()
+
+
+async def serializer_data(serializer):
+    """`serializer.data`; related fields that were not prefetched are queried for."""
+    return await sync_to_async(lambda: serializer.data)()
@@ -0,0 +1,206 @@
+"""
+Typeahead completions for usernames, track titles and product titles.
+
+Each worker keeps one sorted array of (key, pk) pairs per kind. Keys are
+the casefolded name and, for titles, every word-initial tail of it
+("amazing grace", "grace"), so a completion is one bisection and a short
+scan, without a database round trip.
+
+The arrays are built in the background when a server worker starts
+(music/asgi.py and music/wsgi.py call warm(); AppConfig.ready() does not,
+as it also runs for management commands and tests), or on the first
+completion otherwise. They are patched by signals for changes committed
+in this worker, and rebuilt every AUTOCOMPLETE_REFRESH_INTERVAL seconds
+to pick up other workers' changes. Until its first build is done a worker
+completes from the database instead; on PostgreSQL those prefix LIKE
+queries are served by trigram indexes (migration 0025).
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .background import submit
+from .models import UPLOAD_READY, Product, Track, User
+
+# kind -> (model, completed field, lookup field, filter for the rows
+# offered, whether every word of the field is a completion point)
+SOURCES = {
+    'user': (User, 'username', 'pk', {'is_active': True}, False),
+    'track': (Track, 'title', 'pk', {'upload_status': UPLOAD_READY}, True),
+    'product': (Product, 'title', 'slug', {}, True),
+}
+
+
+def _normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    def __init__(self, words=False):
+        self.words = words
+        self._keys = []  # sorted (key, pk)
+        self._entries = {}  # pk -> (label, lookup, keys)
+        self._changed = None  # pk -> (label, lookup) or None, while loading
+        self._lock = threading.Lock()
+
+    def _keys_for(self, label):
+        text = _normalize(label)
+        if not text or not self.words:
+            return [text] if text else []
+        words = text.split(' ')
+        return sorted({' '.join(words[start:]) for start in range(len(words))})
+
+    def load(self, rows):
+        """
+        Replace the contents with `rows` of (pk, label, lookup).
+
+        `rows` may be read before a concurrent put() or discard() was
+        committed, so those are recorded while loading and applied again
+        on top of the loaded rows.
+        """
+        with self._lock:
+            self._changed = {}
+        keys, entries = [], {}
+        try:
+            for pk, label, lookup in rows:
+                own = self._keys_for(label)
+                entries[pk] = (label, str(lookup), own)
+                keys.extend((key, pk) for key in own)
+            keys.sort()
+        except BaseException:
+            with self._lock:
+                self._changed = None
+            raise
+        with self._lock:
+            self._keys, self._entries = keys, entries
+            changed, self._changed = self._changed, None
+            for pk, entry in changed.items():
+                self._discard(pk)
+                if entry is not None:
+                    self._put(pk, *entry)
+
+    def put(self, pk, label, lookup):
+        with self._lock:
+            if self._changed is not None:
+                self._changed[pk] = (label, lookup)
+            self._discard(pk)
+            self._put(pk, label, lookup)
+
+    def discard(self, pk):
+        with self._lock:
+            if self._changed is not None:
+                self._changed[pk] = None
+            self._discard(pk)
+
+    def _put(self, pk, label, lookup):
+        own = self._keys_for(label)
+        self._entries[pk] = (label, str(lookup), own)
+        for key in own:
+            bisect.insort(self._keys, (key, pk))
+
+    def _discard(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            del self._keys[bisect.bisect_left(self._keys, (key, pk))]
+
+    def complete(self, prefix, limit):
+        """[(pk, label, lookup)] of up to `limit` entries with a key starting with `prefix`."""
+        prefix = _normalize(prefix)
+        results, seen = [], set()
+        with self._lock:
+            # (prefix,) sorts before every (key, pk) with key >= prefix
+            position = bisect.bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, pk = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    label, lookup, _ = self._entries[pk]
+                    results.append((pk, label, lookup))
+                position += 1
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_indexes = {kind: PrefixIndex(words) for kind, (*_, words) in SOURCES.items()}
+_state_lock = threading.Lock()
+_built_at = None  # time.monotonic() of the last finished build
+_building = False
+
+
+def warm():
+    """Start a background (re)build of the indexes, unless one is running."""
+    global _building
+    with _state_lock:
+        if _building:
+            return
+        _building = True
+    submit(rebuild)
+
+
+def _rows(kind):
+    model, field, lookup, filters, _ = SOURCES[kind]
+    rows = model.objects.filter(**filters)
+    if lookup == 'pk':
+        # values_list() would fold the repeated pk column into one
+        return ((pk, label, pk) for pk, label in rows.values_list('pk', field).iterator(chunk_size=5000))
+    return rows.values_list('pk', field, lookup).iterator(chunk_size=5000)
+
+
+def rebuild():
+    """Load every kind's index from the database."""
+    global _built_at, _building
+    try:
+        for kind in SOURCES:
+            _indexes[kind].load(_rows(kind))
+        _built_at = time.monotonic()
+    finally:
+        _building = False
+
+
+def offered(kind, instance):
+    """Whether `instance` is one of the `kind` rows completions come from."""
+    filters = SOURCES[kind][3]
+    return all(getattr(instance, name) == value for name, value in filters.items())
+
+
+def refresh(kind, instance):
+    """Bring `instance`'s completion up to date after it was saved."""
+    _, field, lookup, _, _ = SOURCES[kind]
+    if offered(kind, instance):
+        _indexes[kind].put(instance.pk, getattr(instance, field), getattr(instance, lookup))
+    else:
+        _indexes[kind].discard(instance.pk)
+
+
+def discard(kind, pk):
+    _indexes[kind].discard(pk)
+
+
+def complete(kind, prefix, limit=10):
+    """[(pk, label, lookup)] of `kind` whose name, or a word in a title, starts with `prefix`."""
+    if _built_at is None or time.monotonic() - _built_at >= getattr(settings, 'AUTOCOMPLETE_REFRESH_INTERVAL', 300):
+        warm()
+    if _built_at is None:
+        return _complete_from_database(kind, prefix, limit)
+    return _indexes[kind].complete(prefix, limit)
+
+
+def _complete_from_database(kind, prefix, limit):
+    model, field, lookup, filters, words = SOURCES[kind]
+    prefix = _normalize(prefix)
+    matches = Q(**{f'{field}__istartswith': prefix})
+    if words:
+        matches |= Q(**{f'{field}__icontains': f' {prefix}'})
+    rows = model.objects.filter(matches, **filters).order_by(Lower(field), 'pk')
+    columns = [field] if lookup == 'pk' else [field, lookup]
+    return [(obj.pk, getattr(obj, field), str(getattr(obj, lookup))) for obj in rows.only(*columns)[:limit]]
@@ -0,0 +1,53 @@
+"""
+Small in-process worker pool for slow side work (network probes, uploads)
+that must not hold up the request or its transaction.
+
+Tasks run on a bounded thread pool. With `BACKGROUND_TASKS_EAGER = True`
+they run inline instead, which keeps tests deterministic.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_WORKERS', 4),
+                    thread_name_prefix='songs-background'
+                )
+    return _executor
+
+
+def _run(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, '__name__', fn))
+    finally:
+        # Worker threads get their own DB connection; don't leak it
+        close_old_connections()
+
+
+def submit(fn, *args, **kwargs):
+    """Run `fn` on the worker pool, or inline in eager mode."""
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        fn(*args, **kwargs)
+        return None
+    return _get_executor().submit(_run, fn, args, kwargs)
+
+
+def submit_on_commit(fn, *args, **kwargs):
+    """Queue `fn` once the current transaction commits, so it sees the rows."""
+    transaction.on_commit(lambda: submit(fn, *args, **kwargs))
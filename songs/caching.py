@@ -0,0 +1,70 @@
+"""
+Cache-aside reads for read-heavy, rarely-changing endpoints.
+
+Entries are keyed by a per-namespace version stored in the cache.
+Invalidating a namespace is a single SET of a fresh version: stale entries
+are never read again and simply expire. It is a SET rather than an INCR
+because on the file-based cache INCR is a read and a write, and a
+concurrent bump in another process could write back the old version.
+`post_save`/`post_delete` on the models a namespace is built from bump it
+(see signals.py).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category, Choir, Church, LiveEvent, ProductCategory, Profile, User, Videostudio
+
+CATEGORIES = 'categories'
+PRODUCT_CATEGORIES = 'product_categories'
+CHURCHES = 'churches'
+CHOIRS = 'choirs'
+VIDEO_STUDIOS = 'video_studios'
+FEATURED_LIVE_EVENTS = 'featured_live_events'
+
+# namespace -> models whose changes invalidate it; profiles and users are
+# included where the cached payload embeds the creator's picture and
+# username (users only count when renamed, see signals.py)
+NAMESPACES = {
+    CATEGORIES: (Category,),
+    PRODUCT_CATEGORIES: (ProductCategory,),
+    CHURCHES: (Church, Profile, User),
+    CHOIRS: (Choir, Profile, User),
+    VIDEO_STUDIOS: (Videostudio, Profile, User),
+    FEATURED_LIVE_EVENTS: (LiveEvent, Profile, User),
+}
+
+
+def _timeout():
+    return getattr(settings, 'CACHE_ASIDE_TIMEOUT', 60 * 15)
+
+
+def _version_key(namespace):
+    return f'cache-aside:{namespace}:version'
+
+
+def namespace_version(namespace):
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock so an evicted version never revives old entries
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(namespace):
+    cache.set(_version_key(namespace), time.time_ns(), None)
+
+
+def get_or_compute(namespace, key, producer, timeout=None):
+    """Return the cached value for `key`, computing and storing it on a miss."""
+    digest = hashlib.md5(key.encode()).hexdigest()
+    cache_key = f'cache-aside:{namespace}:{namespace_version(namespace)}:{digest}'
+    value = cache.get(cache_key)
+    if value is None:
+        value = producer()
+        cache.set(cache_key, value, timeout or _timeout())
+    return value
@@ -0,0 +1,61 @@
+"""
+Helpers for the denormalized counter columns on SocialPost and Track.
+
+Counters are only ever changed with a single UPDATE using F() expressions,
+so concurrent likes/comments never lose increments.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Like, PostComment, PostLike, PostSave, SocialPost, Track
+
+# (model, counter field, related model, foreign key on the related model)
+COUNTERS = [
+    (SocialPost, 'likes_count', PostLike, 'post'),
+    (SocialPost, 'comments_count', PostComment, 'post'),
+    (SocialPost, 'saves_count', PostSave, 'post'),
+    (Track, 'likes_count', Like, 'track'),
+    (Track, 'comments_count', Comment, 'track'),
+]
+
+
+def adjust_counter(model, pk, field, delta):
+    """Atomically add `delta` to a counter, never going below zero."""
+    if delta >= 0:
+        value = F(field) + delta
+    else:
+        value = Greatest(F(field) + delta, 0)
+    model.objects.filter(pk=pk).update(**{field: value})
+
+
+def actual_count(related_model, fk_name):
+    """Subquery counting the related rows that point at the outer row."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{fk_name: OuterRef('pk')})
+            .order_by()
+            .values(fk_name)
+            .annotate(total=Count('pk'))
+            .values('total')[:1]
+        ),
+        0
+    )
+
+
+def reconcile_counters(dry_run=False):
+    """
+    Compare every stored counter with the real row count and fix drift.
+    Returns a list of (model name, field, rows that drifted).
+    """
+    report = []
+    for model, field, related_model, fk_name in COUNTERS:
+        drifted = model.objects.annotate(
+            actual=actual_count(related_model, fk_name)
+        ).exclude(**{field: F('actual')})
+        drifted_ids = list(drifted.values_list('pk', flat=True))
+        if drifted_ids and not dry_run:
+            model.objects.filter(pk__in=drifted_ids).update(
+                **{field: actual_count(related_model, fk_name)}
+            )
+        report.append((model.__name__, field, len(drifted_ids)))
+    return report
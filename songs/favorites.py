@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from .models import Track, Like
 
@@ -10,11 +12,12 @@ def toggle_favorite(request, track_id):
         existing_like = Like.objects.filter(user=user, track=track).first()
         if existing_like:
             existing_like.delete()
-            likes_count = Like.objects.filter(track=track).count()
-            return JsonResponse({"status": "Track unliked", "likes_count": likes_count}, status=200)
+            track.refresh_from_db(fields=['likes_count'])
+            return JsonResponse({"status": "Track unliked", "likes_count": track.likes_count}, status=200)
 
-        Like.objects.create(user=user, track=track)
-        likes_count = Like.objects.filter(track=track).count()
-        return JsonResponse({"status": "Track liked", "likes_count": likes_count}, status=200)
+        with transaction.atomic():
+            Like.objects.create(user=user, track=track)
+        track.refresh_from_db(fields=['likes_count'])
+        return JsonResponse({"status": "Track liked", "likes_count": track.likes_count}, status=200)
 
     return JsonResponse({"error": "Invalid request"}, status=400)
@@ -0,0 +1,86 @@
+"""
+Fan-out-on-write home timelines.
+
+Every post is copied into a FeedEntry row for its author and each of the
+author's followers at creation time, so reading a feed is a single range
+scan over (recipient, created_at, id) instead of a query over all posts.
+"""
+import logging
+
+from django.conf import settings
+
+from .models import UPLOAD_READY, FeedEntry, SocialPost, User
+
+logger = logging.getLogger(__name__)
+
+FAN_OUT_BATCH_SIZE = 1000
+
+
+def _backfill_limit():
+    return getattr(settings, 'FEED_BACKFILL_LIMIT', 200)
+
+
+def _follower_ids(author):
+    # `author.followers` holds the users who follow `author`
+    return author.followers.values_list('id', flat=True).iterator()
+
+
+def _bulk_insert(entries):
+    FeedEntry.objects.bulk_create(
+        entries,
+        batch_size=FAN_OUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Push a new post into its author's feed and every follower's feed."""
+    entries = [FeedEntry(
+        recipient_id=post.user_id,
+        post_id=post.id,
+        author_id=post.user_id,
+        created_at=post.created_at
+    )]
+    for follower_id in _follower_ids(post.user):
+        entries.append(FeedEntry(
+            recipient_id=follower_id,
+            post_id=post.id,
+            author_id=post.user_id,
+            created_at=post.created_at
+        ))
+        if len(entries) >= FAN_OUT_BATCH_SIZE:
+            _bulk_insert(entries)
+            entries = []
+    if entries:
+        _bulk_insert(entries)
+    logger.debug("Fanned out post %s from user %s", post.id, post.user_id)
+
+
+def backfill_author(recipient, author, limit=None):
+    """Copy an author's recent posts into a recipient's feed after a follow."""
+    limit = limit or _backfill_limit()
+    posts = SocialPost.objects.filter(user=author, upload_status=UPLOAD_READY)\
+        .order_by('-created_at', '-id')\
+        .values_list('id', 'created_at')[:limit]
+    _bulk_insert([
+        FeedEntry(
+            recipient_id=recipient.id,
+            post_id=post_id,
+            author_id=author.id,
+            created_at=created_at
+        )
+        for post_id, created_at in posts
+    ])
+
+
+def remove_author(recipient, author):
+    """Drop an author's posts from a recipient's feed after an unfollow."""
+    FeedEntry.objects.filter(recipient=recipient, author=author).delete()
+
+
+def rebuild_feed(recipient, limit=None):
+    """Rebuild one user's feed from their own posts and everyone they follow."""
+    FeedEntry.objects.filter(recipient=recipient).delete()
+    backfill_author(recipient, recipient, limit)
+    for author in User.objects.filter(followers=recipient):
+        backfill_author(recipient, author, limit)
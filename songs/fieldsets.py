@@ -0,0 +1,182 @@
+"""
+Sparse fieldsets: `?fields=` and `?expand=` on read requests.
+
+`?fields=id,caption,user.username` keeps only the listed fields; dotted
+names select inside nested serializers. Dropped fields are removed from
+the serializer, so their SerializerMethodFields never run.
+
+`?expand=song,user` renders only those nested serializers in full; every
+other nested relation collapses to its primary key(s). Dotted names expand
+deeper (`song.artist`). Values that name no field of the serializer (extras
+a view embeds itself, like `social_posts` on a user) leave it untouched.
+
+`prune_queryset` then trims the view's queryset to the columns and
+relations the remaining fields read. Method fields declare what they read
+in `Meta.field_sources` (see songs.prefetching); if any remaining method
+field does not, the queryset is left as is rather than risk a deferred
+load per row.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers
+
+from . import profiling
+from .prefetching import select_related_paths
+
+ALL = None
+
+
+def parse(value):
+    """
+    'a,b.c,b.d' -> {'a': ALL, 'b': {'c': ALL, 'd': ALL}}; None when absent.
+    A bare name wins over dotted ones for the same field.
+    """
+    if value is None:
+        return None
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(','))):
+        node = tree
+        head, *rest = path.split('.')
+        while rest:
+            if head in node and node[head] is ALL:
+                break
+            node = node.setdefault(head, {})
+            head, *rest = rest
+        else:
+            node[head] = ALL
+    return tree
+
+
+class DynamicFieldsMixin:
+    """Applies `?fields=` / `?expand=` to a ModelSerializer and the ones nested in it."""
+
+    _fieldset = None
+
+    def _root_fieldset(self):
+        parent = self.parent
+        if parent is not None and not (isinstance(parent, serializers.ListSerializer) and parent.parent is None):
+            return None
+        request = self.context.get('request')
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return None
+        # The first serializer to render with this context owns the query
+        # params; ones built on the fly inside it (sharing its context) don't
+        owner = self.context.setdefault('_fieldset_owner', id(self))
+        if owner != id(self):
+            return None
+        params = getattr(request, 'query_params', {})
+        return parse(params.get('fields')), parse(params.get('expand'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = self._fieldset or self._root_fieldset() or (None, None)
+        if only:
+            for name in list(fields):
+                if name not in only:
+                    del fields[name]
+        # An ?expand that names none of these fields is someone else's
+        if expand is not None and self._fieldset is None and not set(expand) & set(fields):
+            expand = None
+
+        for name, field in list(fields.items()):
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, serializers.ModelSerializer):
+                continue
+            if expand is not None and name not in expand:
+                kwargs = {'source': field.source} if field.source not in (None, name) else {}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **kwargs)
+                continue
+            if isinstance(nested, DynamicFieldsMixin):
+                sub_only = only and only.get(name)
+                sub_expand = None if expand is None else (expand.get(name) or {})
+                if sub_only is not None or sub_expand is not None:
+                    nested._fieldset = (sub_only, sub_expand)
+        return fields
+
+    def to_representation(self, instance):
+        # Every model serializer goes through here, which makes it the place
+        # to time serialization for the request profile
+        with profiling.span('serializer'):
+            return super().to_representation(instance)
+
+    @property
+    def is_sparse(self):
+        if self._fieldset is not None:
+            return True
+        only, expand = self._root_fieldset() or (None, None)
+        # Same test as get_fields(): an ?expand naming none of the fields changes nothing
+        return bool(only) or (expand is not None and bool(set(expand) & set(self.fields)))
+
+
+def _sources(serializer):
+    """
+    Model attributes the serializer's fields read, the subset of those only
+    read as a foreign key id, and whether every field was accounted for.
+    """
+    declared = getattr(getattr(serializer, 'Meta', None), 'field_sources', {})
+    needed, by_id, complete = set(), set(), True
+    for name, field in serializer.fields.items():
+        if name in declared:
+            needed.update(path.split('__')[0] for path in declared[name])
+        elif isinstance(field, serializers.SerializerMethodField):
+            complete = False
+        elif field.source == '*':
+            complete = False
+        else:
+            root = field.source.split('.')[0]
+            (by_id if isinstance(field, serializers.PrimaryKeyRelatedField) else needed).add(root)
+    return needed | by_id, by_id - needed, complete
+
+
+def prune_queryset(queryset, serializer, keep=()):
+    """
+    Restrict `queryset` to what a sparse `serializer` will read. `keep`
+    names extra columns the caller needs (e.g. the pagination ordering).
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, DynamicFieldsMixin) or not serializer.is_sparse:
+        return queryset
+    needed, by_id, complete = _sources(serializer)
+    if not complete:
+        return queryset
+
+    opts = queryset.model._meta
+    annotations = set(queryset.query.annotations)
+    columns = {opts.pk.name}
+    ordering = [field for field in (*keep, *queryset.query.order_by) if isinstance(field, str)]
+    for name in needed | {field.lstrip('-').split('__')[0] for field in ordering}:
+        if name in annotations:
+            continue
+        try:
+            model_field = opts.get_field(name)
+        except FieldDoesNotExist:
+            # A property or plain attribute: no telling what it reads
+            return queryset
+        if model_field.concrete:
+            columns.add(name)
+
+    select_related = queryset.query.select_related
+    if isinstance(select_related, dict):
+        # Relations rendered as a bare id are read from the FK column, no join needed
+        kept = [path for path in select_related_paths(select_related)
+                if path.split('__')[0] in needed - by_id]
+        queryset = queryset.select_related(None)
+        if kept:
+            queryset = queryset.select_related(*kept)
+            # A joined relation can't also be deferred, and a reverse
+            # one-to-one (user.profile) has no column to add above
+            columns.update(path.split('__')[0] for path in kept)
+    elif select_related:
+        # select_related() with no arguments follows every FK, deferred or not
+        return queryset
+
+    lookups = queryset._prefetch_related_lookups
+    if lookups:
+        kept = [
+            lookup for lookup in lookups
+            if getattr(lookup, 'prefetch_to', lookup).split('__')[0] in needed
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*kept)
+
+    return queryset.only(*columns)
@@ -0,0 +1,143 @@
+"""
+Write-behind view/download counters (Track.views, Track.downloads,
+Product.views, LiveEvent.viewers_count).
+
+Writing every hit to its row would queue all the readers of a popular
+track behind one row lock. Hits are counted in process memory instead, and
+a background flush adds them to the database in batches, with one
+`UPDATE ... SET views = views + n` per counter and increment. Each worker
+process flushes its own hits, which is safe because the updates only add.
+
+Hits can name their visitor (a user, or an address for anonymous hits).
+Those are folded into the object's unique audience sketches at flush time
+(see songs.sketches).
+
+Counting a hit touches neither the database nor the cache. Besides the
+flushes that hits themselves trigger, workers run a flusher thread (see
+`start_flusher`, called from music/asgi.py and music/wsgi.py) so the last
+hits before a quiet spell are written too, and flush once more on exit.
+A process that is killed outright loses its unflushed hits (at most
+HIT_COUNTERS_FLUSH_INTERVAL seconds' worth), which popularity stats can
+afford.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import sketches
+from .background import submit_on_commit
+
+logger = logging.getLogger(__name__)
+
+_pending = Counter()  # (model, field, pk) -> hits not yet in the database
+_visitors = defaultdict(set)  # (model, pk, day) -> visitors not yet in its sketches
+_pending_hits = 0
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_BATCH_SIZE = 500
+_flusher = None
+_stop = threading.Event()
+
+
+def _interval():
+    return getattr(settings, 'HIT_COUNTERS_FLUSH_INTERVAL', 10)
+
+
+def record(model, pk, field='views', visitor=None):
+    """Count one hit on `model`'s `field` counter of row `pk`, by `visitor` if given."""
+    global _last_flush, _pending_hits
+    with _lock:
+        _pending[(model, field, pk)] += 1
+        if visitor is not None:
+            _visitors[(model, pk, timezone.localdate())].add(visitor)
+        _pending_hits += 1
+        now = time.monotonic()
+        due = (now - _last_flush >= _interval()
+               or _pending_hits >= getattr(settings, 'HIT_COUNTERS_MAX_PENDING', 5000))
+        if due:
+            _last_flush = now
+    if due:
+        submit_on_commit(flush)
+
+
+def flush():
+    """Write the hits counted so far to the database."""
+    global _pending, _visitors, _pending_hits
+    with _lock:
+        pending, _pending = _pending, Counter()
+        visitors, _visitors = _visitors, defaultdict(set)
+        _pending_hits = 0
+
+    # Rows that got the same number of hits share an UPDATE
+    batches = defaultdict(list)
+    for (model, field, pk), hits in pending.items():
+        batches[(model, field, hits)].append(pk)
+    for (model, field, hits), pks in batches.items():
+        pks.sort()
+        for start in range(0, len(pks), _BATCH_SIZE):
+            model.objects.filter(pk__in=pks[start:start + _BATCH_SIZE]).update(**{field: F(field) + hits})
+    logger.debug("Flushed %s hits to %s counters", sum(pending.values()), len(pending))
+
+    for (model, pk, day), seen in visitors.items():
+        sketch = sketches.HyperLogLog()
+        for visitor in seen:
+            sketch.add(visitor)
+        sketches.save(model, pk, day, sketch)
+
+
+def tick():
+    """Flush if hits have waited a whole interval; the flusher thread's step."""
+    global _last_flush
+    with _lock:
+        now = time.monotonic()
+        due = _pending_hits and now - _last_flush >= _interval()
+        if due:
+            _last_flush = now
+    if due:
+        flush()
+
+
+def _flush_periodically():
+    while not _stop.wait(_interval()):
+        try:
+            tick()
+        except Exception:
+            logger.exception("Periodic hit counter flush failed")
+        finally:
+            close_old_connections()
+
+
+def start_flusher():
+    """Start this process's flusher thread, and flush what is left at exit."""
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _stop.clear()
+        _flusher = threading.Thread(target=_flush_periodically, name='songs-hits-flusher', daemon=True)
+        _flusher.start()
+    atexit.register(stop_flusher)
+
+
+def stop_flusher():
+    """Stop the flusher thread and flush the hits still pending."""
+    global _flusher
+    with _lock:
+        flusher, _flusher = _flusher, None
+    if flusher is None:
+        return
+    atexit.unregister(stop_flusher)
+    _stop.set()
+    flusher.join()
+    if _pending_hits:
+        try:
+            flush()
+        except Exception:
+            logger.exception("Final hit counter flush failed")
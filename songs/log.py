@@ -0,0 +1,110 @@
+"""
+Logging plumbing, wired up by `LOGGING` in settings.
+
+Request threads only put records on a queue (`QueueListenerHandler`); a
+listener thread formats them as JSON lines (`JsonFormatter`) and does the
+writing, so a slow disk or console never holds up a request. Records below
+WARNING can be sampled (`SamplingFilter`) before they are queued.
+
+Log calls should pass their arguments %-style rather than as f-strings, so
+the message is only built when the record is actually emitted. Arguments
+that are expensive to compute in the first place go through `lazy`:
+
+    logger.debug("Query: %s", lazy(str, queryset.query))
+"""
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+# LogRecord attributes; anything else on a record came in through `extra`
+_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class lazy:
+    """Defers `function(*args)` until the log message is formatted."""
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return str(self.function(*self.args))
+
+    __repr__ = __str__
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'location': f'{record.module}:{record.lineno}',
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _STANDARD:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through `rate` of the records below `level`, and every record at or above it."""
+
+    def __init__(self, rate=1.0, level='WARNING'):
+        super().__init__()
+        self.rate = float(rate)
+        self.level = logging._checkLevel(level)
+
+    def filter(self, record):
+        return record.levelno >= self.level or self.rate >= 1 or random.random() < self.rate
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Queues records for `handlers`, which a background listener thread
+    writes out. Configured with `'()'` and `cfg://handlers.<name>` entries;
+    dictConfig sets handlers up in name order, so this one's name must sort
+    after the handlers it feeds.
+    """
+
+    def __init__(self, handlers, maxsize=10_000):
+        super().__init__(queue.Queue(maxsize))
+        # Indexing (not iterating) is what resolves dictConfig's cfg:// entries
+        handlers = [handlers[i] for i in range(len(handlers))]
+        for handler in handlers:
+            if not isinstance(handler, logging.Handler):
+                raise ValueError("QueueListenerHandler's target not configured yet; rename it to sort later")
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a record beats blocking the request behind the disk
+            pass
+
+    def close(self):
+        # logging.shutdown() closes this before the handlers it feeds, so
+        # whatever is still queued gets written out
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+    def prepare(self, record):
+        # The message is built here, while `lazy` arguments still see the
+        # state they were logged with; formatting is left to the listener
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
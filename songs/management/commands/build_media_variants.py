@@ -0,0 +1,29 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from songs.media_urls import VARIANT_SOURCES, variants_for
+
+
+class Command(BaseCommand):
+    help = "Store the responsive variant manifest on media rows saved before manifests existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every manifest, not only missing ones")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for label in VARIANT_SOURCES:
+            model = apps.get_model(label)
+            queryset = model.objects.all() if options['all'] else model.objects.filter(variants={})
+            batch, updated = [], 0
+            for instance in queryset.iterator(chunk_size=batch_size):
+                instance.variants = variants_for(instance)
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    updated += model.objects.bulk_update(batch, ['variants'])
+                    batch = []
+            if batch:
+                updated += model.objects.bulk_update(batch, ['variants'])
+            self.stdout.write(f"{model.__name__}: {updated} manifest(s) built")
+        self.stdout.write(self.style.SUCCESS("Media variants up to date"))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from songs.models import AudienceSketch
+
+
+class Command(BaseCommand):
+    help = "Delete old daily and weekly unique-audience sketches (all-time ones are kept)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Daily sketches to keep")
+        parser.add_argument('--weeks', type=int, default=104, help="Weekly sketches to keep")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        days, _ = AudienceSketch.objects.filter(
+            period=AudienceSketch.DAY, period_start__lt=today - timedelta(days=options['days'])
+        ).delete()
+        weeks, _ = AudienceSketch.objects.filter(
+            period=AudienceSketch.WEEK, period_start__lt=today - timedelta(weeks=options['weeks'])
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {days} daily and {weeks} weekly sketch(es)"))
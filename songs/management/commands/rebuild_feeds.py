@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from songs.feed import rebuild_feed
+from songs.models import User
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home feeds from existing posts and follows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild the feed of this user id")
+        parser.add_argument('--limit', type=int, default=None, help="Posts to copy per followed author")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(id=options['user'])
+
+        rebuilt = 0
+        for user in users.iterator():
+            rebuild_feed(user, options['limit'])
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} feed(s)"))
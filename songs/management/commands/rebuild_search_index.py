@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from songs.models import Track
+from songs.search import ENTRY_SOURCES, index_objects, index_tracks
+
+
+class Command(BaseCommand):
+    help = "Rebuild the track and unified search indexes (e.g. after changing SEARCH_CONFIG)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        pks = list(Track.objects.order_by('pk').values_list('pk', flat=True))
+        size = options['batch_size']
+        for start in range(0, len(pks), size):
+            index_tracks(pks[start:start + size])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(pks)} track(s)"))
+
+        for kind, (model, _, _) in ENTRY_SOURCES.items():
+            objects = model.objects.order_by('pk')
+            if kind in ('product', 'liveevent'):
+                objects = objects.select_related('seller' if kind == 'product' else 'user')
+            count = 0
+            for start in range(0, objects.count(), size):
+                batch = list(objects[start:start + size])
+                index_objects(kind, batch)
+                count += len(batch)
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {kind} entr{'y' if count == 1 else 'ies'}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from songs.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment/save counters that drifted from the real row counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drift, don't fix it")
+
+    def handle(self, *args, **options):
+        for model_name, field, drifted in reconcile_counters(dry_run=options['dry_run']):
+            self.stdout.write(f"{model_name}.{field}: {drifted} row(s) drifted")
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS("Counters reconciled"))
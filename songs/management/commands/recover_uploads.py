@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from songs.uploads import recover_stale
+
+
+class Command(BaseCommand):
+    help = "Fail uploads left pending by a worker that died, and delete their spooled files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=int, default=getattr(settings, 'UPLOAD_STALE_MINUTES', 30),
+            help="Age after which a pending upload is given up on",
+        )
+
+    def handle(self, *args, **options):
+        failed, removed = recover_stale(options['minutes'])
+        counts = ', '.join(f"{count} {name}(s)" for name, count in failed.items())
+        self.stdout.write(self.style.SUCCESS(f"Failed {counts}; deleted {removed} spooled file(s)"))
@@ -0,0 +1,243 @@
+"""
+Cloudinary delivery URLs, built once and memoized.
+
+A delivery URL is
+`https://res.cloudinary.com/<cloud>/<resource_type>/<type>/<transformation>/v<version>/<public_id>.<format>`.
+Serializers pass whatever a field holds (a CloudinaryResource, a dict from
+the upload API, a stored public id or a full URL) to `media_url`, which
+reduces it to those parts and looks the URL up in an LRU cache. The same
+avatar showing up on every row of a page is built once, not once per row.
+
+With a MEDIA_STORAGE_BACKEND that serves files itself (LocalFileStorage in
+development) URLs come from the storage instead and transformations are
+dropped; given the request, such site-relative URLs are made absolute.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+from .storage import get_storage
+
+# Same shape CloudinaryField uses to store resources in the database
+_STORED_RE = re.compile(
+    r'(?:(?P<resource_type>image|raw|video)/(?P<type>upload|private|authenticated)/)?'
+    r'(?:v(?P<version>\d+)/)?'
+    r'(?P<public_id>.*?)'
+    r'(\.(?P<format>[^./]+))?$'
+)
+_DELIVERY_RE = re.compile(
+    r'^https?://res\.cloudinary\.com/(?P<cloud_name>[^/]+)/'
+    r'(?P<resource_type>image|raw|video|auto)/(?P<type>upload|private|authenticated)/'
+    r'(?:(?:(?:ar|bo|co|dpr|fl|sp|[abcdefghloqrtuwxyz])_[^,/]+,?)+/)*'  # transformations
+    r'(?:v(?P<version>\d+)/)?'
+    r'(?P<public_id>.*?)'
+    r'(\.(?P<format>[^./]+))?$'
+)
+
+_TRANSFORMATION_KEYS = (
+    ('width', 'w'), ('height', 'h'), ('crop', 'c'), ('gravity', 'g'),
+    ('quality', 'q'), ('fetch_format', 'f'), ('streaming_profile', 'sp'),
+)
+
+
+@lru_cache(maxsize=256)
+def transformation(width=None, height=None, crop=None, gravity=None, quality=None,
+                   fetch_format=None, streaming_profile=None):
+    """Compile transformation parameters to Cloudinary's `w_..,h_..` form."""
+    params = locals()
+    return ','.join(f'{short}_{params[name]}' for name, short in _TRANSFORMATION_KEYS if params[name])
+
+
+AVATAR_THUMB = transformation(width=50, height=50, crop='fill')
+POST_IMAGE = transformation(width=600, height=600, crop='fill', quality='auto', fetch_format='auto')
+POST_VIDEO = transformation(quality='auto', fetch_format='auto')
+
+
+def _cloud_name():
+    return settings.CLOUDINARY_STORAGE['CLOUD_NAME']
+
+
+@lru_cache(maxsize=64)
+def _prefix(cloud_name, resource_type, delivery_type):
+    return f'https://res.cloudinary.com/{cloud_name}/{resource_type}/{delivery_type}/'
+
+
+@lru_cache(maxsize=8192)
+def build_url(cloud_name, public_id, resource_type='image', delivery_type='upload',
+              transformation='', version=None, extension=''):
+    url = _prefix(cloud_name, resource_type, delivery_type)
+    if transformation:
+        url += transformation + '/'
+    if version:
+        url += f'v{version}/'
+    elif '/' in public_id:
+        # Cloudinary's SDK pins folder assets to v1 unless told otherwise
+        url += 'v1/'
+    return url + public_id + extension
+
+
+@lru_cache(maxsize=8192)
+def _parse(value):
+    if value.startswith('http'):
+        match = _DELIVERY_RE.match(value)
+        cloud_name = match and match.group('cloud_name')
+    else:
+        match = _STORED_RE.match(value)
+        cloud_name = None
+    if not match:
+        return None
+    return (
+        cloud_name, match.group('public_id'), match.group('resource_type'),
+        match.group('type'), match.group('version'), match.group('format'),
+    )
+
+
+def _parts(value):
+    """(cloud_name, public_id, resource_type, type, version, format) or None."""
+    if isinstance(value, str):
+        return _parse(value)
+    if isinstance(value, dict):
+        if value.get('public_id'):
+            return (
+                None, value['public_id'], value.get('resource_type'), value.get('type'),
+                value.get('version'), value.get('format'),
+            )
+        url = value.get('secure_url') or value.get('url')
+        return _parse(url) if url else None
+    public_id = getattr(value, 'public_id', None)
+    if not public_id:
+        return None
+    if public_id.startswith('http'):
+        # CloudinaryField keeps full URLs (e.g. the profile default) as the public id
+        return _parse(public_id)
+    return (
+        None, public_id, getattr(value, 'resource_type', None), getattr(value, 'type', None),
+        getattr(value, 'version', None), getattr(value, 'format', None),
+    )
+
+
+def absolute(url, request=None):
+    """`url` with the request's scheme and host if it is site-relative."""
+    if url and request is not None and url.startswith('/'):
+        return request.build_absolute_uri(url)
+    return url
+
+
+def media_url(value, transformation='', resource_type=None, default_extension='', extension=None,
+              request=None):
+    """
+    Delivery URL for a stored Cloudinary asset, or None when there is none.
+
+    `resource_type` overrides the stored one (posts stored as `auto` are
+    delivered as image or video); `default_extension` is used when the
+    asset has no known format and `extension` replaces it regardless (e.g.
+    a .jpg poster frame of a video). URLs that are not Cloudinary's are
+    returned untouched, but made absolute with `request` when site-relative.
+    """
+    if not value:
+        return None
+    if isinstance(value, str) and value.startswith(('http', '/')) and 'res.cloudinary.com' not in value:
+        return absolute(value, request)
+    parts = _parts(value)
+    if parts is None:
+        return value if isinstance(value, str) and value.startswith('http') else None
+    cloud_name, public_id, stored_type, delivery_type, version, fmt = parts
+    extension = extension if extension is not None else (f'.{fmt}' if fmt else default_extension)
+    if cloud_name is None:
+        local = get_storage().delivery_url(public_id, extension)
+        if local:
+            return absolute(local, request)
+    resource_type = resource_type or stored_type
+    if not resource_type or resource_type == 'auto':
+        resource_type = 'image'
+    return build_url(
+        cloud_name or _cloud_name(), public_id, resource_type, delivery_type or 'upload',
+        transformation, version, extension,
+    )
+
+
+def picture_transformation(context, size):
+    """Avatar transformation, overridable through `picture_*` serializer context keys."""
+    return transformation(
+        width=context.get('picture_width', size),
+        height=context.get('picture_height', size),
+        crop=context.get('picture_crop', 'fill'),
+        gravity=context.get('picture_gravity', 'face'),
+        quality=context.get('picture_quality', 'auto'),
+    )
+
+
+# Variant manifests: the sizes clients may ask for with `?variant=`, per
+# kind of asset. Each entry is (transformation, forced extension or None).
+VARIANT_NAMES = ('thumb', 'small', 'medium', 'large')
+
+VARIANTS = {
+    'image': {
+        'thumb': (transformation(width=150, height=150, crop='fill', quality='auto', fetch_format='auto'), None),
+        'small': (transformation(width=320, crop='limit', quality='auto', fetch_format='auto'), None),
+        'medium': (POST_IMAGE, None),
+        'large': (transformation(width=1280, crop='limit', quality='auto', fetch_format='auto'), None),
+    },
+    'avatar': {
+        name: (transformation(width=size, height=size, crop='fill', gravity='face', quality='auto'), None)
+        for name, size in (('thumb', 50), ('small', 200), ('medium', 300), ('large', 500))
+    },
+    'video': {
+        # Poster frame, then progressively larger renditions and an adaptive stream
+        'thumb': (transformation(width=320, crop='limit', quality='auto'), '.jpg'),
+        'small': (transformation(width=480, crop='limit', quality='auto'), '.mp4'),
+        'medium': (transformation(width=720, crop='limit', quality='auto'), '.mp4'),
+        'large': (transformation(width=1280, crop='limit', quality='auto'), '.mp4'),
+        'hls': (transformation(streaming_profile='auto'), '.m3u8'),
+    },
+}
+
+# Which field of which model carries the asset a row's manifest describes
+VARIANT_SOURCES = {
+    'songs.profile': ('picture', 'avatar'),
+    'songs.track': ('cover_image', 'image'),
+    'songs.socialpost': ('media_file', None),  # kind follows content_type
+    'songs.group': ('cover_image', 'image'),
+    'songs.productimage': ('image', 'image'),
+}
+
+
+def variant_manifest(value, kind, resource_type=None):
+    """`{variant name: URL}` for a stored asset, or `{}` when there is none."""
+    if not value:
+        return {}
+    if resource_type is None and kind == 'video':
+        resource_type = 'video'
+    manifest = {}
+    for name, (variant_transformation, extension) in VARIANTS[kind].items():
+        url = media_url(value, variant_transformation, resource_type=resource_type, extension=extension)
+        if url:
+            manifest[name] = url
+    return manifest
+
+
+def variants_for(instance):
+    """Manifest for a model instance listed in VARIANT_SOURCES."""
+    field, kind = VARIANT_SOURCES[instance._meta.label_lower]
+    if kind is None:
+        kind = 'video' if instance.content_type == 'video' else 'image'
+        return variant_manifest(getattr(instance, field), kind, resource_type=instance.content_type)
+    return variant_manifest(getattr(instance, field), kind)
+
+
+def requested_variant(context):
+    """The `?variant=` a request asked for, if it names a known variant."""
+    request = context.get('request')
+    name = getattr(request, 'query_params', {}).get('variant')
+    if name in VARIANT_NAMES or name == 'hls':
+        return name
+    return None
+
+
+def avatar_url(picture, context, size):
+    """Profile picture URL: the `?variant=` size if one was asked for, else the context's."""
+    name = requested_variant(context)
+    if name in VARIANTS['avatar']:
+        return media_url(picture, VARIANTS['avatar'][name][0], request=context.get('request'))
+    return media_url(picture, picture_transformation(context, size), request=context.get('request'))
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-18 08:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+COUNTERS = [
+    ('SocialPost', 'likes_count', 'PostLike', 'post'),
+    ('SocialPost', 'comments_count', 'PostComment', 'post'),
+    ('SocialPost', 'saves_count', 'PostSave', 'post'),
+    ('Track', 'likes_count', 'Like', 'track'),
+    ('Track', 'comments_count', 'Comment', 'track'),
+]
+
+
+def backfill_counters(apps, schema_editor):
+    for model_name, field, related_name, fk_name in COUNTERS:
+        model = apps.get_model('songs', model_name)
+        related = apps.get_model('songs', related_name)
+        count = Subquery(
+            related.objects.filter(**{fk_name: OuterRef('pk')})
+            .order_by()
+            .values(fk_name)
+            .annotate(total=Count('pk'))
+            .values('total')[:1]
+        )
+        model.objects.update(**{field: Coalesce(count, 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('songs', '0016_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='socialpost',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='socialpost',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='socialpost',
+            name='saves_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2 on 2026-10-18 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('songs', '0017_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='choir',
+            index=models.Index(fields=['-created_at', '-id'], name='choir_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='church',
+            index=models.Index(fields=['-created_at', '-id'], name='church_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['track', '-created_at', '-id'], name='comment_track_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-created_at', '-id'], name='group_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grouppost',
+            index=models.Index(fields=['group', '-created_at', '-id'], name='grouppost_group_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='like_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='liveevent',
+            index=models.Index(fields=['-start_time', '-id'], name='liveevent_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(fields=['-created_at', '-id'], name='playlist_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['post', '-created_at', '-id'], name='postcomment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postlike',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='postlike_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postsave',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='postsave_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-created_at', '-id'], name='profile_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='socialpost',
+            index=models.Index(fields=['-created_at', '-id'], name='socialpost_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['-created_at', '-id'], name='track_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-date_joined', '-id'], name='user_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videostudio',
+            index=models.Index(fields=['-created_at', '-id'], name='videostudio_created_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('songs', '0018_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupjoinrequest',
+            index=models.Index(fields=['group', 'status', '-created_at'], name='joinrequest_group_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupmember',
+            index=models.Index(fields=['group', 'is_admin'], name='groupmember_group_admin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='liveevent',
+            index=models.Index(fields=['is_live', '-start_time'], name='liveevent_live_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'read', '-created_at'], name='notif_recipient_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read', False)), fields=['recipient', '-created_at'], name='notif_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['seller', '-created_at', '-id'], name='product_seller_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_available'], name='product_category_avail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='socialpost',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='socialpost_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['artist', '-created_at', '-id'], name='track_artist_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('songs', '0021_media_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudienceSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('all', 'All time')], max_length=4)),
+                ('period_start', models.DateField()),
+                ('registers', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('target', 'object_id', 'period', 'period_start'), name='audience_sketch_unique')],
+            },
+        ),
+    ]
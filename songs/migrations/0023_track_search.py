@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-18 09:40
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+FTS_TABLE = 'songs_track_fts'
+
+
+def create_index(apps, schema_editor):
+    """GIN index and documents on PostgreSQL, an FTS5 table on SQLite."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        config = getattr(settings, 'SEARCH_CONFIG', 'english')
+        schema_editor.execute(
+            'CREATE INDEX track_search_vector_gin ON songs_tracksearch USING gin (vector)'
+        )
+        schema_editor.execute(
+            """
+            INSERT INTO songs_tracksearch (track_id, vector)
+            SELECT track.id,
+                   setweight(to_tsvector(%s::regconfig, coalesce(track.title, '')), 'A') ||
+                   setweight(to_tsvector(%s::regconfig, coalesce(artist.username, '')), 'A') ||
+                   setweight(to_tsvector(%s::regconfig, coalesce(track.album, '')), 'B') ||
+                   setweight(to_tsvector(%s::regconfig, coalesce(track.lyrics, '')), 'C')
+            FROM songs_track track JOIN songs_user artist ON artist.id = track.artist_id
+            """,
+            [config] * 4,
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, artist, album, lyrics, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"""
+            INSERT INTO {FTS_TABLE} (rowid, title, artist, album, lyrics)
+            SELECT track.id, track.title, artist.username, coalesce(track.album, ''), coalesce(track.lyrics, '')
+            FROM songs_track track JOIN songs_user artist ON artist.id = track.artist_id
+            """
+        )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS track_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('songs', '0022_audience_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackSearch',
+            fields=[
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='songs.track')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2 on 2026-10-18 11:05
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+FTS_TABLE = 'songs_searchentry_fts'
+
+# Same documents as the builders in songs.search
+BACKFILL = [
+    """
+    SELECT 'church', id, CAST(id AS TEXT), name, location,
+           country || ' ' || coalesce(county, '') || ' ' || conference || ' ' ||
+           coalesce(district, '') || ' ' || coalesce(pastor, ''), FALSE
+    FROM songs_church
+    """,
+    """
+    SELECT 'choir', id, CAST(id AS TEXT), name, location, coalesce(description, ''), FALSE
+    FROM songs_choir
+    """,
+    """
+    SELECT 'videostudio', id, CAST(id AS TEXT), name, location, coalesce(description, ''), FALSE
+    FROM songs_videostudio
+    """,
+    """
+    SELECT 'group', id, slug, name, '', description, is_private
+    FROM songs_group
+    """,
+    """
+    SELECT 'product', product.id, product.slug, product.title, seller.username, product.description, FALSE
+    FROM songs_product product JOIN songs_user seller ON seller.id = product.seller_id
+    """,
+    """
+    SELECT 'liveevent', event.id, CAST(event.id AS TEXT), event.title, host.username,
+           coalesce(event.description, ''), FALSE
+    FROM songs_liveevent event JOIN songs_user host ON host.id = event.user_id
+    """,
+    """
+    SELECT 'user', id, CAST(id AS TEXT), username, trim(first_name || ' ' || last_name), bio, FALSE
+    FROM songs_user WHERE is_active
+    """,
+]
+
+
+def create_index(apps, schema_editor):
+    """Entries for every existing object, then a GIN index on PostgreSQL or an FTS5 table on SQLite."""
+    vendor = schema_editor.connection.vendor
+    for select in BACKFILL:
+        schema_editor.execute(
+            'INSERT INTO songs_searchentry (kind, object_id, lookup, title, subtitle, body, is_private) '
+            + select
+        )
+    if vendor == 'postgresql':
+        config = getattr(settings, 'SEARCH_CONFIG', 'english')
+        schema_editor.execute(
+            'CREATE INDEX search_entry_vector_gin ON songs_searchentry USING gin (vector)'
+        )
+        schema_editor.execute(
+            """
+            UPDATE songs_searchentry SET vector =
+                setweight(to_tsvector(%s::regconfig, title), 'A') ||
+                setweight(to_tsvector(%s::regconfig, subtitle), 'B') ||
+                setweight(to_tsvector(%s::regconfig, body), 'C')
+            """,
+            [config] * 3,
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, subtitle, body, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, subtitle, body) '
+            'SELECT id, title, subtitle, body FROM songs_searchentry'
+        )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS search_entry_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('songs', '0023_track_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('church', 'Church'), ('choir', 'Choir'), ('videostudio', 'Video studio'), ('group', 'Group'), ('product', 'Product'), ('liveevent', 'Live event'), ('user', 'User')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('lookup', models.CharField(max_length=255)),
+                ('title', models.CharField(max_length=255)),
+                ('subtitle', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('is_private', models.BooleanField(default=False)),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='search_entry_unique')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 12:20
+
+from django.db import migrations
+
+# Expressions match what istartswith/icontains compile to on PostgreSQL
+TRIGRAM_INDEXES = [
+    ('user_username_trgm', 'songs_user', 'username'),
+    ('track_title_trgm', 'songs_track', 'title'),
+    ('product_title_trgm', 'songs_product', 'title'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    """Trigram indexes for the autocomplete database fallback; PostgreSQL only."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('songs', '0024_search_entries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
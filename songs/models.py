@@ -7,10 +7,28 @@ from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from urllib.parse import urlparse, parse_qs
+from datetime import timedelta
 import re
 from cloudinary.models import CloudinaryField
+from django.contrib.postgres.search import SearchVectorField
+import logging
 import os
 
+from .log import lazy
+from .thumbnails import resolve_thumbnail, thumbnail_url
+
+logger = logging.getLogger(__name__)
+
+# Media rows are created pending while songs.uploads pushes the file to storage
+UPLOAD_PENDING = 'pending'
+UPLOAD_READY = 'ready'
+UPLOAD_FAILED = 'failed'
+UPLOAD_STATUS_CHOICES = (
+    (UPLOAD_PENDING, 'Pending'),
+    (UPLOAD_READY, 'Ready'),
+    (UPLOAD_FAILED, 'Failed'),
+)
+
 
 
 # Custom User Model
@@ -36,6 +54,11 @@ class User(AbstractUser):
         help_text='Specific permissions for this user.',
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -49,15 +72,25 @@ class Track(models.Model):
     # cover_image = models.ImageField(upload_to='covers/', blank=True, null=True)
     audio_file = CloudinaryField(resource_type='video', folder='audio/')
     cover_image = CloudinaryField('image', folder='covers/', blank=True, null=True)
+    # Per-size delivery URLs for cover_image, kept in step by songs.signals
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     lyrics = models.TextField(blank=True, null=True)
     slug = models.SlugField(unique=True)
     is_favorite = models.BooleanField(default=False)
     views = models.PositiveIntegerField(default=0)
     downloads = models.PositiveIntegerField(default=0)
+    # Denormalized counters, kept in step with Like/Comment by songs.signals
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default=UPLOAD_READY)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='track_created_idx'),
+            models.Index(fields=['artist', '-created_at', '-id'], name='track_artist_created_idx'),
+        ]
     # favorites = models.ManyToManyField(User, related_name='favorite_tracks', blank=True)
 
     def __str__(self):
@@ -73,6 +106,17 @@ class Track(models.Model):
         return f'{self.title} - {self.artist.username}'
 
 
+class TrackSearch(models.Model):
+    """
+    Weighted full-text document of a track (title and artist, album, lyrics)
+    that PostgreSQL searches; kept up to date by songs.search. Its GIN index
+    is created by migration 0023 on PostgreSQL only, and SQLite searches an
+    FTS5 table instead.
+    """
+    track = models.OneToOneField(Track, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    vector = SearchVectorField(null=True)
+
+
 # Playlist Model
 class Playlist(models.Model):
     name = models.CharField(max_length=100)
@@ -81,6 +125,11 @@ class Playlist(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='playlist_created_idx'),
+        ]
+
     def __str__(self):
         return f'{self.name} by {self.user.username}'
 
@@ -93,6 +142,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['track', '-created_at', '-id'], name='comment_track_created_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.user.username} on {self.track.title}'
 
@@ -105,6 +159,9 @@ class Like(models.Model):
 
     class Meta:
         unique_together = ('track', 'user')  # Prevent duplicate likes
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='like_user_created_idx'),
+        ]
 
     def __str__(self):
         return f'Like by {self.user.username} on {self.track.title}'
@@ -129,6 +186,8 @@ class Profile(models.Model):
     folder='profiles/',
     default='https://res.cloudinary.com/YOUR_CLOUD_NAME/image/upload/v1234567890/profiles/default.jpg',
     transformation=[{'width': 400, 'height': 400, 'crop': 'fill', 'gravity': 'face'}])
+    # Per-size delivery URLs for picture, kept in step by songs.signals
+    variants = models.JSONField(default=dict, blank=True, editable=False)
 
 
     bio = models.TextField(blank=True, null=True)
@@ -139,6 +198,11 @@ class Profile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='profile_created_idx'),
+        ]
+
     def __str__(self):
         return f'Profile of {self.user.username}'
 
@@ -161,6 +225,8 @@ class SocialPost(models.Model):
         blank=True,
         null=True
     )
+    # Per-size delivery URLs for media_file, kept in step by songs.signals
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     song = models.ForeignKey(Track, null=True, blank=True, on_delete=models.SET_NULL)
 
     caption = models.TextField(blank=True)
@@ -173,27 +239,37 @@ class SocialPost(models.Model):
     )
     width = models.IntegerField(null=True, blank=True)
     height = models.IntegerField(null=True, blank=True)
+    # Denormalized counters, kept in step with PostLike/PostComment/PostSave by songs.signals
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    saves_count = models.PositiveIntegerField(default=0)
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default=UPLOAD_READY)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='socialpost_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='socialpost_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s {self.content_type} post"
 
     def clean(self):
         """Comprehensive validation handling Cloudinary resources"""
         try:
-            logger.info(f"Starting clean() for SocialPost. Content type: {self.content_type}")
+            logger.debug("Starting clean() for SocialPost. Content type: %s", self.content_type)
             
             # Log media file details
-            media_info = {
+            logger.debug("Media file info: %s", lazy(lambda: {
                 'media_file': str(self.media_file),
                 'type': str(type(self.media_file)),
                 'exists': bool(self.media_file)
-            }
-            logger.info(f"Media file info: {media_info}")
+            }))
             
             if self.content_type == 'video':
-                logger.info("Validating video content")
+                logger.debug("Validating video content")
                 
                 # Get filename or public_id
                 filename = str(self.media_file)
@@ -201,7 +277,7 @@ class SocialPost(models.Model):
                 # Extract extension safely
                 _, ext = os.path.splitext(filename)
                 ext = (ext or '').lower()
-                logger.info(f"Detected video extension: {ext}")
+                logger.debug("Detected video extension: %s", ext)
                 
                 # Validate extension
                 if ext not in ['.mp4', '.mov', '.avi']:
@@ -216,7 +292,7 @@ class SocialPost(models.Model):
                     raise ValidationError(_(error_msg))
                     
             elif self.content_type == 'image' and self.song:
-                logger.info("Validating image with song")
+                logger.debug("Validating image with song")
                 
                 # Validate song audio file
                 if not hasattr(self.song, 'audio_file'):
@@ -230,7 +306,7 @@ class SocialPost(models.Model):
                 # Extract extension
                 _, ext = os.path.splitext(filename)
                 ext = (ext or '').lower()
-                logger.info(f"Detected audio extension: {ext}")
+                logger.debug("Detected audio extension: %s", ext)
                 
                 # Validate extension
                 if ext not in ['.mp3', '.wav', '.ogg']:
@@ -252,6 +328,9 @@ class PostLike(models.Model):
 
     class Meta:
         unique_together = ('post', 'user')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='postlike_user_created_idx'),
+        ]
 
 class PostComment(models.Model):
     post = models.ForeignKey(SocialPost, on_delete=models.CASCADE, related_name='comments')
@@ -259,6 +338,11 @@ class PostComment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'], name='postcomment_post_created_idx'),
+        ]
+
 class PostSave(models.Model):
     post = models.ForeignKey(SocialPost, on_delete=models.CASCADE, related_name='saves')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_posts')
@@ -266,6 +350,28 @@ class PostSave(models.Model):
 
     class Meta:
         unique_together = ('post', 'user')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='postsave_user_created_idx'),
+        ]
+
+class FeedEntry(models.Model):
+    """Materialized home timeline row, written when a followed user posts."""
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(SocialPost, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Copied from the post so feed reads never have to join to order
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('recipient', 'post')
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='feed_recipient_created_idx'),
+            models.Index(fields=['recipient', 'author'], name='feed_recipient_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in feed of {self.recipient_id}"
 
 class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -277,6 +383,18 @@ class Notification(models.Model):
     track = models.ForeignKey(Track, null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_created_idx'),
+            models.Index(fields=['recipient', 'read', '-created_at'], name='notif_recipient_read_idx'),
+            # Only unread rows, so unread_count stays cheap however long the history is
+            models.Index(
+                fields=['recipient', '-created_at'],
+                condition=models.Q(read=False),
+                name='notif_unread_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.sender.username} -> {self.recipient.username}: {self.message}"
 
@@ -303,6 +421,9 @@ class Church(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='church_created_idx'),
+        ]
 
 
 class Videostudio(models.Model):
@@ -375,6 +496,9 @@ class Videostudio(models.Model):
         verbose_name = "Video Studio"
         verbose_name_plural = "Video Studios"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='videostudio_created_idx'),
+        ]
 
 class Choir(models.Model):
     GENRE_CHOICES = (
@@ -409,6 +533,9 @@ class Choir(models.Model):
     class Meta:
         verbose_name_plural = "Choirs"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='choir_created_idx'),
+        ]
 
 class Group(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_groups')
@@ -418,6 +545,8 @@ class Group(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # cover_image = models.ImageField(upload_to='group_covers/', blank=True, null=True)
     cover_image = CloudinaryField('image', folder='group_covers/', blank=True, null=True)
+    # Per-size delivery URLs for cover_image, kept in step by songs.signals
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     is_private = models.BooleanField(default=True)
     slug = models.SlugField(unique=True, max_length=100)
 
@@ -432,6 +561,11 @@ class Group(models.Model):
             self.slug = slug
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='group_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -443,6 +577,9 @@ class GroupMember(models.Model):
 
     class Meta:
         unique_together = ('group', 'user')
+        indexes = [
+            models.Index(fields=['group', 'is_admin'], name='groupmember_group_admin_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} in {self.group.name}"
@@ -462,6 +599,9 @@ class GroupJoinRequest(models.Model):
 
     class Meta:
         unique_together = ('group', 'user')
+        indexes = [
+            models.Index(fields=['group', 'status', '-created_at'], name='joinrequest_group_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.group.name} ({self.status})"
@@ -473,6 +613,11 @@ class GroupPost(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', '-created_at', '-id'], name='grouppost_group_created_idx'),
+        ]
+
     def __str__(self):
         return f"Post in {self.group.name} by {self.user.username}"
 
@@ -562,6 +707,11 @@ class Product(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='product_seller_created_idx'),
+            models.Index(fields=['category', 'is_available'], name='product_category_avail_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} by {self.seller.username}"
@@ -582,7 +732,10 @@ class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     # image = models.ImageField(upload_to='products/images/', validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])])
     image = CloudinaryField('image', folder='products/images/')
+    # Per-size delivery URLs for image, kept in step by songs.signals
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     is_primary = models.BooleanField(default=False)
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default=UPLOAD_READY)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -648,6 +801,9 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} by {self.buyer.username}"
@@ -681,6 +837,9 @@ class ProductReview(models.Model):
     class Meta:
         unique_together = ('product', 'reviewer')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_idx'),
+        ]
     
     def __str__(self):
         return f"Review by {self.reviewer.username} for {self.product.title}"
@@ -741,6 +900,10 @@ class LiveEvent(models.Model):
     
     class Meta:
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['-start_time', '-id'], name='liveevent_start_idx'),
+            models.Index(fields=['is_live', '-start_time'], name='liveevent_live_start_idx'),
+        ]
         verbose_name = "Live Event"
         verbose_name_plural = "Live Events"
         
@@ -803,29 +966,94 @@ class LiveEvent(models.Model):
         """Override save to ensure validation and set thumbnail"""
         self.full_clean()
         
-        # Always try to set thumbnail if not provided
+        # Save with the always-present mqdefault thumbnail straight away; a
+        # background task upgrades it once the better sizes have been probed
         if not self.thumbnail:
             video_id = self.extract_youtube_id(self.youtube_url)
             if video_id:
-                # Try multiple thumbnail qualities
-                thumbnail_options = [
-                    f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
-                    f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
-                    f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg",
-                    f"https://img.youtube.com/vi/{video_id}/default.jpg"
-                ]
-                
-                # Set the first available thumbnail
-                for thumb_url in thumbnail_options:
-                    if self.thumbnail_exists(thumb_url):
-                        self.thumbnail = thumb_url
-                        break
+                self.thumbnail = thumbnail_url(video_id)
         
         super().save(*args, **kwargs)
-    def thumbnail_exists(self, url):
-        """Check if thumbnail URL is valid"""
-        try:
-            response = requests.head(url, timeout=2)
-            return response.status_code == 200
-        except:
-            return False
\ No newline at end of file
+
+    def upgrade_thumbnail(self):
+        """Swap the default thumbnail for the best size YouTube actually has."""
+        video_id = self.extract_youtube_id(self.youtube_url)
+        if not video_id or self.thumbnail != thumbnail_url(video_id):
+            # Only auto-generated thumbnails are upgraded
+            return False
+        best = resolve_thumbnail(video_id)
+        if best == self.thumbnail:
+            return False
+        # Conditional so a thumbnail changed meanwhile is not overwritten
+        updated = LiveEvent.objects.filter(pk=self.pk, thumbnail=self.thumbnail).update(thumbnail=best)
+        if updated:
+            self.thumbnail = best
+        return bool(updated)
+
+class AudienceSketch(models.Model):
+    """
+    HyperLogLog sketch of the distinct users who viewed a Track, Product or
+    LiveEvent over one period (see songs.sketches). A fixed 4 KB per row
+    whatever the audience size.
+    """
+    DAY = 'day'
+    WEEK = 'week'
+    ALL_TIME = 'all'
+    PERIOD_CHOICES = [(DAY, 'Day'), (WEEK, 'Week'), (ALL_TIME, 'All time')]
+
+    # model_name of the counted object ('track', 'product', 'liveevent')
+    target = models.CharField(max_length=20)
+    object_id = models.PositiveIntegerField()
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    # First day of the period; all-time rows use date.min
+    period_start = models.DateField()
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['target', 'object_id', 'period', 'period_start'],
+                name='audience_sketch_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.target} {self.object_id} audience ({self.period} from {self.period_start})"
+
+
+class SearchEntry(models.Model):
+    """
+    One church, choir, video studio, group, product, live event or user in
+    the unified search index (see songs.search), kept up to date by signals.
+    PostgreSQL searches `vector` behind a GIN index created by migration
+    0024; SQLite searches an FTS5 table instead.
+    """
+    KIND_CHOICES = [
+        ('church', 'Church'),
+        ('choir', 'Choir'),
+        ('videostudio', 'Video studio'),
+        ('group', 'Group'),
+        ('product', 'Product'),
+        ('liveevent', 'Live event'),
+        ('user', 'User'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    # What the object's detail route is looked up by (its pk, or its slug)
+    lookup = models.CharField(max_length=255)
+    title = models.CharField(max_length=255)
+    subtitle = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    # Private groups only show up for their creator and members
+    is_private = models.BooleanField(default=False)
+    vector = SearchVectorField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_entry_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
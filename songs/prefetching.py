@@ -0,0 +1,185 @@
+"""
+select_related / prefetch_related derived from a serializer's shape.
+
+`plan_queryset(queryset, serializer)` walks the serializer's fields:
+
+- a nested serializer or dotted source over a foreign key / one-to-one
+  becomes `select_related`;
+- a nested `many=True` serializer or many-valued relation becomes a
+  `Prefetch` whose queryset is planned the same way for the child;
+- a nested serializer whose fields read annotations (`Meta.annotations`,
+  named in `Meta.field_sources`) is fetched through `Prefetch(queryset=...annotate())` instead of a join,
+  since joined rows cannot carry annotations.
+
+Fields whose value does not come from `source` (method fields, fields
+filled in by `to_representation`) declare the model paths they read in
+`Meta.field_sources`, e.g. `{'profile_picture': ['profile']}`.
+
+Relations the view's queryset already loads by hand are left alone.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, aprefetch_related_objects, prefetch_related_objects
+from rest_framework import serializers
+
+
+def _relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _nested(field):
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.ModelSerializer) else None
+
+
+def _paths(name, field, declared):
+    """Model paths (`a__b`) a field reads, and the nested serializer at the end of them."""
+    if name in declared:
+        return [(path, None) for path in declared[name]]
+    if field.write_only or field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+        return []
+    return [(field.source.replace('.', '__'), _nested(field))]
+
+
+def _apply(queryset, select, prefetch, annotations):
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset
+
+
+def _prefixed(lookup, prefix):
+    if isinstance(lookup, Prefetch):
+        return Prefetch(f'{prefix}__{lookup.prefetch_through}', queryset=lookup.queryset)
+    return f'{prefix}__{lookup}'
+
+
+def _follow(model, parts, nested):
+    """(select, prefetch) needed to reach `parts` from `model`."""
+    field = _relation(model, parts[0])
+    if field is None:
+        # A property or plain column: nothing to load
+        return set(), []
+    related = field.related_model
+    if len(parts) > 1:
+        select, prefetch = _follow(related, parts[1:], nested)
+        annotations = {}
+    elif nested is not None:
+        select, prefetch, annotations = plan(nested, related)
+    else:
+        select, prefetch, annotations = set(), [], {}
+
+    name = parts[0]
+    single = (field.many_to_one or field.one_to_one) and not annotations
+    if single:
+        return {name} | {f'{name}__{path}' for path in select}, [_prefixed(lookup, name) for lookup in prefetch]
+    queryset = _apply(related._default_manager.all(), select, prefetch, annotations)
+    return set(), [Prefetch(name, queryset=queryset)]
+
+
+def plan(serializer, model):
+    """(select_related paths, prefetch lookups, annotations) for `serializer` over `model`."""
+    meta = getattr(serializer, 'Meta', None)
+    declared = getattr(meta, 'field_sources', {})
+    # Annotations are only worth computing for the fields that read them
+    wanted = {path for name in serializer.fields for path in declared.get(name, ())}
+    annotations = {
+        name: expression for name, expression in getattr(meta, 'annotations', {}).items()
+        if name in wanted
+    }
+    select, prefetch, seen = set(), [], set()
+    for name, field in serializer.fields.items():
+        for path, nested in _paths(name, field, declared):
+            field_select, field_prefetch = _follow(model, path.split('__'), nested)
+            select |= field_select
+            for lookup in field_prefetch:
+                to = getattr(lookup, 'prefetch_to', lookup)
+                if to not in seen:
+                    seen.add(to)
+                    prefetch.append(lookup)
+    # A field that only needs the related row (say `can_edit` reading
+    # `user`) must not join what a nested serializer prefetches
+    return _outside(select, seen), prefetch, annotations
+
+
+def plan_queryset(queryset, serializer):
+    """`queryset` with the loading `serializer` needs added to it."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return queryset
+    select, prefetch, annotations = plan(serializer, queryset.model)
+
+    # Relations the view already prefetches by hand are left to it; its
+    # select_related is merged with ours
+    handled = {
+        getattr(lookup, 'prefetch_to', lookup).split('__')[0]
+        for lookup in queryset._prefetch_related_lookups
+    }
+    select = {path for path in select if path.split('__')[0] not in handled}
+    prefetch = [
+        lookup for lookup in prefetch
+        if getattr(lookup, 'prefetch_to', lookup).split('__')[0] not in handled
+    ]
+    taken = set(queryset.query.annotations) | {field.name for field in queryset.model._meta.get_fields()}
+    annotations = {name: expression for name, expression in annotations.items() if name not in taken}
+
+    # A relation the view joins is already cached on each row, and Django
+    # skips prefetching it; drop the join where we need the prefetch instead
+    existing = queryset.query.select_related
+    if isinstance(existing, dict) and prefetch:
+        joined = set(select_related_paths(existing))
+        kept = _outside(joined, {getattr(lookup, 'prefetch_to', lookup) for lookup in prefetch})
+        if kept != joined:
+            queryset = queryset.select_related(None)
+            select |= kept
+    return _apply(queryset, select, prefetch, annotations)
+
+
+def prefetch_objects(instances, serializer):
+    """
+    Load what `serializer` reads onto `instances` that were fetched some
+    other way (e.g. through a feed entry). Annotations on the instances
+    themselves cannot be added after the fact.
+    """
+    lookups = _object_lookups(instances, serializer)
+    if lookups:
+        prefetch_related_objects(instances, *lookups)
+
+
+async def aprefetch_objects(instances, serializer):
+    """`prefetch_objects` for async views."""
+    lookups = _object_lookups(instances, serializer)
+    if lookups:
+        await aprefetch_related_objects(instances, *lookups)
+
+
+def _object_lookups(instances, serializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not instances or not isinstance(serializer, serializers.ModelSerializer):
+        return []
+    select, prefetch, _ = plan(serializer, type(instances[0]))
+    return [*sorted(select), *prefetch]
+
+
+def _outside(paths, prefetched):
+    """`paths` that are not, and do not run through, a prefetched relation."""
+    return {
+        path for path in paths
+        if not any(path == to or path.startswith(f'{to}__') for to in prefetched)
+    }
+
+
+def select_related_paths(tree, prefix=''):
+    """Every `a__b` path in a `query.select_related` dict, parents first."""
+    for name, subtree in tree.items():
+        yield prefix + name
+        yield from select_related_paths(subtree, f'{prefix}{name}__')
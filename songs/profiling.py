@@ -0,0 +1,288 @@
+"""
+Per-request profiling.
+
+`ProfilingMiddleware` measures every request: wall time, time spent in the
+database, the number of queries and how many of them repeat an earlier one
+verbatim (the signature of an N+1), cache hits and misses, and time spent
+in serializers. The numbers go out as a `Server-Timing` header, which
+browser dev tools show next to the request, and a sample of requests (plus
+every slow one) is written as a JSON line to the `songs.profiling` logger.
+
+Staff can add `?profile=1` to any URL to get a full profiler report back
+instead of the response: pyinstrument's HTML when it is installed,
+cProfile's stats otherwise.
+
+The middleware runs in sync (WSGI) and async (ASGI) stacks alike. Under
+ASGI the queries of one request run in other threads than the middleware,
+so every connection records into whichever request profile is current in
+the context the query runs in.
+"""
+import cProfile
+import contextvars
+import io
+import json
+import logging
+import pstats
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_profile', default=None)
+_MISSING = object()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.db_time = 0.0
+        self.queries = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = Counter()
+        self._open_spans = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[(sql, str(params))] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        return self.query_count - len(self.queries)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        metrics = [
+            f'total;dur={self.total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries / '
+            f'{self.duplicate_count} duplicate"',
+            f'cache;desc="{self.cache_hits} hits / {self.cache_misses} misses"',
+        ]
+        metrics += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.spans.items()]
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'queries': self.query_count,
+            'duplicate_queries': self.duplicate_count,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in self.spans.items()},
+            'top_duplicates': [
+                {'sql': sql[:500], 'count': count}
+                for (sql, _), count in self.queries.most_common(3) if count > 1
+            ],
+        }
+
+
+@contextmanager
+def span(name):
+    """
+    Add the time spent inside the block to the current request's `name`
+    timing. Nested blocks of the same name are only counted once.
+    """
+    profile = _current.get()
+    if profile is None or profile._open_spans[name]:
+        yield
+        return
+    profile._open_spans[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] += time.perf_counter() - started
+        profile._open_spans[name] -= 1
+
+
+@contextmanager
+def _count_cache_reads(cache, profile):
+    """Count hits and misses of `cache`'s reads for this request (the instance is per thread)."""
+    get, get_many = cache.get, cache.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        if value is _MISSING:
+            profile.cache_misses += 1
+            return default
+        profile.cache_hits += 1
+        return value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        profile.cache_hits += len(found)
+        profile.cache_misses += len(keys) - len(found)
+        return found
+
+    cache.get, cache.get_many = counted_get, counted_get_many
+    try:
+        yield
+    finally:
+        del cache.get, cache.get_many
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+def _watch(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+# Connections are per thread, and async views query from worker threads
+connection_created.connect(_watch)
+
+
+@contextmanager
+def _recording(profile):
+    for connection in connections.all():
+        _watch(connection)
+    token = _current.set(profile)
+    try:
+        with ExitStack() as stack:
+            for cache in caches.all():
+                stack.enter_context(_count_cache_reads(cache, profile))
+            yield
+    finally:
+        _current.reset(token)
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # API clients authenticate with a JWT, which DRF only reads in the view
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        user = authenticated[0] if authenticated else None
+    return bool(user is not None and user.is_staff)
+
+
+def _sampled(profile):
+    if profile.total * 1000 >= getattr(settings, 'PROFILING_SLOW_MS', 500):
+        return True
+    return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0.01)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            return self.get_response(request)
+        if request.GET.get('profile') == '1' and _is_staff(request):
+            with _Report() as report:
+                self.get_response(request)
+            return report.response()
+
+        profile = RequestProfile()
+        with _recording(profile):
+            response = self.get_response(request)
+        return self._finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            return await self.get_response(request)
+        if request.GET.get('profile') == '1' and await sync_to_async(_is_staff)(request):
+            with _Report() as report:
+                await self.get_response(request)
+            return report.response()
+
+        profile = RequestProfile()
+        with _recording(profile):
+            response = await self.get_response(request)
+        return self._finish(request, response, profile)
+
+    def _finish(self, request, response, profile):
+        profile.finish()
+        if getattr(settings, 'PROFILING_SERVER_TIMING', True):
+            response['Server-Timing'] = profile.server_timing()
+        if _sampled(profile):
+            logger.info(json.dumps(self._record(request, response, profile)))
+        return response
+
+    def _record(self, request, response, profile):
+        match = request.resolver_match
+        return {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'view': match._func_path if match else None,
+            'status': response.status_code,
+            **profile.as_dict(),
+        }
+
+
+class _Report:
+    """
+    Profiles the block and renders the result. Both profilers only see the
+    thread they were started in, so under ASGI the report leaves out
+    whatever the request ran in worker threads.
+    """
+
+    def __enter__(self):
+        if Profiler is not None:
+            self.profiler = Profiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if Profiler is not None:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def response(self):
+        if Profiler is not None:
+            return HttpResponse(self.profiler.output_html())
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out).sort_stats('cumulative')
+        stats.print_stats(getattr(settings, 'PROFILING_REPORT_LINES', 60))
+        return HttpResponse(out.getvalue(), content_type='text/plain; charset=utf-8')
@@ -0,0 +1,265 @@
+"""
+Full-text search over tracks (title, artist username, album and lyrics),
+and unified search over churches, choirs, video studios, groups, products,
+live events and users.
+
+PostgreSQL keeps a weighted tsvector per track in TrackSearch, behind a GIN
+index. SQLite (local runs) keeps the same text in the FTS5 table
+`songs_track_fts`, with bm25 weights standing in for the tsvector weights.
+Both are written by `index_tracks` from signals, in the transaction that
+changed the track.
+
+`search_tracks` returns a Track queryset annotated with `rank` (higher is
+better) and `snippet`, a stretch of the lyrics around the matches.
+Matches are delimited with control characters that `highlight` turns into
+<mark> tags after escaping the lyrics themselves.
+
+The unified index has one SearchEntry per object: a title, a subtitle and
+a body, built by the `ENTRY_SOURCES` builders and weighted like the track
+document. `search_entries` ranks all kinds against each other in one
+query, and leaves out private groups the user neither created nor joined.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Q, TextField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.utils.html import escape
+
+from .models import (
+    Choir, Church, Group, LiveEvent, Product, SearchEntry, Track, TrackSearch, User, Videostudio,
+)
+
+FTS_TABLE = 'songs_track_fts'
+ENTRY_FTS_TABLE = 'songs_searchentry_fts'
+# Delimit matches in snippets; unlike markup, they cannot occur in lyrics
+MATCH_START = '\x02'
+MATCH_STOP = '\x03'
+
+_POSTGRES_INDEX = f"""
+    INSERT INTO {TrackSearch._meta.db_table} (track_id, vector)
+    SELECT track.id,
+           setweight(to_tsvector(%s::regconfig, coalesce(track.title, '')), 'A') ||
+           setweight(to_tsvector(%s::regconfig, coalesce(artist.username, '')), 'A') ||
+           setweight(to_tsvector(%s::regconfig, coalesce(track.album, '')), 'B') ||
+           setweight(to_tsvector(%s::regconfig, coalesce(track.lyrics, '')), 'C')
+    FROM {Track._meta.db_table} track
+    JOIN {User._meta.db_table} artist ON artist.id = track.artist_id
+    WHERE track.id = ANY(%s)
+    ON CONFLICT (track_id) DO UPDATE SET vector = EXCLUDED.vector
+"""
+
+_SQLITE_INDEX = f"""
+    INSERT INTO {FTS_TABLE} (rowid, title, artist, album, lyrics)
+    SELECT track.id, track.title, artist.username, coalesce(track.album, ''), coalesce(track.lyrics, '')
+    FROM {Track._meta.db_table} track
+    JOIN {User._meta.db_table} artist ON artist.id = track.artist_id
+    WHERE track.id IN ({{ids}})
+"""
+
+
+def _config():
+    return getattr(settings, 'SEARCH_CONFIG', 'english')
+
+
+def index_tracks(pks):
+    """(Re)build the search documents of the tracks `pks`."""
+    pks = list(pks)
+    if not pks:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(_POSTGRES_INDEX, [_config()] * 4 + [pks])
+        elif connection.vendor == 'sqlite':
+            ids = ', '.join(['%s'] * len(pks))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({ids})', pks)
+            cursor.execute(_SQLITE_INDEX.format(ids=ids), pks)
+
+
+def remove_tracks(pks):
+    """Drop deleted tracks from the index (PostgreSQL's rows go by cascade)."""
+    pks = list(pks)
+    if pks and connection.vendor == 'sqlite':
+        ids = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({ids})', pks)
+
+
+def search_tracks(text, queryset=None):
+    """`queryset` (all tracks by default) narrowed to matches of `text`, annotated with rank and snippet."""
+    queryset = Track.objects.all() if queryset is None else queryset
+    if connection.vendor == 'postgresql':
+        return _search_postgres(text, queryset)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(text, queryset)
+    raise NotImplementedError(f"Track search is not available on {connection.vendor}")
+
+
+def _search_postgres(text, queryset):
+    query = SearchQuery(text, search_type='websearch', config=_config())
+    return queryset.filter(search_document__vector=query).annotate(
+        # double precision, so the cursor round-trips the rank exactly
+        rank=Cast(SearchRank(F('search_document__vector'), query), FloatField()),
+        snippet=SearchHeadline(
+            'lyrics', query, config=_config(), start_sel=MATCH_START, stop_sel=MATCH_STOP,
+            min_words=8, max_words=24,
+        ),
+    )
+
+
+def _fts5_query(text):
+    # Every word must appear; quoting keeps FTS5 syntax out of user input
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def _search_sqlite(text, queryset):
+    match = _fts5_query(text)
+    if not match:
+        return queryset.none()
+    track = Track._meta.db_table
+    matching = f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {track}.id'
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    ).annotate(
+        # bm25 is lower for better matches; column weights follow the tsvector's
+        rank=RawSQL(f'SELECT -bm25({FTS_TABLE}, 10.0, 10.0, 4.0, 1.0) {matching}', [match],
+                    output_field=FloatField()),
+        snippet=RawSQL(f"SELECT snippet({FTS_TABLE}, 3, %s, %s, '…', 16) {matching}",
+                       [MATCH_START, MATCH_STOP, match], output_field=TextField()),
+    )
+
+
+def highlight(snippet):
+    """Escaped snippet with its matches wrapped in <mark>."""
+    return escape(snippet or '').replace(MATCH_START, '<mark>').replace(MATCH_STOP, '</mark>')
+
+
+def _church_entry(church):
+    details = [church.country, church.county, church.conference, church.district, church.pastor]
+    return {'title': church.name, 'subtitle': church.location, 'body': ' '.join(filter(None, details))}
+
+
+def _place_entry(place):
+    # Choirs and video studios
+    return {'title': place.name, 'subtitle': place.location, 'body': place.description or ''}
+
+
+def _group_entry(group):
+    return {'lookup': group.slug, 'title': group.name, 'body': group.description,
+            'is_private': group.is_private}
+
+
+def _product_entry(product):
+    return {'lookup': product.slug, 'title': product.title, 'subtitle': product.seller.username,
+            'body': product.description}
+
+
+def _live_event_entry(event):
+    return {'title': event.title, 'subtitle': event.user.username, 'body': event.description or ''}
+
+
+def _user_entry(user):
+    if not user.is_active:
+        return None
+    return {'title': user.username, 'subtitle': user.get_full_name(), 'body': user.bio}
+
+
+# kind -> (model, fields the entry is built from, builder returning the
+# entry's fields, or None to leave the object out)
+ENTRY_SOURCES = {
+    'church': (Church, {'name', 'location', 'country', 'county', 'conference', 'district', 'pastor'},
+               _church_entry),
+    'choir': (Choir, {'name', 'location', 'description'}, _place_entry),
+    'videostudio': (Videostudio, {'name', 'location', 'description'}, _place_entry),
+    'group': (Group, {'name', 'slug', 'description', 'is_private'}, _group_entry),
+    'product': (Product, {'title', 'slug', 'description', 'seller'}, _product_entry),
+    'liveevent': (LiveEvent, {'title', 'description', 'user'}, _live_event_entry),
+    'user': (User, {'username', 'first_name', 'last_name', 'bio', 'is_active'}, _user_entry),
+}
+
+
+def index_objects(kind, objects):
+    """(Re)build the entries of `objects`, all of one `kind`."""
+    _, _, build = ENTRY_SOURCES[kind]
+    indexed, dropped = [], []
+    for obj in objects:
+        fields = build(obj)
+        if fields is None:
+            dropped.append(obj.pk)
+            continue
+        fields.setdefault('lookup', str(obj.pk))
+        entry, _ = SearchEntry.objects.update_or_create(kind=kind, object_id=obj.pk, defaults=fields)
+        indexed.append(entry.pk)
+    remove_objects(kind, dropped)
+    if not indexed:
+        return
+    if connection.vendor == 'postgresql':
+        config = _config()
+        SearchEntry.objects.filter(pk__in=indexed).update(vector=(
+            SearchVector('title', weight='A', config=config)
+            + SearchVector('subtitle', weight='B', config=config)
+            + SearchVector('body', weight='C', config=config)
+        ))
+    elif connection.vendor == 'sqlite':
+        ids = ', '.join(['%s'] * len(indexed))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {ENTRY_FTS_TABLE} WHERE rowid IN ({ids})', indexed)
+            cursor.execute(
+                f'INSERT INTO {ENTRY_FTS_TABLE} (rowid, title, subtitle, body) '
+                f'SELECT id, title, subtitle, body FROM {SearchEntry._meta.db_table} WHERE id IN ({ids})',
+                indexed,
+            )
+
+
+def remove_objects(kind, pks):
+    """Drop the entries of the `kind` objects `pks`."""
+    pks = list(pks)
+    if not pks:
+        return
+    entries = SearchEntry.objects.filter(kind=kind, object_id__in=pks)
+    if connection.vendor == 'sqlite':
+        ids = list(entries.values_list('pk', flat=True))
+        if ids:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {ENTRY_FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", ids)
+    entries.delete()
+
+
+def visible_entries(user):
+    """Entries `user` may see: all but the private groups they neither created nor joined."""
+    public = Q(is_private=False)
+    if user is None or not user.is_authenticated:
+        return SearchEntry.objects.filter(public)
+    groups = Group.objects.filter(Q(creator=user) | Q(members__user=user)).values('pk')
+    return SearchEntry.objects.filter(public | Q(kind='group', object_id__in=groups))
+
+
+def search_entries(text, user=None, kinds=None):
+    """Entries matching `text` that `user` may see, of `kinds` (all by default), annotated with rank."""
+    entries = visible_entries(user)
+    if kinds:
+        entries = entries.filter(kind__in=kinds)
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, search_type='websearch', config=_config())
+        return entries.filter(vector=query).annotate(
+            rank=Cast(SearchRank(F('vector'), query), FloatField()),
+        )
+    if connection.vendor == 'sqlite':
+        match = _fts5_query(text)
+        if not match:
+            return entries.none()
+        entry = SearchEntry._meta.db_table
+        return entries.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {ENTRY_FTS_TABLE} WHERE {ENTRY_FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            rank=RawSQL(
+                f'SELECT -bm25({ENTRY_FTS_TABLE}, 10.0, 4.0, 1.0) FROM {ENTRY_FTS_TABLE} '
+                f'WHERE {ENTRY_FTS_TABLE} MATCH %s AND {ENTRY_FTS_TABLE}.rowid = {entry}.id',
+                [match], output_field=FloatField(),
+            ),
+        )
+    raise NotImplementedError(f"Search is not available on {connection.vendor}")
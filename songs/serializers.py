@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from .models import User
-from .models import User,Track,Playlist,Profile,LiveEvent, Comment,Like,Category,SocialPost,PostLike,PostComment,PostSave,Notification,Church,Choir,Group,Videostudio,Choir, GroupMember, GroupJoinRequest, GroupPost,GroupPostAttachment,ProductCategory,ProductImage,Product,CartItem,Cart,OrderItem,Order,ProductReview,Wishlist
+from . import media_urls, uploads
+from .fieldsets import DynamicFieldsMixin
+from django.db.models import Count, Q
+from .models import User,Track,Playlist,Profile,LiveEvent, Comment,Like,Category,SocialPost,PostLike,PostComment,PostSave,Notification,Church,Choir,Group,Videostudio,Choir, GroupMember, GroupJoinRequest, GroupPost,GroupPostAttachment,ProductCategory,ProductImage,Product,CartItem,Cart,OrderItem,Order,ProductReview,Wishlist,SearchEntry
 import re
 from django.utils import timezone
 from datetime import timedelta
@@ -9,6 +12,9 @@ import logging
 import cloudinary
 import os
 from cloudinary import config
+from .viewer_state import (
+    viewer_lookup, LIKED_POSTS, SAVED_POSTS, LIKED_TRACKS, FOLLOWING, GROUP_MEMBERS, GROUP_ADMINS
+)
 logger = logging.getLogger(__name__)
 
 class CloudinaryFieldSerializer(serializers.Field):
@@ -25,28 +31,9 @@ class CloudinaryFieldSerializer(serializers.Field):
             return None
 
         try:
-            # Case 1: CloudinaryResource object
-            if hasattr(value, 'url'):
-                return value.url
-
-            # Case 2: Dictionary format
-            if isinstance(value, dict):
-                return value.get('secure_url') or value.get('url') or value.get('public_id')
-
-            # Case 3: Already a URL string
-            if isinstance(value, str) and value.startswith(('http://', 'https://')):
-                return value
-
-            # Case 4: Public ID - build URL
-            if isinstance(value, str):
-                from cloudinary import CloudinaryImage
-                return str(CloudinaryImage(value).build_url())
-
-            # Fallback: string conversion
-            return str(value)
-
+            return media_urls.media_url(value, request=self.context.get('request'))
         except Exception as e:
-            logger.error(f"Error processing Cloudinary field representation: {str(e)}")
+            logger.error("Error processing Cloudinary field representation: %s", e)
             return None
 
     def to_internal_value(self, data):
@@ -97,7 +84,7 @@ class CloudinaryFieldSerializer(serializers.Field):
                         # Remove file extension if present
                         return os.path.splitext(public_id)[0]
                     except (ValueError, IndexError) as e:
-                        logger.warning(f"Couldn't parse Cloudinary URL: {str(e)}")
+                        logger.warning("Couldn't parse Cloudinary URL: %s", e)
                         return data
                 # Otherwise assume it's already a public_id
                 return data
@@ -106,19 +93,61 @@ class CloudinaryFieldSerializer(serializers.Field):
             return str(data)
 
         except Exception as e:
-            logger.error(f"Error processing Cloudinary input: {str(e)}")
+            logger.error("Error processing Cloudinary input: %s", e)
             raise serializers.ValidationError({
                 'cloudinary': 'Invalid file data. Must be a Cloudinary URL, public_id, or resource object.'
             })
 
-class ProfileSerializer(serializers.ModelSerializer):
+class MediaVariantsMixin:
+    """
+    `variants` method field for models listed in media_urls.VARIANT_SOURCES.
+    `?variant=<name>` narrows the manifest to that one size.
+    """
+
+    def get_variants(self, obj):
+        # Rows saved before manifests existed get one built on the fly
+        manifest = obj.variants or media_urls.variants_for(obj)
+        name = media_urls.requested_variant(self.context)
+        if name:
+            manifest = {name: manifest[name]} if name in manifest else {}
+        request = self.context.get('request')
+        return {key: media_urls.absolute(url, request) for key, url in manifest.items()}
+
+    def variant_url(self, obj):
+        """URL of the requested variant, or None when none was asked for."""
+        name = media_urls.requested_variant(self.context)
+        return self.get_variants(obj).get(name) if name else None
+
+
+class AudienceMixin:
+    """
+    `unique_listeners` / `unique_viewers` method fields: the estimate (see
+    songs.sketches) a detail view puts in the context as 'audience'. Lists
+    and nested serializers leave the field out.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.parent is not None or 'audience' not in self.context:
+            fields.pop('unique_listeners', None)
+            fields.pop('unique_viewers', None)
+        return fields
+
+    def get_unique_listeners(self, obj):
+        return self.context['audience']
+
+    get_unique_viewers = get_unique_listeners
+
+
+class ProfileSerializer(DynamicFieldsMixin, MediaVariantsMixin, serializers.ModelSerializer):
     user_id = serializers.ReadOnlyField(source='user.id')
     picture_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
     username = serializers.ReadOnlyField(source='user.username')
     
     class Meta:
         model = Profile
-        fields = ['bio', 'user_id','username', 'birth_date', 'location', 'is_public', 'picture','picture_url']
+        fields = ['bio', 'user_id','username', 'birth_date', 'location', 'is_public', 'picture','picture_url', 'variants']
         read_only_fields = ['user_id', 'username', 'picture_url']
         extra_kwargs = {
             'picture': {'write_only': True}  # Only needed for uploads
@@ -132,40 +161,10 @@ class ProfileSerializer(serializers.ModelSerializer):
         2. CloudinaryField object
         3. Public ID string
         """
-        if not obj.picture:
-            return None
-            
         try:
-            # Default transformation parameters
-            width = self.context.get('picture_width', 200)
-            height = self.context.get('picture_height', 200)
-            crop = self.context.get('picture_crop', 'fill')
-            gravity = self.context.get('picture_gravity', 'face')
-            quality = self.context.get('picture_quality', 'auto')
-            
-            # Handle Cloudinary resource dict
-            if isinstance(obj.picture, dict):
-                if 'secure_url' in obj.picture:
-                    base_url = obj.picture['secure_url']
-                    return f"{base_url.split('/upload/')[0]}/upload/w_{width},h_{height},c_{crop},g_{gravity},q_{quality}/{base_url.split('/upload/')[1]}"
-                return None
-                
-            # Handle CloudinaryField object
-            elif hasattr(obj.picture, 'url'):
-                base_url = obj.picture.url
-                return f"{base_url.split('/upload/')[0]}/upload/w_{width},h_{height},c_{crop},g_{gravity},q_{quality}/{base_url.split('/upload/')[1]}"
-                
-            # Handle public_id string
-            elif isinstance(obj.picture, str):
-                return (
-                    f"https://res.cloudinary.com/"
-                    f"{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}/"
-                    f"image/upload/w_{width},h_{height},c_{crop},g_{gravity},q_{quality}/{obj.picture}"
-                )
-                
-            return None
+            return media_urls.avatar_url(obj.picture, self.context, 200)
         except Exception as e:
-            logger.error(f"Error processing picture URL: {str(e)}", exc_info=True)
+            logger.error("Error processing picture URL: %s", e, exc_info=True)
             return None
 
     def create(self, validated_data):
@@ -175,10 +174,10 @@ class ProfileSerializer(serializers.ModelSerializer):
             profile = Profile.objects.create(user=user, **validated_data)
             return profile
         except Exception as e:
-            print(f"Profile creation error: {e}")
+            logger.error("Profile creation error: %s", e)
             raise serializers.ValidationError("Profile creation failed")
 
-class SimpleUserSerializer(serializers.ModelSerializer):
+class SimpleUserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
     followers_count = serializers.SerializerMethodField()
     
@@ -186,6 +185,11 @@ class SimpleUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'profile_picture', 'followers_count']
         read_only_fields = ['id', 'username', 'profile_picture']
+        field_sources = {
+            'profile_picture': ['profile'],
+            'followers_count': ['followers_count'],
+        }
+        annotations = {'followers_count': Count('followers', distinct=True)}
     
     def get_profile_picture(self, obj):
         """
@@ -200,61 +204,7 @@ class SimpleUserSerializer(serializers.ModelSerializer):
             return None
 
         try:
-            width = self.context.get('picture_width', 50)
-            height = self.context.get('picture_height', 50)
-            crop = self.context.get('picture_crop', 'fill')
-            gravity = self.context.get('picture_gravity', 'face')
-            quality = self.context.get('picture_quality', 'auto')
-
-            picture = obj.profile.picture
-
-            # If dict, get the URL string
-            if isinstance(picture, dict):
-                url = picture.get('secure_url') or picture.get('url')
-                if url:
-                    # Transform the URL if needed
-                    return (
-                        f"{url.split('/upload/')[0]}/upload/"
-                        f"w_{width},h_{height},c_{crop},g_{gravity},q_{quality}/"
-                        f"{url.split('/upload/')[1]}"
-                    )
-                # If only public_id, build URL
-                public_id = picture.get('public_id')
-                if public_id:
-                    return (
-                        f"https://res.cloudinary.com/"
-                        f"{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}/"
-                        f"image/upload/"
-                        f"w_{width},h_{height},c_{crop},g_{gravity},q_{quality}/"
-                        f"{public_id}"
-                    )
-                return None
-
-            # If CloudinaryField object
-            if hasattr(picture, 'url'):
-                url = picture.url
-                return (
-                    f"{url.split('/upload/')[0]}/upload/"
-                    f"w_{width},h_{height},c_{crop},g_{gravity},q_{quality}/"
-                    f"{url.split('/upload/')[1]}"
-                )
-
-            # If string (public_id or URL)
-            if isinstance(picture, str):
-                if picture.startswith('http'):
-                    # It's already a URL
-                    return picture
-                # Otherwise, build URL from public_id
-                return (
-                    f"https://res.cloudinary.com/"
-                    f"{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}/"
-                    f"image/upload/"
-                    f"w_{width},h_{height},c_{crop},g_{gravity},q_{quality}/"
-                    f"{picture}"
-                )
-
-            return None
-
+            return media_urls.avatar_url(obj.profile.picture, self.context, 50)
         except Exception as e:
             logger.error(
                 f"Error processing profile picture for user {obj.id}: {str(e)}",
@@ -263,12 +213,28 @@ class SimpleUserSerializer(serializers.ModelSerializer):
             return None
     def get_followers_count(self, obj):
         # Use annotated value if available, else count
-        return getattr(obj, 'followers_count', obj.followers.count())
-class UserSerializer(serializers.ModelSerializer):
+        if hasattr(obj, 'followers_count'):
+            return obj.followers_count
+        return obj.followers.count()
+class UserSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Compact user representation used wherever a user is nested in another resource"""
+    profile_picture = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'profile_picture']
+        read_only_fields = fields
+        field_sources = {'profile_picture': ['profile']}
+
+    def get_profile_picture(self, obj):
+        if hasattr(obj, 'profile') and obj.profile.picture:
+            return media_urls.avatar_url(obj.profile.picture, self.context, 200)
+        return None
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     profile_picture = serializers.SerializerMethodField() 
     profile = ProfileSerializer(read_only=True)
-    social_posts = serializers.SerializerMethodField()
     followers_count = serializers.SerializerMethodField()
     following_count = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
@@ -277,47 +243,45 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = [
             'id', 'username', 'email', 'password',
-            'profile', 'social_posts', 'followers_count',
+            'profile', 'followers_count',
             'following_count', 'is_following','profile_picture'
         ]
         extra_kwargs = {
             'password': {'write_only': True},
             'email': {'required': True}
         }
+        field_sources = {
+            'profile_picture': ['profile'],
+            'followers_count': ['followers_count'],
+            'following_count': ['followed_by_count'],
+            'is_following': [],
+        }
+        annotations = {
+            'followers_count': Count('followers', distinct=True),
+            'followed_by_count': Count('followed_by', distinct=True),
+        }
     def get_profile_picture(self, obj):
         """Get optimized profile picture URL from associated profile"""
         if hasattr(obj, 'profile') and obj.profile.picture:
-            # Reuse the transformation logic from ProfileSerializer
-            return ProfileSerializer(
-                obj.profile,
-                context=self.context
-            ).data.get('picture_url')
+            return media_urls.avatar_url(obj.profile.picture, self.context, 200)
         return None
     
-    def get_social_posts(self, obj):
-        posts = obj.social_posts.select_related('user').prefetch_related(
-            'likes',
-            'comments'
-        ).order_by('-created_at')
-        
-        # Optional: Add request-based filtering
-        if self.context.get('request'):
-            # Example: Filter by post type if requested
-            content_type = self.context['request'].GET.get('content_type')
-            if content_type in ['image', 'video']:
-                posts = posts.filter(content_type=content_type)
-                
-        return SocialPostSerializer(posts, many=True, context=self.context).data
-    
     def get_followers_count(self, obj):
-        return getattr(obj, 'followers_count', obj.followers.count())
+        if hasattr(obj, 'followers_count'):
+            return obj.followers_count
+        return obj.followers.count()
     
     def get_following_count(self, obj):
-        return getattr(obj, 'followed_by_count', obj.followed_by.count())
+        if hasattr(obj, 'followed_by_count'):
+            return obj.followed_by_count
+        return obj.followed_by.count()
     
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and request.user != obj:
+            known = viewer_lookup(self.context, FOLLOWING, obj.pk)
+            if known is not None:
+                return known
             return obj.followers.filter(id=request.user.id).exists()
         return False
     
@@ -326,22 +290,32 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(password=password, **validated_data)
         return user
     
-class TrackSerializer(serializers.ModelSerializer):
+class TrackSerializer(DynamicFieldsMixin, AudienceMixin, MediaVariantsMixin, serializers.ModelSerializer):
      likes_count = serializers.SerializerMethodField()
+     unique_listeners = serializers.SerializerMethodField()
      is_liked = serializers.SerializerMethodField()
     #  favorite = serializers.SerializerMethodField()
-     artist = UserSerializer(read_only=True)  # Include full artist detai
+     artist = UserSummarySerializer(read_only=True)
      is_owner = serializers.SerializerMethodField() 
      audio_file = CloudinaryFieldSerializer()
      cover_image = CloudinaryFieldSerializer(required=False)
+     variants = serializers.SerializerMethodField()
      class Meta:
         model = Track
         fields = [
             'id', 'title', 'artist', 'album', 'audio_file','is_owner',
-            'cover_image', 'lyrics', 'slug', 
-            'views', 'downloads','likes_count','is_liked', 'created_at', 'updated_at'
+            'cover_image', 'variants', 'lyrics', 'slug', 
+            'views', 'downloads', 'unique_listeners', 'likes_count','comments_count','is_liked', 'upload_status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['artist', 'slug', 'views', 'downloads', 'created_at', 'updated_at']
+        read_only_fields = ['artist', 'slug', 'views', 'downloads', 'comments_count', 'upload_status', 'created_at', 'updated_at']
+        # Model paths read by fields that don't come straight from `source`
+        field_sources = {
+            'likes_count': ['likes_count'],
+            'unique_listeners': [],
+            'is_liked': [],
+            'is_owner': ['artist'],
+            'variants': ['variants', 'cover_image'],
+        }
         # extra_kwargs = {
         #     'title': {'required': True, 'max_length': 200},
         #     'lyrics': {'allow_blank': True}
@@ -354,10 +328,13 @@ class TrackSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         return Like.objects.filter(user=user, track=obj).exists()
      def get_likes_count(self, obj):
-      return obj.likes.count()
+        return obj.likes_count
      def get_is_liked(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
+            known = viewer_lookup(self.context, LIKED_TRACKS, obj.pk)
+            if known is not None:
+                return known
             return obj.likes.filter(user=user).exists()
         return False
   
@@ -369,8 +346,8 @@ class TrackSerializer(serializers.ModelSerializer):
         return user.is_authenticated and obj.favorites.filter(id=user.id).exists()
 
 
-class PlaylistSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class PlaylistSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
     tracks = TrackSerializer(many=True, read_only=True)
     class Meta:
         model = Playlist
@@ -378,7 +355,7 @@ class PlaylistSerializer(serializers.ModelSerializer):
 
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = SimpleUserSerializer(read_only=True) 
     track = TrackSerializer(read_only=True)
     class Meta:
@@ -386,22 +363,22 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ('id', 'content', 'user', 'track', 'created_at', 'updated_at')
 
 
-class LikeSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class LikeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
     track = TrackSerializer(read_only=True)
     class Meta:
         model = Like
         fields = ('id', 'user', 'track', 'created_at')
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ('id', 'name', 'created_at', 'updated_at')
+        fields = ('id', 'name')
 
 
 
-class SocialPostSerializer(serializers.ModelSerializer):
+class SocialPostSerializer(DynamicFieldsMixin, MediaVariantsMixin, serializers.ModelSerializer):
     user = SimpleUserSerializer(read_only=True)
     song = TrackSerializer(read_only=True)
     likes_count = serializers.SerializerMethodField()
@@ -411,6 +388,7 @@ class SocialPostSerializer(serializers.ModelSerializer):
     media_url = serializers.SerializerMethodField()
     can_edit = serializers.SerializerMethodField()
     optimized_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
     song_id = serializers.PrimaryKeyRelatedField(
         queryset=Track.objects.all(),
         source='song',
@@ -425,13 +403,24 @@ class SocialPostSerializer(serializers.ModelSerializer):
             'id', 'user', 'content_type', 'media_file', 'media_url', 'song','song_id',
             # 'song_start_time', 'song_end_time',
             'caption', 'tags', 'location', 'duration', 'width', 'height',
-            'created_at', 'updated_at', 'likes_count', 'comments_count', 
-            'is_liked', 'is_saved', 'can_edit','optimized_url'
+            'created_at', 'updated_at', 'likes_count', 'comments_count', 'saves_count',
+            'is_liked', 'is_saved', 'can_edit','optimized_url', 'variants', 'upload_status'
         ]
-        read_only_fields = ['user', 'created_at', 'updated_at']
+        read_only_fields = ['user', 'saves_count', 'upload_status', 'created_at', 'updated_at']
         extra_kwargs = {
             'media_file': {'write_only': True}
         }
+        # Model paths read by fields that don't come straight from `source`
+        field_sources = {
+            'likes_count': ['likes_count'],
+            'comments_count': ['comments_count'],
+            'is_liked': [],
+            'is_saved': [],
+            'can_edit': ['user'],
+            'media_url': ['media_file', 'content_type'],
+            'optimized_url': ['media_file', 'content_type', 'variants'],
+            'variants': ['media_file', 'content_type', 'variants'],
+        }
     
     def get_can_edit(self, obj):
         try:
@@ -442,61 +431,38 @@ class SocialPostSerializer(serializers.ModelSerializer):
             return None  # or safe fallback
 
    
+    def _media_extension(self, obj):
+        return '.jpg' if obj.content_type == 'image' else '.mp4'
+
     def get_media_url(self, obj):
-        if not obj.media_file:
-            return None
-            
         try:
-            # Handle both FileField and raw strings
-            if hasattr(obj.media_file, 'url'):
-                url = obj.media_file.url
-                # Convert auto/upload URLs to proper delivery URLs
-                if '/auto/upload/' in url:
-                    return self._convert_auto_url(url, obj.content_type)
-                return url
-                
-            if isinstance(obj.media_file, str):
-                ext = '.jpg' if obj.content_type == 'image' else '.mp4'
-                return f"https://res.cloudinary.com/{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}/{obj.content_type}/upload/{obj.media_file}{ext}"
-                
+            # Stored as `auto` uploads; delivered under the post's real type
+            return media_urls.media_url(
+                obj.media_file,
+                resource_type=obj.content_type,
+                default_extension=self._media_extension(obj),
+                request=self.context.get('request')
+            )
         except Exception as e:
-            logger.error(f"URL generation error for post {obj.id}: {str(e)}")
+            logger.error("URL generation error for post %s: %s", obj.id, e)
             return None
 
-    def _convert_auto_url(self, url, content_type):
-        """Convert auto/upload URL to proper delivery URL"""
-        parts = url.split('/auto/upload/')
-        if len(parts) != 2:
-            return url
-            
-        public_id = parts[1]
-        ext = '.jpg' if content_type == 'image' else '.mp4'
-        
-        return f"https://res.cloudinary.com/{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}/{content_type}/upload/{public_id}{ext}"
-
     def get_optimized_url(self, obj):
-        if not obj.media_file:
-            return None
-            
         try:
-            base_url = f"https://res.cloudinary.com/{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}"
-            ext = '.jpg' if obj.content_type == 'image' else '.mp4'
-            
-            if hasattr(obj.media_file, 'url') and '/auto/upload/' in obj.media_file.url:
-                public_id = obj.media_file.url.split('/auto/upload/')[1]
-            elif isinstance(obj.media_file, str):
-                public_id = obj.media_file
-            else:
-                return None
-                
-            if obj.content_type == 'image':
-                return f"{base_url}/image/upload/w_600,h_600,c_fill,q_auto,f_auto/{public_id}{ext}"
-            else:
-                return f"{base_url}/video/upload/q_auto,f_auto/{public_id}{ext}"
-                
+            variant = self.variant_url(obj)
+            if variant:
+                return variant
+            return media_urls.media_url(
+                obj.media_file,
+                media_urls.POST_IMAGE if obj.content_type == 'image' else media_urls.POST_VIDEO,
+                resource_type=obj.content_type,
+                default_extension=self._media_extension(obj),
+                request=self.context.get('request')
+            )
         except Exception as e:
-            logger.error(f"Optimized URL error: {str(e)}")
+            logger.error("Optimized URL error: %s", e)
             return None
+
     def to_internal_value(self, data):
         internal_data = super().to_internal_value(data)
         
@@ -527,106 +493,57 @@ class SocialPostSerializer(serializers.ModelSerializer):
                         except ValueError:
                             pass
                     except Exception as e:
-                        logger.error(f"URL parsing error: {str(e)}")
+                        logger.error("URL parsing error: %s", e)
         
         return internal_data
     def create(self, validated_data):
         """Create a new social post with enhanced logging"""
-        logger.info(f"Creating new social post with data: {validated_data}")
+        logger.debug("Creating new social post with data: %s", validated_data)
         try:
             post = SocialPost.objects.create(**validated_data)
-            logger.info(f"Successfully created post {post.id}")
+            logger.info("Successfully created post %s", post.id)
             if post.media_file:
-                logger.info(f"Post media details - Type: {post.content_type}, Public ID: {post.media_file}")
+                logger.debug("Post media details - Type: %s, Public ID: %s", post.content_type, post.media_file)
             return post
         except Exception as e:
-            logger.error(f"Post creation failed: {str(e)}", exc_info=True)
+            logger.error("Post creation failed: %s", e, exc_info=True)
             raise
 
     def update(self, instance, validated_data):
         """Update an existing social post with logging"""
-        logger.info(f"Updating post {instance.id} with data: {validated_data}")
+        logger.debug("Updating post %s with data: %s", instance.id, validated_data)
         if 'media_file' in validated_data:
             logger.warning("Attempt to update media_file was blocked (media_file can only be set at creation)")
             validated_data.pop('media_file', None)
         
         try:
             instance = super().update(instance, validated_data)
-            logger.info(f"Successfully updated post {instance.id}")
+            logger.info("Successfully updated post %s", instance.id)
             return instance
         except Exception as e:
-            logger.error(f"Post update failed: {str(e)}", exc_info=True)
+            logger.error("Post update failed: %s", e, exc_info=True)
             raise
-    def _convert_auto_url(self, url, content_type):
-        """Convert auto/upload URL to proper delivery URL"""
-        parts = url.split('/auto/upload/')
-        if len(parts) != 2:
-            return url
-            
-        public_id = parts[1]
-        ext = '.jpg' if content_type == 'image' else '.mp4'
-        
-        return f"https://res.cloudinary.com/{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}/{content_type}/upload/{public_id}{ext}"
-
-
-
-    def _ensure_proper_url(self, url, content_type):
-        """Convert any Cloudinary URL to proper delivery URL"""
-        if not url or 'res.cloudinary.com' not in url:
-            return url
-            
-        # Handle auto/upload URLs
-        if '/auto/upload/' in url:
-            parts = url.split('/auto/upload/')
-            base = parts[0].replace('/auto/upload', '')
-            public_id = parts[1]
-            
-            if content_type == 'image':
-                return f"{base}/image/upload/w_600,h_600,c_fill,q_auto,f_auto/{public_id}.jpg"
-            else:
-                return f"{base}/video/upload/q_auto,f_auto/{public_id}.mp4"
-                
-        # Already proper URL
-        return url
-
-    def _fix_auto_upload_url(self, url, content_type):
-        """
-        Convert auto/upload URLs to proper Cloudinary delivery URLs
-        Example: 
-        Input: https://res.cloudinary.com/dxdmo9j4v/auto/upload/vdv2gbt7zagsmongikwr
-        Output: https://res.cloudinary.com/dxdmo9j4v/image/upload/w_600,h_600,c_fill/vdv2gbt7zagsmongikwr.jpg
-        """
-        try:
-            parts = url.split('/auto/upload/')
-            if len(parts) != 2:
-                return url
-                
-            base = parts[0].replace('/auto/upload', '')
-            public_id = parts[1]
-            
-            if content_type == 'image':
-                return f"{base}/image/upload/w_600,h_600,c_fill,q_auto,f_auto/{public_id}.jpg"
-            else:
-                return f"{base}/video/upload/q_auto,f_auto/{public_id}.mp4"
-                
-        except Exception as e:
-            logger.error(f"Error fixing auto upload URL {url}: {str(e)}")
-            return url
     def get_likes_count(self, obj):
-        return obj.likes.count()
+        return obj.likes_count
 
     def get_comments_count(self, obj):
-        return obj.comments.count()
+        return obj.comments_count
 
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            known = viewer_lookup(self.context, LIKED_POSTS, obj.pk)
+            if known is not None:
+                return known
             return obj.likes.filter(user=request.user).exists()
         return False
 
     def get_is_saved(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            known = viewer_lookup(self.context, SAVED_POSTS, obj.pk)
+            if known is not None:
+                return known
             return obj.saves.filter(user=request.user).exists()
         return False
 
@@ -663,8 +580,8 @@ class SocialPostUploadSerializer(serializers.Serializer):
     location = serializers.CharField(max_length=100, required=False, allow_blank=True)
     duration = serializers.DurationField(required=False, allow_null=True)
 
-class PostLikeSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class PostLikeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
     post = SocialPostSerializer(read_only=True)
 
     class Meta:
@@ -673,8 +590,8 @@ class PostLikeSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'post', 'created_at']
 
 
-class PostCommentSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class PostCommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
     post = SocialPostSerializer(read_only=True)
 
     class Meta:
@@ -683,8 +600,8 @@ class PostCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'post', 'created_at']
 
 
-class PostSaveSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class PostSaveSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
     post = SocialPostSerializer(read_only=True)
 
     class Meta:
@@ -693,7 +610,7 @@ class PostSaveSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'post', 'created_at']
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     sender = SimpleUserSerializer(read_only=True)
     post = SocialPostSerializer(read_only=True, required=False)
     track = TrackSerializer(read_only=True, required=False)
@@ -707,46 +624,57 @@ class NotificationSerializer(serializers.ModelSerializer):
             'created_at', 'related_comment'
         ]
     
+    @staticmethod
+    def related_comments(notifications):
+        """
+        `{(post_id, sender_id): content}` of the first comment behind each
+        comment notification, in one query for a whole page.
+        """
+        pairs = {
+            (n.__dict__.get('post_id'), n.__dict__.get('sender_id'))
+            for n in notifications if n.__dict__.get('notification_type') == 'comment'
+        }
+        pairs.discard((None, None))
+        if not pairs:
+            return {}
+        matches = Q()
+        for post_id, sender_id in pairs:
+            matches |= Q(post_id=post_id, user_id=sender_id)
+        comments = {}
+        for post_id, user_id, content in PostComment.objects.filter(matches).order_by('pk') \
+                .values_list('post_id', 'user_id', 'content'):
+            comments.setdefault((post_id, user_id), content)
+        return comments
+
     def get_related_comment(self, obj):
-        if obj.notification_type == 'comment':
-            from .models import PostComment  # Import here to avoid circular imports
-            comment = PostComment.objects.filter(
-                post=obj.post,
-                user=obj.sender
-            ).first()
-            return comment.content if comment else None
-        return None
+        if obj.notification_type != 'comment':
+            return None
+        comments = self.context.get('related_comments')
+        if comments is None:
+            comments = self.related_comments([obj])
+        return comments.get((obj.post_id, obj.sender_id))
 
-class SimpleUserSerializer(serializers.ModelSerializer):
+class SimpleUserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ['id', 'username', 'profile_picture']
+        field_sources = {'profile_picture': ['profile']}
     
     def get_profile_picture(self, obj):
         """Get optimized profile picture URL"""
         if hasattr(obj, 'profile') and obj.profile.picture:
             picture = obj.profile.picture
             
-            # Handle Cloudinary resource dict
-            if isinstance(picture, dict):
-                return picture.get('secure_url')
-            
-            # Handle CloudinaryField object
-            if hasattr(picture, 'url'):
-                return picture.url
-                
-            # Handle public_id string
+            # Stored public ids get a thumbnail; uploaded resources are served as stored
+            request = self.context.get('request')
             if isinstance(picture, str):
-                return (
-                    f"https://res.cloudinary.com/"
-                    f"{settings.CLOUDINARY_STORAGE['CLOUD_NAME']}/"
-                    f"image/upload/w_50,h_50,c_fill/{picture}"
-                )
-        
+                return media_urls.media_url(picture, media_urls.AVATAR_THUMB, request=request)
+            return media_urls.media_url(picture, request=request)
+
         return None
-class ChurchSerializer(serializers.ModelSerializer):
+class ChurchSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     image = CloudinaryFieldSerializer(read_only=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
     created_by_picture = CloudinaryFieldSerializer(source='created_by.profile.picture', read_only=True)
@@ -760,18 +688,15 @@ class ChurchSerializer(serializers.ModelSerializer):
     def get_created_by_picture(self, obj):
         # Ensure we're returning a complete URL
         if hasattr(obj.created_by, 'profile') and obj.created_by.profile.picture:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.created_by.profile.picture.url)
-            return obj.created_by.profile.picture.url
+            return media_urls.media_url(obj.created_by.profile.picture, request=self.context.get('request'))
         return None
 
 
 # Add to existing serializers
 # from .models import Videostudio, Audiostudio, Choir
 
-class VideoStudioSerializer(serializers.ModelSerializer):
-    created_by = UserSerializer(read_only=True)
+class VideoStudioSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    created_by = UserSummarySerializer(read_only=True)
     logo = CloudinaryFieldSerializer(read_only=True)
     cover_image = CloudinaryFieldSerializer(read_only=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
@@ -784,27 +709,20 @@ class VideoStudioSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_by', 'is_verified')
     
     def get_logo_url(self, obj):
-        if obj.logo:
-            return self.context['request'].build_absolute_uri(obj.logo.url)
-        return None
+        return media_urls.media_url(obj.logo, request=self.context.get('request'))
     
     def get_cover_image_url(self, obj):
-        if obj.cover_image:
-            return self.context['request'].build_absolute_uri(obj.cover_image.url)
-        return None
+        return media_urls.media_url(obj.cover_image, request=self.context.get('request'))
 
     def get_created_by_picture(self, obj):
         # Add null checks for safety
         if obj.created_by and hasattr(obj.created_by, 'profile') and obj.created_by.profile.picture:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.created_by.profile.picture.url)
-            return obj.created_by.profile.picture.url
+            return media_urls.media_url(obj.created_by.profile.picture, request=self.context.get('request'))
         return None
 
     # ... rest of the serializer ...
-class ChoirSerializer(serializers.ModelSerializer):
-    created_by = UserSerializer(read_only=True)
+class ChoirSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    created_by = UserSummarySerializer(read_only=True)
     profile_image = CloudinaryFieldSerializer(read_only=True)
     cover_image = CloudinaryFieldSerializer(read_only=True)
     
@@ -814,19 +732,16 @@ class ChoirSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_by', 'members_count')
     
     def get_profile_image_url(self, obj):
-        if obj.profile_image:
-            return self.context['request'].build_absolute_uri(obj.profile_image.url)
-        return None
+        return media_urls.media_url(obj.profile_image, request=self.context.get('request'))
     
     def get_cover_image_url(self, obj):
-        if obj.cover_image:
-            return self.context['request'].build_absolute_uri(obj.cover_image.url)
-        return None
+        return media_urls.media_url(obj.cover_image, request=self.context.get('request'))
     
-class GroupSerializer(serializers.ModelSerializer):
-    creator = UserSerializer(read_only=True)
+class GroupSerializer(DynamicFieldsMixin, MediaVariantsMixin, serializers.ModelSerializer):
+    creator = UserSummarySerializer(read_only=True)
     member_count = serializers.SerializerMethodField()
     is_member = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
     is_admin = serializers.SerializerMethodField()
     cover_image = serializers.ImageField(required=False, allow_null=True) 
     is_private = serializers.BooleanField(default=False)  # Ensure default is False
@@ -835,19 +750,34 @@ class GroupSerializer(serializers.ModelSerializer):
         model = Group
         fields = '__all__'
         read_only_fields = ['creator', 'slug', 'created_at', 'updated_at']
+        field_sources = {
+            'member_count': ['members_total'],
+            'is_member': [],
+            'is_admin': [],
+            'variants': ['variants', 'cover_image'],
+        }
+        annotations = {'members_total': Count('members', distinct=True)}
     
     def get_member_count(self, obj):
+        if hasattr(obj, 'members_total'):
+            return obj.members_total
         return obj.members.count()
     
     def get_is_member(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            known = viewer_lookup(self.context, GROUP_MEMBERS, obj.pk)
+            if known is not None:
+                return known
             return GroupMember.objects.filter(group=obj, user=request.user).exists()
         return False
     
     def get_is_admin(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            known = viewer_lookup(self.context, GROUP_ADMINS, obj.pk)
+            if known is not None:
+                return known
             return GroupMember.objects.filter(
                 group=obj, 
                 user=request.user, 
@@ -855,12 +785,13 @@ class GroupSerializer(serializers.ModelSerializer):
             ).exists()
         return False
 
-class GroupMemberSerializer(serializers.ModelSerializer):
+class GroupMemberSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     
     class Meta:
         model = GroupMember
         fields = ['id', 'user', 'is_admin', 'joined_at']
+        field_sources = {'user': ['user__profile']}
     
     def get_user(self, obj):
         return {
@@ -871,9 +802,9 @@ class GroupMemberSerializer(serializers.ModelSerializer):
             }
         }
 
-class GroupJoinRequestSerializer(serializers.ModelSerializer):
+class GroupJoinRequestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     # user = serializers.StringRelatedField(read_only=True)
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     group = serializers.StringRelatedField(read_only=True)
     
     class Meta:
@@ -884,15 +815,15 @@ class GroupJoinRequestSerializer(serializers.ModelSerializer):
             'message': {'required': False, 'allow_blank': True}
         }
 
-class GroupPostAttachmentSerializer(serializers.ModelSerializer):
+class GroupPostAttachmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = GroupPostAttachment  # Make sure this model is imported
         fields = ['id', 'file', 'file_type', 'created_at']
         read_only_fields = ['file_type', 'created_at']
 
-class GroupPostSerializer(serializers.ModelSerializer):
+class GroupPostSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     # user = serializers.StringRelatedField(read_only=True)
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     attachments = GroupPostAttachmentSerializer(many=True, read_only=True, required=False)
     
     class Meta:
@@ -905,27 +836,27 @@ class GroupPostSerializer(serializers.ModelSerializer):
 
 
 # Add to existing serializers.py
-class ProductCategorySerializer(serializers.ModelSerializer):
+class ProductCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductCategory
         fields = '__all__'
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(DynamicFieldsMixin, MediaVariantsMixin, serializers.ModelSerializer):
     image = CloudinaryFieldSerializer(read_only=True)
     image_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
     
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'image_url', 'is_primary', 'uploaded_at']
-        read_only_fields = ['uploaded_at']
+        fields = ['id', 'image', 'image_url', 'variants', 'is_primary', 'upload_status', 'uploaded_at']
+        read_only_fields = ['upload_status', 'uploaded_at']
     
     def get_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return CloudinaryFieldSerializer().to_representation(obj.image)
+        if self.context.get('request'):
+            return self.variant_url(obj) or media_urls.media_url(obj.image, request=self.context['request'])
         return None
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, AudienceMixin, serializers.ModelSerializer):
     seller = serializers.SerializerMethodField()
     currency = serializers.CharField(max_length=3)
     images = serializers.ListField(
@@ -941,19 +872,27 @@ class ProductSerializer(serializers.ModelSerializer):
         allow_null=True
     )
     is_owner = serializers.SerializerMethodField()
+    unique_viewers = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'seller', 'title', 'description', 'price', 'condition',
             'quantity', 'category', 'is_digital', 'is_available', 'created_at',
-            'updated_at', 'views', 'slug', 'images', 'is_owner', 'track','currency','whatsapp_number', 'contact_number', 'location',
+            'updated_at', 'views', 'unique_viewers', 'slug', 'images', 'is_owner', 'track','currency','whatsapp_number', 'contact_number', 'location',
         ]
         read_only_fields = ['seller', 'created_at', 'updated_at', 'views', 'slug']
+        # images and category are filled in by to_representation
+        field_sources = {
+            'seller': ['seller__profile'],
+            'is_owner': ['seller'],
+            'images': ['images'],
+            'unique_viewers': [],
+        }
 
     def get_seller(self, obj):
         try:
-            return UserSerializer(obj.seller, context=self.context).data
+            return UserSummarySerializer(obj.seller, context=self.context).data
         except AttributeError:
             return None
 
@@ -992,18 +931,28 @@ class ProductSerializer(serializers.ModelSerializer):
             category=category,
             **validated_data
         )
-        for image in images:
-            ProductImage.objects.create(product=product, image=image)
+        # All images go up concurrently, then one INSERT for the rows
+        uploaded, self.failed_uploads = uploads.upload_many(images, 'products/images', 'image')
+        stored = [uploads.stored_value(result) for _, result in uploaded]
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=image, variants=media_urls.variant_manifest(image, 'image'))
+            for image in stored
+        ])
         return product
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['images'] = ProductImageSerializer(
-            instance.images.all(),
-            many=True,
-            context=self.context
-        ).data
-        representation['category'] = instance.category.name if instance.category else None
+        # Skipped when ?fields= leaves them out
+        if 'images' in self.fields:
+            representation['images'] = ProductImageSerializer(
+                instance.images.all(),
+                many=True,
+                context=self.context
+            ).data
+        if 'category' in self.fields:
+            representation['category'] = instance.category.name if instance.category else None
+        if getattr(self, 'failed_uploads', None):
+            representation['failed_uploads'] = self.failed_uploads
         return representation
     
     def update(self, instance, validated_data):
@@ -1022,7 +971,7 @@ class ProductSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     total_price = serializers.SerializerMethodField()
     
@@ -1030,11 +979,12 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['id', 'product', 'quantity', 'added_at', 'total_price']
         read_only_fields = ['added_at']
+        field_sources = {'total_price': ['product']}
     
     def get_total_price(self, obj):
         return obj.product.price * obj.quantity
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     subtotal = serializers.SerializerMethodField()
     total_items = serializers.SerializerMethodField()
@@ -1043,14 +993,16 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id', 'user', 'created_at', 'updated_at', 'items', 'subtotal', 'total_items']
         read_only_fields = ['user', 'created_at', 'updated_at']
+        field_sources = {'subtotal': ['items__product'], 'total_items': ['items']}
     
     def get_subtotal(self, obj):
         return sum(item.product.price * item.quantity for item in obj.items.all())
     
     def get_total_items(self, obj):
-        return obj.items.count()
+        # Counted from the prefetched items rather than a COUNT per cart
+        return len(obj.items.all())
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     total_price = serializers.SerializerMethodField()
     
@@ -1058,14 +1010,15 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price_at_purchase', 'total_price', 'seller']
         read_only_fields = ['price_at_purchase', 'seller']
+        field_sources = {'total_price': []}
     
     def get_total_price(self, obj):
         return obj.price_at_purchase * obj.quantity
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
-    buyer = UserSerializer(read_only=True)
-    seller = UserSerializer(read_only=True)
+    buyer = UserSummarySerializer(read_only=True)
+    seller = UserSummarySerializer(read_only=True)
     
     class Meta:
         model = Order
@@ -1076,15 +1029,15 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['buyer', 'seller', 'total_amount', 'created_at', 'updated_at']
 
-class ProductReviewSerializer(serializers.ModelSerializer):
-    reviewer = UserSerializer(read_only=True)
+class ProductReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    reviewer = UserSummarySerializer(read_only=True)
     
     class Meta:
         model = ProductReview
         fields = ['id', 'product', 'reviewer', 'rating', 'comment', 'created_at']
         read_only_fields = ['reviewer', 'created_at']
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     products = ProductSerializer(many=True, read_only=True)
     
     class Meta:
@@ -1093,20 +1046,21 @@ class WishlistSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at']
 
 
-class LiveEventSerializer(serializers.ModelSerializer):
+class LiveEventSerializer(DynamicFieldsMixin, AudienceMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     embed_url = serializers.SerializerMethodField()
     is_owner = serializers.SerializerMethodField()
     duration = serializers.SerializerMethodField()
     is_active = serializers.SerializerMethodField()
     viewers_count = serializers.IntegerField(read_only=True)
+    unique_viewers = serializers.SerializerMethodField()
     
     class Meta:
         model = LiveEvent
         fields = [
             'id', 'user', 'youtube_url', 'title', 'description',
             'thumbnail', 'is_live', 'start_time', 'end_time',
-            'viewers_count', 'embed_url', 'is_owner', 'duration',
+            'viewers_count', 'unique_viewers', 'embed_url', 'is_owner', 'duration',
             'is_active'
         ]
         read_only_fields = [
@@ -1123,9 +1077,17 @@ class LiveEventSerializer(serializers.ModelSerializer):
                 'help_text': "Maximum 200 characters"
             }
         }
+        field_sources = {
+            'user': ['user__profile'],
+            'embed_url': ['youtube_url'],
+            'is_owner': ['user'],
+            'duration': ['start_time', 'end_time', 'is_live'],
+            'is_active': ['end_time', 'is_live'],
+            'unique_viewers': [],
+        }
     
     def get_user(self, obj):
-        return UserSerializer(obj.user, context=self.context).data
+        return UserSummarySerializer(obj.user, context=self.context).data
     
     def get_embed_url(self, obj):
         return obj.get_embed_url()
@@ -1257,6 +1219,18 @@ class LiveEventSerializer(serializers.ModelSerializer):
 
 
 
+class SearchEntrySerializer(serializers.ModelSerializer):
+    """One typed hit of the unified search; `id` and `lookup` are the matched object's."""
+    id = serializers.IntegerField(source='object_id', read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = SearchEntry
+        fields = ['kind', 'id', 'lookup', 'title', 'subtitle', 'rank']
+        read_only_fields = fields
+
+
+
 class FileSizeValidator:
     def __init__(self, max_size_mb):
         self.max_size_mb = max_size_mb
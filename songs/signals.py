@@ -0,0 +1,204 @@
+from django.db import transaction
+from django.apps import apps
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+from . import autocomplete
+from .background import submit_on_commit
+from .caching import FEATURED_LIVE_EVENTS, NAMESPACES, invalidate
+from .counters import adjust_counter
+from .media_urls import VARIANT_SOURCES, variants_for
+from .models import Comment, Like, LiveEvent, Notification, PostComment, PostLike, PostSave, Product, SocialPost, Track, User
+from .search import ENTRY_SOURCES, index_objects, index_tracks, remove_objects, remove_tracks
+from .thumbnails import thumbnail_url
+from .unread_counts import adjust_unread_count
+
+
+def _parent_is_being_deleted(origin, parent_model):
+    """True when the delete cascades from the counted parent itself."""
+    if origin is None:
+        return False
+    model = getattr(origin, 'model', None) or type(origin)
+    return model is parent_model
+
+
+def _connect_counter(related_model, parent_model, fk_attname, field):
+    def on_create(sender, instance, created, **kwargs):
+        if created:
+            adjust_counter(parent_model, getattr(instance, fk_attname), field, 1)
+
+    def on_delete(sender, instance, origin=None, **kwargs):
+        # No point updating a row that is about to disappear
+        if _parent_is_being_deleted(origin, parent_model):
+            return
+        adjust_counter(parent_model, getattr(instance, fk_attname), field, -1)
+
+    post_save.connect(on_create, sender=related_model, weak=False,
+                      dispatch_uid=f'{related_model.__name__}_{field}_create')
+    post_delete.connect(on_delete, sender=related_model, weak=False,
+                        dispatch_uid=f'{related_model.__name__}_{field}_delete')
+
+
+_connect_counter(PostLike, SocialPost, 'post_id', 'likes_count')
+_connect_counter(PostComment, SocialPost, 'post_id', 'comments_count')
+_connect_counter(PostSave, SocialPost, 'post_id', 'saves_count')
+_connect_counter(Like, Track, 'track_id', 'likes_count')
+_connect_counter(Comment, Track, 'track_id', 'comments_count')
+
+
+def _notification_created(sender, instance, created, **kwargs):
+    if created and not instance.read:
+        # Only count notifications whose transaction actually commits
+        transaction.on_commit(lambda: adjust_unread_count(instance.recipient_id, 1))
+
+
+def _notification_deleted(sender, instance, **kwargs):
+    if not instance.read:
+        transaction.on_commit(lambda: adjust_unread_count(instance.recipient_id, -1))
+
+
+post_save.connect(_notification_created, sender=Notification,
+                  dispatch_uid='notification_unread_create')
+post_delete.connect(_notification_deleted, sender=Notification,
+                    dispatch_uid='notification_unread_delete')
+
+
+def _remember_username(sender, instance, **kwargs):
+    # Deferred usernames are not tracked, so a rename through .only() is missed
+    instance._saved_username = instance.__dict__.get('username')
+
+
+def _note_rename(sender, instance, update_fields=None, **kwargs):
+    before = instance._saved_username
+    instance._renamed = (instance.pk is not None and before is not None and before != instance.username
+                         and (update_fields is None or 'username' in update_fields))
+    instance._saved_username = instance.username
+
+
+post_init.connect(_remember_username, sender=User, dispatch_uid='user_username_loaded')
+pre_save.connect(_note_rename, sender=User, dispatch_uid='user_username_renamed')
+
+
+def _connect_cache_invalidation(namespace, model):
+    def on_change(sender, **kwargs):
+        transaction.on_commit(lambda: invalidate(namespace))
+
+    def on_save(sender, instance, **kwargs):
+        # Cached payloads show a user's username only, and users are saved
+        # on every login
+        if sender is User and not instance._renamed:
+            return
+        on_change(sender)
+
+    post_save.connect(on_save, sender=model, weak=False,
+                      dispatch_uid=f'cache_aside_{namespace}_{model.__name__}_save')
+    post_delete.connect(on_change, sender=model, weak=False,
+                        dispatch_uid=f'cache_aside_{namespace}_{model.__name__}_delete')
+
+
+for namespace, models in NAMESPACES.items():
+    for model in models:
+        _connect_cache_invalidation(namespace, model)
+
+
+def _upgrade_live_event_thumbnail(event_id):
+    event = LiveEvent.objects.filter(pk=event_id).first()
+    # update() skips post_save, so drop the cached featured events by hand
+    if event and event.upgrade_thumbnail():
+        invalidate(FEATURED_LIVE_EVENTS)
+
+
+def _live_event_saved(sender, instance, **kwargs):
+    # Only events still on the default thumbnail need probing
+    video_id = LiveEvent.extract_youtube_id(instance.youtube_url)
+    if video_id and instance.thumbnail == thumbnail_url(video_id):
+        submit_on_commit(_upgrade_live_event_thumbnail, instance.pk)
+
+
+post_save.connect(_live_event_saved, sender=LiveEvent, dispatch_uid='live_event_thumbnail_upgrade')
+
+
+def _refresh_variants(sender, instance, update_fields=None, **kwargs):
+    field, _ = VARIANT_SOURCES[sender._meta.label_lower]
+    # Partial saves that touch the media field must list 'variants' as well
+    if update_fields is not None and field not in update_fields:
+        return
+    instance.variants = variants_for(instance)
+
+
+for label in VARIANT_SOURCES:
+    pre_save.connect(_refresh_variants, sender=apps.get_model(label),
+                     dispatch_uid=f'media_variants_{label}')
+
+
+def _track_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'album', 'lyrics', 'artist'} & set(update_fields):
+        index_tracks([instance.pk])
+
+
+def _track_deleted(sender, instance, **kwargs):
+    remove_tracks([instance.pk])
+
+
+def _reindex_artist_tracks(user_id):
+    index_tracks(Track.objects.filter(artist_id=user_id).values_list('pk', flat=True))
+
+
+def _artist_saved(sender, instance, created, **kwargs):
+    # Tracks are found by their artist's username too
+    if not created and instance._renamed:
+        submit_on_commit(_reindex_artist_tracks, instance.pk)
+
+
+post_save.connect(_track_saved, sender=Track, dispatch_uid='track_search_index')
+post_delete.connect(_track_deleted, sender=Track, dispatch_uid='track_search_remove')
+post_save.connect(_artist_saved, sender=User, dispatch_uid='artist_search_index')
+
+
+def _connect_search_entries(kind, model, fields):
+    def on_save(sender, instance, update_fields=None, **kwargs):
+        if update_fields is None or fields & set(update_fields):
+            index_objects(kind, [instance])
+
+    def on_delete(sender, instance, **kwargs):
+        remove_objects(kind, [instance.pk])
+
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=f'search_entry_{kind}_save')
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=f'search_entry_{kind}_delete')
+
+
+for kind, (model, fields, _) in ENTRY_SOURCES.items():
+    _connect_search_entries(kind, model, fields)
+
+
+def _reindex_owned_entries(user_id):
+    index_objects('product', Product.objects.filter(seller_id=user_id).select_related('seller'))
+    index_objects('liveevent', LiveEvent.objects.filter(user_id=user_id).select_related('user'))
+
+
+def _owner_renamed(sender, instance, created, **kwargs):
+    # Product and live event entries show their owner's username
+    if not created and instance._renamed:
+        submit_on_commit(_reindex_owned_entries, instance.pk)
+
+
+post_save.connect(_owner_renamed, sender=User, dispatch_uid='search_entry_owner_renamed')
+
+
+def _connect_autocomplete(kind, model, fields):
+    def on_save(sender, instance, created, update_fields=None, **kwargs):
+        # New rows that are not offered (pending tracks) are in no index yet
+        if created and not autocomplete.offered(kind, instance):
+            return
+        if update_fields is None or fields & set(update_fields):
+            transaction.on_commit(lambda: autocomplete.refresh(kind, instance))
+
+    def on_delete(sender, instance, **kwargs):
+        pk = instance.pk
+        transaction.on_commit(lambda: autocomplete.discard(kind, pk))
+
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=f'autocomplete_{kind}_save')
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=f'autocomplete_{kind}_delete')
+
+
+for kind, (model, field, lookup, filters, _) in autocomplete.SOURCES.items():
+    _connect_autocomplete(kind, model, {field, lookup, *filters})
@@ -0,0 +1,145 @@
+"""
+Unique listener/viewer estimates with HyperLogLog sketches.
+
+Counting distinct users exactly means keeping every user id. A HyperLogLog
+sketch keeps 4096 one-byte registers instead, whatever the audience size,
+and estimates the distinct count within about 1.6%. Two sketches merge by
+taking the larger of each register pair, so a day's sketch folds into its
+week and into the all-time one without losing anything.
+
+Visitors are added to in-memory sketches by songs.hits along with the hit
+counters, and written by its flush into the day, week and all-time
+`AudienceSketch` rows of each object. The all-time estimate is also put in
+the cache then, so detail responses only read the database on a miss.
+Estimates over recent days read week rows for the whole weeks among them.
+"""
+import hashlib
+import math
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AudienceSketch
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_RANK_BITS = 64 - PRECISION
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(_RANK_BITS + 2)]
+ALL_TIME_START = date.min
+
+
+class HyperLogLog:
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers else bytearray(REGISTERS)
+        if len(self.registers) != REGISTERS:
+            raise ValueError(f"Expected {REGISTERS} registers, got {len(self.registers)}")
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> _RANK_BITS
+        # Position of the first 1 bit in the rest of the hash
+        rank = _RANK_BITS - (hashed & ((1 << _RANK_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+        estimate = alpha * REGISTERS * REGISTERS / sum(map(_INVERSE_POWERS.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Small audiences: linear counting over the empty registers
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return round(estimate)
+
+    def __bytes__(self):
+        return bytes(self.registers)
+
+
+def _target(model):
+    return model._meta.model_name
+
+
+def _cache_key(model, pk):
+    return f'audience:{_target(model)}:{pk}'
+
+
+def _periods(day):
+    return [
+        (AudienceSketch.DAY, day),
+        (AudienceSketch.WEEK, day - timedelta(days=day.weekday())),
+        (AudienceSketch.ALL_TIME, ALL_TIME_START),
+    ]
+
+
+@transaction.atomic
+def save(model, pk, day, sketch):
+    """Merge `sketch`, the visitors of `day`, into the object's stored sketches."""
+    for period, start in _periods(day):
+        row, created = AudienceSketch.objects.select_for_update().get_or_create(
+            target=_target(model), object_id=pk, period=period, period_start=start,
+            defaults={'registers': bytes(sketch)},
+        )
+        merged = sketch if created else HyperLogLog(row.registers).merge(sketch)
+        if not created:
+            row.registers = bytes(merged)
+            row.save(update_fields=['registers', 'updated_at'])
+        if period == AudienceSketch.ALL_TIME:
+            count = merged.count()
+    transaction.on_commit(lambda: cache.set(_cache_key(model, pk), count, None))
+
+
+def unique_count(model, pk):
+    """All-time estimate of the distinct visitors of one object."""
+    count = cache.get(_cache_key(model, pk))
+    if count is None:
+        count = unique_counts(model, [pk])[pk]
+        cache.add(_cache_key(model, pk), count, None)
+    return count
+
+
+def unique_counts(model, pks, since=None):
+    """
+    {pk: estimate} for `pks`, all-time or (with `since`, a date) over the
+    days from `since` to today.
+    """
+    return audience(model, pks, since)[0]
+
+
+def _covering(since, today):
+    """
+    The rows that add up to the days from `since` to `today`: the WEEK rows
+    of the whole weeks in between, and DAY rows for the partial weeks at
+    either end. 90 days take at most 25 sketches rather than 90.
+    """
+    first_monday = since + timedelta(days=-since.weekday() % 7)
+    last_sunday = today - timedelta(days=(today.weekday() + 1) % 7)
+    days = Q(period=AudienceSketch.DAY, period_start__gte=since, period_start__lte=today)
+    if first_monday + timedelta(days=6) > last_sunday:
+        return days
+    weeks = Q(period=AudienceSketch.WEEK, period_start__gte=first_monday,
+              period_start__lte=last_sunday - timedelta(days=6))
+    return weeks | (days & (Q(period_start__lt=first_monday) | Q(period_start__gt=last_sunday)))
+
+
+def audience(model, pks, since=None):
+    """`unique_counts`, plus the estimate for all of `pks` together."""
+    rows = AudienceSketch.objects.filter(target=_target(model), object_id__in=pks)
+    if since is None:
+        rows = rows.filter(period=AudienceSketch.ALL_TIME)
+    else:
+        rows = rows.filter(_covering(since, timezone.localdate()))
+    sketches = {pk: HyperLogLog() for pk in pks}
+    for object_id, registers in rows.values_list('object_id', 'registers').iterator():
+        sketches[object_id].merge(HyperLogLog(registers))
+    combined = HyperLogLog()
+    for sketch in sketches.values():
+        combined.merge(sketch)
+    return {pk: sketch.count() for pk, sketch in sketches.items()}, combined.count()
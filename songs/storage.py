@@ -0,0 +1,77 @@
+"""
+Where uploaded media ends up.
+
+Upload tasks talk to a `MediaStorage` rather than to cloudinary directly, so
+the same pipeline can push to Cloudinary in production and to a local
+directory in development and tests. The backend is chosen by
+`settings.MEDIA_STORAGE_BACKEND`.
+"""
+import mimetypes
+import os
+import shutil
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class MediaStorage:
+    """
+    `upload()` takes a path on local disk and returns a dict shaped like
+    Cloudinary's upload result: at least `public_id`, `secure_url` and the
+    asset's actual `resource_type` (never 'auto'), plus `type`, `version`,
+    `format` and `width`/`height` when known.
+    """
+
+    def upload(self, path, folder, resource_type='auto', **options):
+        raise NotImplementedError
+
+    def delivery_url(self, public_id, extension=''):
+        """URL a stored asset is served from, or None for Cloudinary's (see songs.media_urls)."""
+        return None
+
+
+class CloudinaryStorage(MediaStorage):
+    def upload(self, path, folder, resource_type='auto', **options):
+        from cloudinary.uploader import upload
+        return upload(path, folder=folder, resource_type=resource_type, **options)
+
+
+class LocalFileStorage(MediaStorage):
+    """Copies files under MEDIA_ROOT; transformations are ignored."""
+
+    def __init__(self, root=None, base_url=None):
+        self.root = root or settings.MEDIA_ROOT
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def upload(self, path, folder, resource_type='auto', **options):
+        extension = os.path.splitext(path)[1]
+        public_id = f"{folder.strip('/')}/{uuid.uuid4().hex}"
+        destination = os.path.join(self.root, public_id + extension)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(path, destination)
+        if resource_type == 'auto':
+            # Resolved the way Cloudinary does: audio is a video asset
+            mime_type = mimetypes.guess_type(path)[0] or ''
+            resource_type = mime_type.split('/')[0] if mime_type.startswith(('image/', 'video/')) else \
+                'video' if mime_type.startswith('audio/') else 'raw'
+        return {
+            'public_id': public_id,
+            'secure_url': self.delivery_url(public_id, extension),
+            'resource_type': resource_type,
+            'type': 'upload',
+            'format': extension.lstrip('.'),
+        }
+
+    def delivery_url(self, public_id, extension=''):
+        return f"{self.base_url.rstrip('/')}/{public_id}{extension}"
+
+
+@lru_cache(maxsize=None)
+def _load(backend):
+    return import_string(backend)()
+
+
+def get_storage():
+    return _load(getattr(settings, 'MEDIA_STORAGE_BACKEND', 'songs.storage.CloudinaryStorage'))
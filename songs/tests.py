@@ -1,3 +1,1920 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import cloudinary
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, resolve
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import autocomplete, hits, log, media_urls, prefetching, profiling, sketches, uploads, urls
+
+from .models import (
+    UPLOAD_FAILED, UPLOAD_PENDING, UPLOAD_READY, AudienceSketch, Cart, CartItem, Category,
+    Choir, Church, Comment, FeedEntry, Group, GroupJoinRequest, GroupMember, GroupPost,
+    GroupPostAttachment, Like, LiveEvent, Notification, Order, OrderItem, Playlist,
+    PostComment, PostLike, PostSave, Product, ProductCategory, ProductImage,
+    ProductReview, Profile, SocialPost, Track, User, Videostudio, Wishlist,
+)
+from .counters import reconcile_counters
+from .feed import backfill_author, fan_out_post
+from .serializers import CloudinaryFieldSerializer, GroupSerializer, SocialPostSerializer, TrackSerializer, UserSerializer
+from .storage import MediaStorage
+from .thumbnails import resolve_thumbnail
+from .unread_counts import adjust_unread_count, get_unread_count
+from .viewer_state import FOLLOWING, LIKED_POSTS, ViewerState
+
+
+class HotPathIndexTests(TestCase):
+    """The filter/order paths the views hit most are answered from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('indexed', 'indexed@example.com', 'password')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        if connection.vendor == 'postgresql':
+            # Test tables are tiny, so make the planner show what it would
+            # pick on a real table instead of a sequential scan.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertTrue(
+            any(name in plan for name in index_names),
+            f"Expected one of {index_names} in plan:\n{plan}"
+        )
+
+    def test_unread_notifications(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(recipient=self.user, read=False),
+            'notif_unread_idx', 'notif_recipient_read_idx'
+        )
+
+    def test_notification_list(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(recipient=self.user).order_by('-created_at', '-id'),
+            'notif_recipient_created_idx', 'notif_recipient_read_idx'
+        )
+
+    def test_user_social_posts(self):
+        self.assertUsesIndex(
+            SocialPost.objects.filter(user=self.user).order_by('-created_at', '-id'),
+            'socialpost_user_created_idx'
+        )
+
+    def test_artist_tracks(self):
+        self.assertUsesIndex(
+            Track.objects.filter(artist=self.user).order_by('-created_at', '-id'),
+            'track_artist_created_idx'
+        )
+
+    def test_group_admins(self):
+        self.assertUsesIndex(
+            GroupMember.objects.filter(group_id=1, is_admin=True),
+            'groupmember_group_admin_idx'
+        )
+
+    def test_pending_join_requests(self):
+        self.assertUsesIndex(
+            GroupJoinRequest.objects.filter(group_id=1, status='pending'),
+            'joinrequest_group_status_idx'
+        )
+
+    def test_live_events(self):
+        self.assertUsesIndex(
+            LiveEvent.objects.filter(is_live=True).order_by('-start_time'),
+            'liveevent_live_start_idx', 'liveevent_start_idx'
+        )
+
+    def test_seller_products(self):
+        self.assertUsesIndex(
+            Product.objects.filter(seller=self.user).order_by('-created_at', '-id'),
+            'product_seller_created_idx'
+        )
+
+    def test_available_products_in_category(self):
+        self.assertUsesIndex(
+            Product.objects.filter(category_id=1, is_available=True),
+            'product_category_avail_idx'
+        )
+
+
+class CounterTests(TestCase):
+    """Stored like/comment/save counters follow the rows they count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password')
+        cls.fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        cls.post = SocialPost.objects.create(user=cls.author, content_type='image', caption='Sunday')
+        cls.track = Track.objects.create(title='Amazing Grace', artist=cls.author,
+                                         audio_file='video/upload/v1/audio/1.mp3')
+
+    def counters(self):
+        post = SocialPost.objects.get(pk=self.post.pk)
+        track = Track.objects.get(pk=self.track.pk)
+        return (post.likes_count, post.comments_count, post.saves_count,
+                track.likes_count, track.comments_count)
+
+    def test_creates_and_deletes_move_the_counters(self):
+        rows = [
+            PostLike.objects.create(post=self.post, user=self.fan),
+            PostComment.objects.create(post=self.post, user=self.fan, content='Amen'),
+            PostComment.objects.create(post=self.post, user=self.author, content='Thanks'),
+            PostSave.objects.create(post=self.post, user=self.fan),
+            Like.objects.create(track=self.track, user=self.fan),
+            Comment.objects.create(track=self.track, user=self.fan, content='Beautiful'),
+        ]
+        self.assertEqual(self.counters(), (1, 2, 1, 1, 1))
+
+        for row in rows[1:3] + rows[4:]:
+            row.delete()
+        self.assertEqual(self.counters(), (1, 0, 1, 0, 0))
+        # Bulk deletes send post_delete for every row too
+        PostLike.objects.filter(post=self.post).delete()
+        PostSave.objects.filter(post=self.post).delete()
+        self.assertEqual(self.counters(), (0, 0, 0, 0, 0))
+
+    def test_counters_never_go_below_zero(self):
+        comment = PostComment.objects.create(post=self.post, user=self.fan, content='Amen')
+        SocialPost.objects.filter(pk=self.post.pk).update(comments_count=0)
+        comment.delete()
+        self.assertEqual(self.counters()[1], 0)
+
+    def test_reconcile_repairs_drift(self):
+        PostLike.objects.create(post=self.post, user=self.fan)
+        Comment.objects.create(track=self.track, user=self.fan, content='Beautiful')
+        SocialPost.objects.filter(pk=self.post.pk).update(likes_count=5, saves_count=2)
+        Track.objects.filter(pk=self.track.pk).update(comments_count=0)
+
+        report = reconcile_counters(dry_run=True)
+        self.assertIn(('SocialPost', 'likes_count', 1), report)
+        self.assertIn(('Track', 'comments_count', 1), report)
+        self.assertEqual(self.counters(), (5, 0, 2, 0, 0))
+
+        reconcile_counters()
+        self.assertEqual(self.counters(), (1, 0, 0, 0, 1))
+        self.assertTrue(all(drifted == 0 for *_, drifted in reconcile_counters(dry_run=True)))
+
+
+class FeedTests(TestCase):
+    """Home feeds are written on post, follow and unfollow, and can be rebuilt."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'password')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'password')
+        cls.author.followers.add(cls.other)
+
+    def post(self, caption='Sunday', **fields):
+        post = SocialPost.objects.create(user=self.author, content_type='image', caption=caption, **fields)
+        fan_out_post(post)
+        return post
+
+    def feed(self, user):
+        return list(FeedEntry.objects.filter(recipient=user).values_list('post_id', flat=True))
+
+    def follow(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.post(f'/api/users/{self.author.pk}/follow/')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_fan_out_reaches_the_author_and_followers(self):
+        post = self.post()
+        self.assertEqual(self.feed(self.author), [post.pk])
+        self.assertEqual(self.feed(self.other), [post.pk])
+        self.assertEqual(self.feed(self.reader), [])
+        entry = FeedEntry.objects.get(recipient=self.other)
+        self.assertEqual((entry.author_id, entry.created_at), (self.author.pk, post.created_at))
+        # Fanning out again, e.g. after a retried upload, adds nothing
+        fan_out_post(post)
+        self.assertEqual(FeedEntry.objects.filter(post=post).count(), 2)
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        posts = [self.post(f'post {n}') for n in range(3)]
+        self.post('pending', upload_status=UPLOAD_PENDING)
+
+        self.follow()
+        self.assertCountEqual(self.feed(self.reader), [post.pk for post in posts])
+
+        self.follow()
+        self.assertEqual(self.feed(self.reader), [])
+        self.assertEqual(len(self.feed(self.other)), 4)
+
+    @override_settings(FEED_BACKFILL_LIMIT=2)
+    def test_backfill_copies_only_the_latest_posts(self):
+        posts = [self.post(f'post {n}') for n in range(3)]
+        self.follow()
+        self.assertCountEqual(self.feed(self.reader), [posts[2].pk, posts[1].pk])
+        backfill_author(self.other, self.author, limit=1)
+        self.assertEqual(len(self.feed(self.other)), 3)
+
+    def test_rebuild_feeds(self):
+        posts = [self.post(f'post {n}') for n in range(2)]
+        own = SocialPost.objects.create(user=self.other, content_type='image', caption='mine')
+        FeedEntry.objects.all().delete()
+
+        call_command('rebuild_feeds', user=self.other.pk, stdout=io.StringIO())
+        self.assertCountEqual(self.feed(self.other), [own.pk] + [post.pk for post in posts])
+        self.assertEqual(self.feed(self.author), [])
+
+        call_command('rebuild_feeds', limit=1, stdout=io.StringIO())
+        self.assertEqual(self.feed(self.author), [posts[1].pk])
+        self.assertCountEqual(self.feed(self.other), [own.pk, posts[1].pk])
+
+
+class ViewerStateTests(TestCase):
+    """Page-batched is_liked/is_saved/is_following/is_member match the per-row answers."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user('viewer', 'viewer@example.com', 'password')
+        cls.followed = User.objects.create_user('followed', 'followed@example.com', 'password')
+        cls.stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password')
+        cls.followed.followers.add(cls.viewer)
+        # A follow in the other direction must not count for the viewer
+        cls.viewer.followers.add(cls.stranger)
+
+        cls.liked_post, cls.plain_post = [
+            SocialPost.objects.create(user=cls.followed, content_type='image', caption=caption)
+            for caption in ('liked', 'plain')
+        ]
+        PostLike.objects.create(post=cls.liked_post, user=cls.viewer)
+        PostSave.objects.create(post=cls.liked_post, user=cls.viewer)
+        PostLike.objects.create(post=cls.plain_post, user=cls.stranger)
+
+        cls.liked_track, cls.plain_track = [
+            Track.objects.create(title=title, artist=cls.followed, audio_file=f'video/upload/v1/audio/{n}.mp3')
+            for n, title in enumerate(('Liked', 'Plain'))
+        ]
+        Like.objects.create(track=cls.liked_track, user=cls.viewer)
+        Like.objects.create(track=cls.plain_track, user=cls.stranger)
+
+        cls.joined, cls.other_group = [
+            Group.objects.create(creator=cls.stranger, name=name, is_private=False)
+            for name in ('Joined', 'Other')
+        ]
+        GroupMember.objects.create(group=cls.joined, user=cls.viewer)
+        GroupMember.objects.create(group=cls.other_group, user=cls.stranger, is_admin=True)
+
+    def flags(self, url, *names, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['id']: tuple(row[name] for name in names) for row in response.data['results']}
+
+    def test_flags_for_the_viewer(self):
+        posts = self.flags('/api/social-posts/', 'is_liked', 'is_saved', user=self.viewer)
+        self.assertEqual(posts[self.liked_post.pk], (True, True))
+        self.assertEqual(posts[self.plain_post.pk], (False, False))
+
+        tracks = self.flags('/api/tracks/', 'is_liked')
+        self.assertEqual(tracks, {self.liked_track.pk: (True,), self.plain_track.pk: (False,)})
+
+        users = self.flags('/api/users/', 'is_following')
+        self.assertEqual(users[self.followed.pk], (True,))
+        self.assertEqual(users[self.stranger.pk], (False,))
+        self.assertEqual(users[self.viewer.pk], (False,))
+
+        groups = self.flags('/api/groups/', 'is_member', 'is_admin')
+        self.assertEqual(groups[self.joined.pk], (True, False))
+        self.assertEqual(groups[self.other_group.pk], (False, False))
+
+    def test_anonymous_viewer_has_no_relations(self):
+        posts = self.flags('/api/social-posts/', 'is_liked', 'is_saved')
+        self.assertEqual(set(posts.values()), {(False, False)})
+        users = self.flags('/api/users/', 'is_following')
+        self.assertEqual(set(users.values()), {(False,)})
+
+        state = ViewerState.for_objects(AnonymousUser(), [self.liked_post, self.followed])
+        self.assertIs(state.lookup(LIKED_POSTS, self.liked_post.pk), False)
+        self.assertIs(state.lookup(FOLLOWING, self.followed.pk), False)
+
+    def test_batched_answers_match_per_row_queries(self):
+        request = RequestFactory().get('/')
+        request.user = self.viewer
+        for serializer_class, objects in [
+            (SocialPostSerializer, [self.liked_post, self.plain_post]),
+            (TrackSerializer, [self.liked_track, self.plain_track]),
+            (UserSerializer, [self.viewer, self.followed, self.stranger]),
+            (GroupSerializer, [self.joined, self.other_group]),
+        ]:
+            with self.subTest(serializer=serializer_class.__name__):
+                per_row = serializer_class(objects, many=True, context={'request': request}).data
+                state = ViewerState.for_objects(self.viewer, objects)
+                with CaptureQueriesContext(connection) as queries:
+                    batched = serializer_class(
+                        objects, many=True, context={'request': request, 'viewer_state': state},
+                    ).data
+                self.assertEqual(batched, per_row)
+                self.assertFalse([q for q in queries.captured_queries if 'EXISTS' in q['sql'].upper()
+                                  or 'LIMIT 1' in q['sql']])
+
+
+class UserShapeTests(TestCase):
+    """Nested users are compact summaries; /users/<pk>/ keeps the full detail."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('summary', 'summary@example.com', 'password')
+        cls.fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        cls.user.followers.add(cls.fan)
+        Profile.objects.create(user=cls.user, picture='image/upload/v1/profiles/summary.jpg', bio='Tenor')
+        cls.track = Track.objects.create(title='Amazing Grace', artist=cls.user,
+                                         audio_file='video/upload/v1/audio/1.mp3')
+        cls.posts = [
+            SocialPost.objects.create(user=cls.user, content_type='image', caption=f'post {n}', song=cls.track)
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.fan)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_nested_users_are_summaries(self):
+        group = Group.objects.create(creator=self.user, name='Tenors', is_private=False)
+        nested = [
+            self.get(f'/api/tracks/{self.track.pk}/')['artist'],
+            self.get(f'/api/groups/{group.slug}/')['creator'],
+            self.get('/api/social-posts/')['results'][0]['song']['artist'],
+        ]
+        for user in nested:
+            self.assertEqual(user.keys(), {'id', 'username', 'profile_picture'})
+            self.assertEqual((user['id'], user['username']), (self.user.pk, 'summary'))
+            self.assertIn('profiles/summary', user['profile_picture'])
+        # Post authors keep their follower count
+        author = self.get(f'/api/social-posts/{self.posts[0].pk}/')['user']
+        self.assertEqual(author.keys(), {'id', 'username', 'profile_picture', 'followers_count'})
+        self.assertEqual(author['followers_count'], 1)
+
+    def test_user_detail(self):
+        detail = self.get(f'/api/users/{self.user.pk}/')
+        self.assertEqual(set(detail), {
+            'id', 'username', 'email', 'profile', 'followers_count', 'following_count',
+            'is_following', 'profile_picture',
+        })
+        self.assertEqual(
+            (detail['username'], detail['email'], detail['followers_count'], detail['following_count']),
+            ('summary', 'summary@example.com', 1, 0),
+        )
+        self.assertIs(detail['is_following'], True)
+        self.assertEqual((detail['profile']['bio'], detail['profile']['username']), ('Tenor', 'summary'))
+        self.assertIn('profiles/summary', detail['profile_picture'])
+
+    def test_posts_only_when_expanded(self):
+        expanded = self.get(f'/api/users/{self.user.pk}/', expand='social_posts')['social_posts']
+        self.assertEqual(set(expanded), {'next', 'previous', 'results'})
+        self.assertEqual([post['id'] for post in expanded['results']], [post.pk for post in reversed(self.posts)])
+        listed = self.get(f'/api/users/{self.user.pk}/social_posts/')
+        self.assertEqual([post['id'] for post in listed['results']], [post.pk for post in reversed(self.posts)])
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CacheAsideTests(TestCase):
+    """Cached list payloads are reused, kept apart per URL and dropped on change."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('pastor', 'pastor@example.com', 'password')
+        cls.churches = [
+            Church.objects.create(name=f'Church {n}', continent='Africa', country='Kenya', conference='Central',
+                                  location='Nairobi', created_by=cls.owner)
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, **params):
+        response = self.client.get('/api/churches/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(row['name'], row['created_by_username']) for row in response.data['results']]
+
+    def committed(self, change):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+    def test_hit_after_miss(self):
+        with CaptureQueriesContext(connection) as miss:
+            first = self.names()
+        self.assertTrue(miss.captured_queries)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), first)
+
+    def test_each_url_is_cached_apart(self):
+        first = self.names(page_size=2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(self.names(page_size=1)), 1)
+        self.assertEqual(len(self.names()), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(page_size=2), first)
+
+    def test_model_saves_and_deletes_invalidate(self):
+        self.names()
+        church = self.churches[0]
+        church.name = 'Zion Cathedral'
+        self.committed(church.save)
+        self.assertIn(('Zion Cathedral', 'pastor'), self.names())
+        self.committed(church.delete)
+        self.assertEqual(len(self.names()), 2)
+
+    def test_profile_changes_and_renames_invalidate(self):
+        self.names()
+        self.committed(lambda: Profile.objects.create(user=self.owner, picture='image/upload/v1/profiles/p.jpg'))
+        with CaptureQueriesContext(connection) as queries:
+            self.names()
+        self.assertTrue(queries.captured_queries)
+
+        self.owner.username = 'bishop'
+        self.committed(self.owner.save)
+        self.assertEqual({user for _, user in self.names()}, {'bishop'})
+
+    def test_other_user_saves_keep_the_cache(self):
+        self.names()
+        self.owner.last_login = timezone.now()
+        self.committed(lambda: self.owner.save(update_fields=['last_login']))
+        self.owner.first_name = 'Paul'
+        self.committed(self.owner.save)
+        with self.assertNumQueries(0):
+            self.names()
+
+
+class CursorPaginationTests(TestCase):
+    """Keyset pages on (created_at, id), or a view's cursor_ordering."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pager', 'pager@example.com', 'password')
+        cls.posts = [
+            SocialPost.objects.create(user=cls.user, content_type='image', caption=f'post {n}')
+            for n in range(7)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, **params):
+        """Ids on every page following `next`, then every page back following `previous`."""
+        pages = [self.client.get(url, params).data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        back = [pages[-1]]
+        while back[-1]['previous']:
+            back.append(self.client.get(back[-1]['previous']).data)
+        ids = lambda page: [row['id'] for row in page['results']]
+        return [ids(page) for page in pages], [ids(page) for page in reversed(back)]
+
+    def test_pages_are_complete_in_both_directions(self):
+        forward, backward = self.walk('/api/social-posts/', page_size=3)
+        self.assertEqual(forward, [
+            [post.pk for post in self.posts[6:3:-1]],
+            [post.pk for post in self.posts[3:0:-1]],
+            [self.posts[0].pk],
+        ])
+        self.assertEqual(backward, forward)
+
+    def test_id_breaks_created_at_ties(self):
+        SocialPost.objects.update(created_at=timezone.now())
+        forward, backward = self.walk('/api/social-posts/', page_size=2)
+        self.assertEqual(sum(forward, []), [post.pk for post in reversed(self.posts)])
+        self.assertEqual(backward, forward)
+
+    def test_cursor_ordering_override(self):
+        others = [User.objects.create_user(f'user{n}', f'user{n}@example.com', 'password') for n in range(3)]
+        User.objects.filter(pk__in=[user.pk for user in others]).update(date_joined=timezone.now())
+        forward, _ = self.walk('/api/users/', page_size=2)
+        # Newest date_joined first, ties newest id first; users have no created_at
+        self.assertEqual(sum(forward, []), [user.pk for user in reversed(others)] + [self.user.pk])
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?expand= at the request level, and the SQL they lead to."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sparse', 'sparse@example.com', 'password')
+        Profile.objects.create(user=cls.user, picture='image/upload/v1/profiles/sparse.jpg')
+        cls.track = Track.objects.create(title='Amazing Grace', artist=cls.user, album='Hymns',
+                                         audio_file='video/upload/v1/audio/1.mp3')
+        cls.posts = [
+            SocialPost.objects.create(user=cls.user, content_type='image', caption=f'post {n}', song=cls.track)
+            for n in range(3)
+        ]
+        PostLike.objects.create(post=cls.posts[0], user=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def rows(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def test_fields_drops_the_rest(self):
+        for row in self.rows('/api/tracks/', fields='id,title'):
+            self.assertEqual(row, {'id': self.track.pk, 'title': 'Amazing Grace'})
+        rows = self.rows('/api/social-posts/', fields='id,user.username,song.title')
+        self.assertEqual(rows[0], {'id': self.posts[2].pk, 'user': {'username': 'sparse'},
+                                   'song': {'title': 'Amazing Grace'}})
+
+    def test_unknown_fields_are_ignored(self):
+        rows = self.rows('/api/tracks/', fields='id,nope,artist.nope')
+        self.assertEqual(rows, [{'id': self.track.pk, 'artist': {}}])
+        full = self.rows('/api/tracks/', expand='nope')
+        self.assertEqual(full[0]['artist']['username'], 'sparse')
+
+    def test_unexpanded_nested_fields_fall_back_to_pk(self):
+        row = self.rows('/api/social-posts/', expand='song')[0]
+        self.assertEqual(row['user'], self.user.pk)
+        self.assertEqual(row['song']['title'], 'Amazing Grace')
+        # Nested levels collapse too unless expanded by a dotted name
+        self.assertEqual(row['song']['artist'], self.user.pk)
+        row = self.rows('/api/social-posts/', expand='song.artist')[0]
+        self.assertEqual(row['song']['artist']['username'], 'sparse')
+
+    def test_pruning_keeps_method_field_sources_and_cursor_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/social-posts/', {
+                'fields': 'id,is_liked,likes_count,can_edit', 'page_size': 2,
+            })
+        page = response.data
+        self.assertEqual(page['results'][0].keys(), {'id', 'is_liked', 'likes_count', 'can_edit'})
+        self.assertEqual([row['is_liked'] for row in page['results']], [False, False])
+        self.assertTrue(all(row['can_edit'] for row in page['results']))
+        posts = next(q['sql'] for q in queries.captured_queries if 'FROM "songs_socialpost"' in q['sql'])
+        self.assertIn('"created_at"', posts)
+        self.assertIn('"likes_count"', posts)
+        self.assertNotIn('"caption"', posts)
+
+        rest = self.client.get(page['next']).data['results']
+        self.assertEqual(rest, [{'id': self.posts[0].pk, 'is_liked': True, 'likes_count': 1, 'can_edit': True}])
+
+    def test_reverse_one_to_one_is_not_deferred(self):
+        for params in ({'fields': 'id,profile_picture'}, {'expand': 'profile'}):
+            with self.subTest(**params):
+                row = self.rows('/api/users/', **params)[0]
+                self.assertIn('profiles/sparse', row['profile_picture'])
+        response = self.client.get(f'/api/users/{self.user.pk}/', {'expand': 'social_posts'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_pruned_pages_do_not_load_deferred_fields_per_row(self):
+        params = {'fields': 'id,caption,user.username,song.title,is_liked,can_edit'}
+
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                self.rows('/api/social-posts/', **params)
+            return len(captured)
+
+        few = queries()
+        for n in range(5):
+            SocialPost.objects.create(user=self.user, content_type='image', caption=f'more {n}', song=self.track)
+        self.assertEqual(queries(), few)
+
+
+class UnreadCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        cls.sender = User.objects.create_user('sender', 'sender@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+
+    def notify(self):
+        Notification.objects.create(recipient=self.user, sender=self.sender, message='Hi', notification_type='like')
+
+    def test_counter_follows_notifications(self):
+        self.notify()
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notify()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.pk), 2)
+        adjust_unread_count(self.user.pk, -2)
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+
+    def test_change_committed_during_a_rebuild_is_not_lost(self):
+        notified = []
+
+        def notify_after_count(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if 'COUNT' in sql and not notified:
+                # Commits between the reader's count and its cache write
+                notified.append(True)
+                self.notify()
+                adjust_unread_count(self.user.pk, 1)
+            return result
+
+        with connection.execute_wrapper(notify_after_count):
+            self.assertEqual(get_unread_count(self.user.pk), 0)
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+
+    @override_settings(UNREAD_COUNT_CACHED=False)
+    def test_counted_in_the_database_without_an_atomic_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notify()
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+        self.assertIsNone(cache.get(f'notifications:unread:{self.user.pk}'))
+        Notification.objects.update(read=True)
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+
+
+class FakeThumbnailHandler(BaseHTTPRequestHandler):
+    """Stands in for img.youtube.com: only the paths in `available` exist."""
+    available = set()
+    requests_seen = []
+
+    def do_HEAD(self):
+        self.requests_seen.append(self.path)
+        self.send_response(200 if self.path in self.available else 404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ThumbnailResolverTests(TestCase):
+    video_id = 'abcdefghijk'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeThumbnailHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/vi'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        FakeThumbnailHandler.available = {f'/vi/{self.video_id}/hqdefault.jpg'}
+        FakeThumbnailHandler.requests_seen = []
+        overrides = override_settings(
+            YOUTUBE_THUMBNAIL_BASE_URL=self.base_url,
+            BACKGROUND_TASKS_EAGER=True,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_picks_best_available_size_and_caches_it(self):
+        expected = f'{self.base_url}/{self.video_id}/hqdefault.jpg'
+        self.assertEqual(resolve_thumbnail(self.video_id), expected)
+        probes = len(FakeThumbnailHandler.requests_seen)
+        self.assertEqual(resolve_thumbnail(self.video_id), expected)
+        self.assertEqual(len(FakeThumbnailHandler.requests_seen), probes)
+
+    def test_falls_back_to_default_when_nothing_answers(self):
+        FakeThumbnailHandler.available = set()
+        self.assertEqual(
+            resolve_thumbnail(self.video_id),
+            f'{self.base_url}/{self.video_id}/mqdefault.jpg'
+        )
+
+    def test_event_saved_with_default_and_upgraded_after_commit(self):
+        user = User.objects.create_user('streamer', 'streamer@example.com', 'password')
+        with self.captureOnCommitCallbacks() as callbacks:
+            event = LiveEvent.objects.create(
+                user=user,
+                title='Sunday service',
+                youtube_url=f'https://youtu.be/{self.video_id}',
+            )
+        # Nothing is probed while saving
+        self.assertEqual(FakeThumbnailHandler.requests_seen, [])
+        self.assertEqual(event.thumbnail, f'{self.base_url}/{self.video_id}/mqdefault.jpg')
+
+        for callback in callbacks:
+            callback()
+        event.refresh_from_db()
+        self.assertEqual(event.thumbnail, f'{self.base_url}/{self.video_id}/hqdefault.jpg')
+
+
+class EndpointBudgetTests(TestCase):
+    """
+    Every read endpoint stays within a fixed number of queries and response
+    size over a seeded dataset. Lists hold several rows each, so an N+1 in a
+    serializer blows the budget instead of slipping through.
+    """
+    client_class = APIClient
+
+    # (path, max queries, max response bytes); paths are formatted with the
+    # test case, so `{t.track.pk}` is the seeded track
+    BUDGETS = [
+        ('/api/', 0, 2_000),
+        ('/api/users/', 3, 10_000),
+        ('/api/users/{t.artist.pk}/', 3, 1_500),
+        ('/api/users/{t.artist.pk}/followers/', 3, 4_000),
+        ('/api/users/{t.artist.pk}/following/', 3, 8_500),
+        ('/api/users/{t.artist.pk}/followers_count/', 2, 1_000),
+        ('/api/users/{t.artist.pk}/following_count/', 2, 1_000),
+        ('/api/users/{t.artist.pk}/playlists/', 5, 7_500),
+        ('/api/users/{t.artist.pk}/social_posts/', 7, 9_000),
+        ('/api/tracks/', 3, 13_500),
+        # Details read the unique audience estimate, which is cached after this
+        ('/api/tracks/{t.track.pk}/', 4, 1_500),
+        ('/api/tracks/{t.track.pk}/download/', 1, 1_000),
+        ('/api/tracks/favorites/', 3, 13_500),
+        ('/api/tracks/analytics/', 3, 1_000),
+        ('/api/tracks/search/?q=track', 3, 13_500),
+        ('/api/search/?q=artist', 3, 2_000),
+        ('/api/autocomplete/?q=art', 3, 2_000),
+        ('/api/tracks/{t.track.pk}/comments/', 4, 5_500),
+        ('/api/tracks/{t.track.pk}/comments/{t.comment.pk}/', 4, 2_000),
+        ('/api/playlists/', 4, 14_500),
+        ('/api/playlists/{t.playlist.pk}/', 4, 7_500),
+        ('/api/profiles/', 1, 7_500),
+        ('/api/profiles/{t.viewer.profile.pk}/', 1, 1_000),
+        ('/api/profiles/me/', 0, 1_000),
+        ('/api/profiles/has_profile/', 0, 1_000),
+        ('/api/profiles/check_or_redirect/', 0, 1_000),
+        ('/api/profiles/by_user/{t.artist.pk}/', 2, 1_000),
+        ('/api/likes/', 3, 16_500),
+        ('/api/likes/{t.like.pk}/', 3, 2_000),
+        ('/api/categories/', 1, 1_000),
+        ('/api/categories/{t.category.pk}/', 1, 1_000),
+        ('/api/social-posts/', 6, 29_000),
+        ('/api/social-posts/feed/', 9, 29_000),
+        ('/api/social-posts/{t.post.pk}/', 6, 3_000),
+        ('/api/social-posts/{t.post.pk}/share/', 2, 1_000),
+        ('/api/social-posts/{t.post.pk}/download/', 2, 1_000),
+        ('/api/social-posts/{t.post.pk}/comments/', 6, 3_500),
+        ('/api/social-posts/{t.post.pk}/comments/{t.post_comment.pk}/', 6, 3_500),
+        ('/api/post-likes/', 6, 32_000),
+        ('/api/post-likes/{t.post_like.pk}/', 6, 3_500),
+        ('/api/post-comments/', 6, 64_000),
+        ('/api/post-comments/{t.post_comment.pk}/', 6, 3_500),
+        ('/api/post-saves/', 6, 32_000),
+        ('/api/post-saves/{t.post_save.pk}/', 6, 3_500),
+        ('/api/notifications/', 8, 51_000),
+        ('/api/notifications/unread_count/', 1, 1_000),
+        ('/api/notifications/{t.notification.pk}/', 8, 3_500),
+        ('/api/churches/', 1, 3_000),
+        ('/api/churches/my_churches/', 1, 1_500),
+        ('/api/churches/{t.church.pk}/', 1, 1_000),
+        ('/api/video-studios/', 2, 4_000),
+        ('/api/video-studios/my-studios/', 2, 2_000),
+        ('/api/video-studios/{t.studio.pk}/', 2, 1_000),
+        ('/api/choirs/', 2, 3_000),
+        ('/api/choirs/my-choirs/', 2, 1_500),
+        ('/api/choirs/{t.choir.pk}/', 2, 1_000),
+        ('/api/groups/', 3, 4_000),
+        ('/api/groups/{t.group.slug}/', 3, 1_500),
+        ('/api/groups/{t.group.slug}/members/', 3, 1_000),
+        ('/api/groups/{t.group.slug}/check-membership/', 3, 1_000),
+        ('/api/groups/{t.group.slug}/posts/', 3, 2_000),
+        ('/api/groups/{t.group.slug}/posts/{t.group_post.pk}/', 3, 1_000),
+        ('/api/groups/{t.group.slug}/join-requests/', 1, 1_500),
+        ('/api/group-join-requests/', 1, 1_500),
+        ('/api/group-join-requests/{t.join_request.pk}/', 1, 1_000),
+        ('/api/marketplace/categories/', 1, 1_000),
+        ('/api/marketplace/categories/{t.product_category.pk}/', 1, 1_000),
+        ('/api/marketplace/products/', 3, 22_000),
+        ('/api/marketplace/products/{t.product.slug}/', 4, 3_000),
+        ('/api/marketplace/cart/', 3, 12_000),
+        ('/api/marketplace/cart/my_cart/', 3, 11_500),
+        ('/api/marketplace/cart/{t.cart.pk}/', 3, 11_500),
+        ('/api/marketplace/orders/', 3, 27_000),
+        ('/api/marketplace/orders/{t.order.pk}/', 3, 9_000),
+        ('/api/marketplace/wishlist/', 3, 14_000),
+        ('/api/marketplace/wishlist/{t.wishlist.pk}/', 3, 14_000),
+        ('/api/live-events/', 2, 3_000),
+        ('/api/live-events/featured/', 2, 3_000),
+        ('/api/live-events/{t.live_event.pk}/', 3, 1_000),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            User.objects.create_user(f'member{i}', f'member{i}@example.com', 'password')
+            for i in range(8)
+        ]
+        cls.viewer, cls.artist, *others = users
+        for user in users:
+            Profile.objects.create(user=user, picture=f'image/upload/v1/profiles/{user.username}.jpg')
+        for i, user in enumerate(users):
+            user.followers.add(*[other for other in users if other != user][:i % 4 + 2])
+
+        category = Category.objects.create(name='Gospel')
+        cls.category = category
+        tracks = []
+        for i in range(10):
+            track = Track.objects.create(
+                title=f'Track {i}', artist=users[i % 3 + 1],
+                audio_file=f'video/upload/v1/audio/track{i}.mp3',
+                cover_image=f'image/upload/v1/covers/track{i}.jpg',
+            )
+            category.tracks.add(track)
+            for user in users[:i % 5 + 1]:
+                Like.objects.create(track=track, user=user)
+            for user in users[:3]:
+                Comment.objects.create(track=track, user=user, content='Amen')
+            tracks.append(track)
+        cls.track = tracks[0]
+        cls.comment = cls.track.comments.first()
+        cls.like = Like.objects.filter(user=cls.viewer).first()
+        cls.playlist = Playlist.objects.create(name='Sunday', user=cls.artist)
+        cls.playlist.tracks.add(*tracks[:5])
+        Playlist.objects.create(name='Evening', user=cls.viewer).tracks.add(*tracks[5:])
+
+        posts = []
+        for i in range(10):
+            post = SocialPost.objects.create(
+                user=users[i % 4], content_type='video' if i % 3 == 0 else 'image',
+                media_file=f'image/upload/v1/social_media/post{i}.jpg',
+                caption=f'Post {i}', song=tracks[i],
+            )
+            for user in users[:i % 4 + 1]:
+                PostLike.objects.create(post=post, user=user)
+                PostComment.objects.create(post=post, user=user, content='Blessed')
+            PostSave.objects.create(post=post, user=cls.viewer)
+            fan_out_post(post)
+            Notification.objects.create(
+                recipient=cls.viewer, sender=post.user, message='New post',
+                notification_type='comment', post=post,
+            )
+            Notification.objects.create(
+                recipient=cls.viewer, sender=post.user, message='New track',
+                notification_type='like', track=tracks[i],
+            )
+            posts.append(post)
+        cls.post = posts[0]
+        cls.post_like = PostLike.objects.filter(user=cls.viewer).first()
+        cls.post_comment = cls.post.comments.first()
+        cls.post_save = PostSave.objects.filter(user=cls.viewer).first()
+        cls.notification = Notification.objects.filter(recipient=cls.viewer).first()
+
+        for i in range(4):
+            church = Church.objects.create(
+                name=f'Church {i}', continent='Africa', country='Kenya', conference='Central',
+                location='Nairobi', created_by=users[i % 2],
+                image=f'image/upload/v1/churches/church{i}.jpg',
+            )
+            Videostudio.objects.create(
+                name=f'Studio {i}', location='Nairobi', created_by=users[i % 2],
+                logo=f'image/upload/v1/videostudios/logos/studio{i}.jpg',
+            )
+            Choir.objects.create(
+                name=f'Choir {i}', location='Nairobi', church=church, created_by=users[i % 2],
+                profile_image=f'image/upload/v1/choirs/profiles/choir{i}.jpg',
+            )
+        cls.church = Church.objects.first()
+        cls.studio = Videostudio.objects.first()
+        cls.choir = Choir.objects.first()
+
+        for i in range(3):
+            group = Group.objects.create(
+                creator=cls.viewer, name=f'Group {i}', is_private=i == 0,
+                cover_image=f'image/upload/v1/group_covers/group{i}.jpg',
+            )
+            GroupMember.objects.create(group=group, user=cls.viewer, is_admin=True)
+            for user in others[:i + 2]:
+                GroupMember.objects.create(group=group, user=user)
+            for user in users[:3]:
+                group_post = GroupPost.objects.create(group=group, user=user, content='Prayer meeting')
+                GroupPostAttachment.objects.create(
+                    post=group_post, file_type='image',
+                    file=f'image/upload/v1/group_posts/attachment{group_post.pk}.jpg',
+                )
+            GroupJoinRequest.objects.create(group=group, user=users[-1], message='Please')
+        cls.group = Group.objects.get(name='Group 0')
+        cls.group_post = cls.group.posts.first()
+        cls.join_request = cls.group.join_requests.first()
+
+        cls.product_category = ProductCategory.objects.create(name='Instruments')
+        products = []
+        for i in range(8):
+            product = Product.objects.create(
+                seller=users[i % 3 + 1], title=f'Keyboard {i}', description='Barely used',
+                price=100 + i, category=cls.product_category, track=tracks[i],
+            )
+            for n in range(2):
+                ProductImage.objects.create(
+                    product=product, is_primary=n == 0,
+                    image=f'image/upload/v1/products/images/product{i}-{n}.jpg',
+                )
+            for user in users[:3]:
+                ProductReview.objects.create(product=product, reviewer=user, rating=5, comment='Great')
+            products.append(product)
+        cls.product = products[0]
+        cls.cart = Cart.objects.create(user=cls.viewer)
+        for product in products[:4]:
+            CartItem.objects.create(cart=cls.cart, product=product, quantity=2)
+        for i in range(3):
+            order = Order.objects.create(buyer=cls.viewer, total_amount=300)
+            for product in products[i:i + 3]:
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=1,
+                    price_at_purchase=product.price, seller=product.seller,
+                )
+        cls.order = Order.objects.first()
+        cls.wishlist = Wishlist.objects.create(user=cls.viewer)
+        cls.wishlist.products.add(*products[:5])
+
+        for i in range(4):
+            LiveEvent.objects.create(
+                user=users[i % 2], title=f'Service {i}',
+                youtube_url=f'https://youtu.be/video{i:06d}',
+            )
+        cls.live_event = LiveEvent.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        # Workers build the typeahead index as they start; here, up front
+        autocomplete.rebuild()
+        self.client.force_authenticate(self.viewer)
+
+    def test_endpoints_within_budget(self):
+        for template, max_queries, max_bytes in self.BUDGETS:
+            path = template.format(t=self)
+            with self.subTest(path=path):
+                # Cached lists would otherwise answer from an earlier request
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200, response.content[:500])
+                self.assertLessEqual(
+                    len(queries), max_queries,
+                    '\n'.join(query['sql'] for query in queries.captured_queries)
+                )
+                self.assertLessEqual(len(response.content), max_bytes)
+
+    def test_notification_queries_do_not_grow_with_the_page(self):
+        counts = []
+        for page_size in (2, 20):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/notifications/', {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_every_read_route_has_a_budget(self):
+        """A new GET route (or action) fails here until it is added to BUDGETS."""
+        def views(patterns):
+            for pattern in patterns:
+                if isinstance(pattern, URLResolver):
+                    yield from views(pattern.url_patterns)
+                    continue
+                actions = getattr(pattern.callback, 'actions', None)
+                view_class = getattr(pattern.callback, 'cls', None)
+                if actions is not None and 'get' in actions:
+                    yield view_class.__name__, actions['get']
+                elif actions is None and view_class is not None and hasattr(view_class, 'get'):
+                    yield view_class.__name__, 'get'
+
+        covered = set()
+        for template, _, _ in self.BUDGETS:
+            match = resolve(template.format(t=self).split('?')[0])
+            actions = getattr(match.func, 'actions', None)
+            covered.add((match.func.cls.__name__, actions['get'] if actions else 'get'))
+        self.assertEqual(set(views(urls.urlpatterns)) - covered, set())
+
+
+class ArtistSummary(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class TrackSummary(serializers.ModelSerializer):
+    artist = ArtistSummary(read_only=True)
+    artist_bio = serializers.CharField(source='artist.profile.bio', read_only=True)
+
+    class Meta:
+        model = Track
+        fields = ['id', 'title', 'artist', 'artist_bio']
+
+
+class ArtistWithTracks(serializers.ModelSerializer):
+    tracks = TrackSummary(many=True, read_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'tracks']
+
+
+class QueryPlanTests(TestCase):
+    """prefetching turns a serializer's shape into the joins and prefetches it needs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artists = [User.objects.create_user(f'planner{i}', f'planner{i}@example.com', 'password') for i in range(3)]
+        for i, artist in enumerate(cls.artists):
+            artist.followers.add(*cls.artists[:i])
+            for n in range(2):
+                track = Track.objects.create(title=f'Song {i}.{n}', artist=artist,
+                                             audio_file=f'video/upload/v1/audio/{i}{n}.mp3')
+                SocialPost.objects.create(user=artist, content_type='image', caption=f'{i}.{n}', song=track)
+
+    def lookups(self, queryset):
+        return [getattr(lookup, 'prefetch_to', lookup) for lookup in queryset._prefetch_related_lookups]
+
+    def test_foreign_keys_and_dotted_sources_are_joined(self):
+        queryset = prefetching.plan_queryset(Track.objects.all(), TrackSummary())
+        self.assertEqual(queryset.query.select_related, {'artist': {'profile': {}}})
+        self.assertEqual(self.lookups(queryset), [])
+
+        with self.assertNumQueries(1):
+            rows = TrackSummary(queryset, many=True).data
+        self.assertEqual(len(rows), 6)
+
+    def test_many_and_reverse_relations_are_prefetched(self):
+        queryset = prefetching.plan_queryset(User.objects.filter(username__startswith='planner'), ArtistWithTracks())
+        self.assertFalse(queryset.query.select_related)
+        self.assertEqual(self.lookups(queryset), ['tracks'])
+        # The child queryset is planned the same way
+        self.assertEqual(queryset._prefetch_related_lookups[0].queryset.query.select_related,
+                         {'artist': {'profile': {}}})
+
+        with self.assertNumQueries(2):
+            rows = ArtistWithTracks(queryset, many=True).data
+        self.assertEqual([len(row['tracks']) for row in rows], [2, 2, 2])
+
+    def test_declared_sources_and_annotations(self):
+        select, prefetch, annotations = prefetching.plan(SocialPostSerializer(), SocialPost)
+        self.assertEqual(select, {'song', 'song__artist', 'song__artist__profile'})
+        # The author's followers_count is an annotation, which a join cannot carry
+        self.assertEqual([lookup.prefetch_to for lookup in prefetch], ['user'])
+        self.assertIn('followers_count', prefetch[0].queryset.query.annotations)
+        self.assertEqual(annotations, {})
+
+    def test_joins_the_view_already_does_are_not_repeated(self):
+        queryset = prefetching.plan_queryset(Track.objects.select_related('artist'), TrackSummary())
+        self.assertEqual(queryset.query.select_related, {'artist': {'profile': {}}})
+        self.assertEqual(str(queryset.query).count('JOIN "songs_user"'), 1)
+
+        # Relations the view prefetches by hand are left to it
+        queryset = prefetching.plan_queryset(Track.objects.prefetch_related('artist'), TrackSummary())
+        self.assertFalse(queryset.query.select_related)
+        self.assertEqual(self.lookups(queryset), ['artist'])
+
+    def test_a_joined_relation_the_plan_prefetches_is_prefetched(self):
+        # A join would cache `user` on each row and shadow the annotated prefetch
+        queryset = prefetching.plan_queryset(SocialPost.objects.select_related('user', 'song'), SocialPostSerializer())
+        self.assertNotIn('user', queryset.query.select_related)
+        self.assertIn('song', queryset.query.select_related)
+        self.assertEqual(self.lookups(queryset), ['user'])
+
+        request = RequestFactory().get('/api/social-posts/')
+        request.user = AnonymousUser()
+        with CaptureQueriesContext(connection) as queries:
+            rows = SocialPostSerializer(queryset, many=True, context={'request': request}).data
+        # One query for the posts and one for their annotated authors, not one per row
+        self.assertEqual(sum('FROM "songs_user"' in query['sql'] for query in queries.captured_queries), 1)
+        self.assertEqual({row['user']['username']: row['user']['followers_count'] for row in rows},
+                         {'planner0': 0, 'planner1': 1, 'planner2': 2})
+
+    def test_prefetch_objects_loads_rows_fetched_elsewhere(self):
+        tracks = list(Track.objects.all())
+        prefetching.prefetch_objects(tracks, TrackSummary(many=True))
+        with self.assertNumQueries(0):
+            rows = TrackSummary(tracks, many=True).data
+        self.assertEqual({row['artist']['username'] for row in rows}, {'planner0', 'planner1', 'planner2'})
+
+
+@override_settings(PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('profiled', 'profiled@example.com', 'password')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+        Category.objects.create(name='Hymns')
+
+    def setUp(self):
+        cache.clear()
+
+    def server_timing(self, response):
+        return dict(
+            (metric.split(';')[0], metric)
+            for metric in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_header(self):
+        self.client.get('/api/categories/')
+        timing = self.server_timing(self.client.get('/api/categories/'))
+        self.assertIn('total;dur=', timing['total'])
+        self.assertIn('desc="0 queries / 0 duplicate"', timing['db'])
+        self.assertIn('desc="2 hits / 0 misses"', timing['cache'])
+        self.client.force_authenticate(self.user)
+        self.assertIn('serializer', self.server_timing(self.client.get('/api/users/')))
+
+    def test_counts_duplicate_queries(self):
+        profile = profiling.RequestProfile()
+        with profiling._recording(profile):
+            User.objects.filter(pk=self.user.pk).exists()
+            User.objects.filter(pk=self.user.pk).exists()
+            User.objects.filter(pk=self.staff.pk).exists()
+        self.assertEqual((profile.query_count, profile.duplicate_count), (3, 1))
+
+    @override_settings(PROFILING_SLOW_MS=0)
+    def test_slow_requests_are_written_as_json_lines(self):
+        with self.assertLogs('songs.profiling', 'INFO') as logs:
+            self.client.get('/api/categories/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'songs.views.CategoryViewSet')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['cache_misses'], 2)
+
+    def test_profile_report_is_for_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/categories/', {'profile': '1'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        token = self.client.post('/api/auth/token/', {'username': 'staff', 'password': 'password'}).data['access']
+        self.client.logout()
+        response = self.client.get('/api/categories/', {'profile': '1'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'cumulative', response.content)
+
+
+class LoggingPipelineTests(TestCase):
+    def test_records_are_written_as_json_by_the_listener(self):
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(log.JsonFormatter())
+        handler = log.QueueListenerHandler([target])
+        logger = logging.getLogger('songs.tests.pipeline')
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            logger.warning("Post %s failed", 7, extra={'user_id': 3})
+            try:
+                raise ValueError('broken')
+            except ValueError:
+                logger.exception("Upload failed")
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(
+            (first['level'], first['message'], first['user_id']),
+            ('WARNING', 'Post 7 failed', 3)
+        )
+        self.assertIn('ValueError: broken', second['exception'])
+
+    def test_sampling_keeps_warnings(self):
+        sample = log.SamplingFilter(rate=0)
+        record = logging.makeLogRecord({'levelno': logging.INFO})
+        self.assertFalse(sample.filter(record))
+        record = logging.makeLogRecord({'levelno': logging.WARNING})
+        self.assertTrue(sample.filter(record))
+
+    def test_lazy_arguments_only_evaluated_when_emitted(self):
+        calls = []
+        logger = logging.getLogger('songs.tests.lazy')
+        logger.setLevel(logging.INFO)
+        logger.debug("%s", log.lazy(calls.append, 'debug'))
+        with self.assertLogs(logger, 'INFO'):
+            logger.info("%s", log.lazy(calls.append, 'info'))
+        self.assertEqual(calls, ['info'])
+
+
+@override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': 'demo'})
+class MediaUrlTests(TestCase):
+    """media_urls builds the URLs CloudinaryField itself would."""
+    field = Track._meta.get_field('cover_image')
+    stored = [
+        'image/upload/v123/covers/a.jpg',
+        'image/upload/covers/a.jpg',
+        'image/upload/a.jpg',
+        'video/upload/v5/audio/x.mp3',
+        'video/upload/clips/c.mp4',
+        'raw/upload/v9/docs/f.pdf',
+        'raw/upload/docs/f.pdf',
+    ]
+
+    def setUp(self):
+        previous = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name='demo')
+        self.addCleanup(cloudinary.config, cloud_name=previous)
+
+    def test_matches_cloudinary_field_urls(self):
+        for stored in self.stored:
+            with self.subTest(stored=stored):
+                resource = self.field.to_python(stored)
+                as_uploaded = {
+                    'public_id': resource.public_id, 'resource_type': resource.resource_type,
+                    'type': resource.type, 'version': resource.version, 'format': resource.format,
+                }
+                self.assertEqual(media_urls.media_url(resource), resource.url)
+                self.assertEqual(media_urls.media_url(stored), resource.url)
+                self.assertEqual(media_urls.media_url(as_uploaded), resource.url)
+                self.assertEqual(media_urls.media_url(resource.url), resource.url)
+                self.assertEqual(CloudinaryFieldSerializer().to_representation(resource), resource.url)
+
+    def test_folder_public_ids_are_pinned_to_v1(self):
+        # As the SDK does for a public id in a folder with no version
+        self.assertEqual(media_urls.media_url('image/upload/covers/a.jpg'),
+                         'https://res.cloudinary.com/demo/image/upload/v1/covers/a.jpg')
+        self.assertEqual(media_urls.media_url('image/upload/a.jpg'),
+                         'https://res.cloudinary.com/demo/image/upload/a.jpg')
+
+    def test_transformations_go_before_the_version(self):
+        for stored in ('image/upload/v123/profiles/a.jpg', 'image/upload/profiles/a.jpg'):
+            with self.subTest(stored=stored):
+                url = self.field.to_python(stored).url
+                # How the avatar URLs were put together before media_urls
+                expected = url.replace('/upload/', '/upload/w_50,h_50,c_fill/')
+                self.assertEqual(media_urls.media_url(stored, media_urls.AVATAR_THUMB), expected)
+        self.assertEqual(
+            media_urls.media_url('video/upload/v5/clips/c.mp4', media_urls.POST_VIDEO, extension='.jpg'),
+            'https://res.cloudinary.com/demo/video/upload/q_auto,f_auto/v5/clips/c.jpg',
+        )
+
+    def test_empty_values(self):
+        for value in (None, '', {}, self.field.to_python('')):
+            with self.subTest(value=value):
+                self.assertIsNone(media_urls.media_url(value))
+        self.assertIsNone(CloudinaryFieldSerializer().to_representation(''))
+        self.assertEqual(media_urls.variant_manifest('', 'image'), {})
+
+    def test_other_urls_pass_through(self):
+        self.assertEqual(media_urls.media_url('https://img.youtube.com/vi/x/0.jpg'), 'https://img.youtube.com/vi/x/0.jpg')
+
+    @override_settings(MEDIA_STORAGE_BACKEND='songs.storage.LocalFileStorage')
+    def test_local_media_is_served_from_media_url(self):
+        request = RequestFactory().get('/')
+        self.assertEqual(media_urls.media_url('image/upload/covers/a.jpg', media_urls.AVATAR_THUMB),
+                         '/media/covers/a.jpg')
+        self.assertEqual(media_urls.media_url('image/upload/covers/a.jpg', request=request),
+                         'http://testserver/media/covers/a.jpg')
+        self.assertEqual(media_urls.media_url('/media/logos/b.png', request=request),
+                         'http://testserver/media/logos/b.png')
+        # Assets already on Cloudinary keep their URL
+        cloud = 'https://res.cloudinary.com/demo/image/upload/v1/covers/a.jpg'
+        self.assertEqual(media_urls.media_url(cloud, request=request), cloud)
+
+        user = User.objects.create_user('local', 'local@example.com', 'password')
+        Choir.objects.create(name='Local Voices', location='Nairobi', created_by=user,
+                             profile_image='image/upload/choirs/profiles/c.jpg')
+        cache.clear()
+        response = APIClient().get('/api/choirs/')
+        self.assertEqual(response.data['results'][0]['profile_image'], 'http://testserver/media/choirs/profiles/c.jpg')
+
+
+@override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': 'demo'})
+class MediaVariantsTests(TestCase):
+    """Rows keep a manifest of their asset's variants, built as they are saved."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('variants', 'variants@example.com', 'password')
+
+    def setUp(self):
+        previous = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name='demo')
+        self.addCleanup(cloudinary.config, cloud_name=previous)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stored_variants(self, instance):
+        return type(instance).objects.values_list('variants', flat=True).get(pk=instance.pk)
+
+    def test_manifest_is_written_on_save(self):
+        track = Track.objects.create(title='Grace', artist=self.user, audio_file='video/upload/v1/audio/1.mp3',
+                                     cover_image='image/upload/v7/covers/a.jpg')
+        manifest = self.stored_variants(track)
+        self.assertEqual(set(manifest), {'thumb', 'small', 'medium', 'large'})
+        self.assertEqual(manifest, media_urls.variant_manifest('image/upload/v7/covers/a.jpg', 'image'))
+        self.assertEqual(manifest['thumb'],
+                         'https://res.cloudinary.com/demo/image/upload/w_150,h_150,c_fill,q_auto,f_auto/v7/covers/a.jpg')
+
+        video = SocialPost.objects.create(user=self.user, content_type='video', caption='clip',
+                                          media_file='video/upload/v3/posts/c.mp4')
+        manifest = self.stored_variants(video)
+        self.assertEqual(manifest['thumb'], 'https://res.cloudinary.com/demo/video/upload/w_320,c_limit,q_auto/v3/posts/c.jpg')
+        self.assertEqual(manifest['hls'], 'https://res.cloudinary.com/demo/video/upload/sp_auto/v3/posts/c.m3u8')
+
+        bare = Track.objects.create(title='Bare', artist=self.user, audio_file='video/upload/v1/audio/2.mp3')
+        self.assertEqual(self.stored_variants(bare), {})
+
+    def test_manifest_follows_the_asset(self):
+        track = Track.objects.create(title='Grace', artist=self.user, audio_file='video/upload/v1/audio/1.mp3',
+                                     cover_image='image/upload/v7/covers/a.jpg')
+        track.cover_image = 'image/upload/v8/covers/b.jpg'
+        track.save()
+        self.assertEqual(self.stored_variants(track), media_urls.variant_manifest('image/upload/v8/covers/b.jpg', 'image'))
+
+        track.cover_image = 'image/upload/v9/covers/c.jpg'
+        track.save(update_fields=['cover_image', 'variants'])
+        self.assertEqual(self.stored_variants(track), media_urls.variant_manifest('image/upload/v9/covers/c.jpg', 'image'))
+
+    def test_saves_that_leave_the_asset_alone_keep_the_manifest(self):
+        track = Track.objects.create(title='Grace', artist=self.user, audio_file='video/upload/v1/audio/1.mp3',
+                                     cover_image='image/upload/v7/covers/a.jpg')
+        manifest = self.stored_variants(track)
+        track.save()
+        self.assertEqual(self.stored_variants(track), manifest)
+
+        # A partial save without the media field does not rebuild (or even write) it
+        Track.objects.filter(pk=track.pk).update(variants={'thumb': 'kept'})
+        track.refresh_from_db()
+        track.title = 'Amazing Grace'
+        track.save(update_fields=['title'])
+        self.assertEqual(self.stored_variants(track), {'thumb': 'kept'})
+
+    def test_build_media_variants_fills_missing_manifests(self):
+        track = Track.objects.create(title='Grace', artist=self.user, audio_file='video/upload/v1/audio/1.mp3',
+                                     cover_image='image/upload/v7/covers/a.jpg')
+        manifest = self.stored_variants(track)
+        Track.objects.filter(pk=track.pk).update(variants={})
+        call_command('build_media_variants', stdout=io.StringIO())
+        self.assertEqual(self.stored_variants(track), manifest)
+
+    def test_manifest_is_served_through_the_api(self):
+        track = Track.objects.create(title='Grace', artist=self.user, audio_file='video/upload/v1/audio/1.mp3',
+                                     cover_image='image/upload/v7/covers/a.jpg')
+        manifest = self.stored_variants(track)
+        self.assertEqual(self.client.get(f'/api/tracks/{track.pk}/').data['variants'], manifest)
+        self.assertEqual(self.client.get(f'/api/tracks/{track.pk}/', {'variant': 'thumb'}).data['variants'],
+                         {'thumb': manifest['thumb']})
+        self.assertEqual(self.client.get(f'/api/tracks/{track.pk}/', {'variant': 'hls'}).data['variants'], {})
+
+        # The stored manifest is what is served, not one rebuilt per request
+        Track.objects.filter(pk=track.pk).update(variants={'thumb': 'https://cdn.example.com/t.jpg'})
+        self.assertEqual(self.client.get(f'/api/tracks/{track.pk}/').data['variants'],
+                         {'thumb': 'https://cdn.example.com/t.jpg'})
+        # Rows saved before manifests existed get one built on the fly
+        Track.objects.filter(pk=track.pk).update(variants={})
+        self.assertEqual(self.client.get(f'/api/tracks/{track.pk}/').data['variants'], manifest)
+
+        post = SocialPost.objects.create(user=self.user, content_type='video', caption='clip',
+                                         media_file='video/upload/v3/posts/c.mp4')
+        data = self.client.get(f'/api/social-posts/{post.pk}/', {'variant': 'small'}).data
+        self.assertEqual(data['variants'], {'small': self.stored_variants(post)['small']})
+        self.assertEqual(data['optimized_url'], self.stored_variants(post)['small'])
+
+
+class FakeCloudinaryStorage(MediaStorage):
+    """Answers like Cloudinary's upload API, without the network."""
+
+    def upload(self, path, folder, resource_type='auto', **options):
+        extension = path.rsplit('.', 1)[-1]
+        if resource_type == 'auto':
+            resource_type = 'video' if extension in ('mp4', 'mp3') else 'image'
+        return {
+            'public_id': f'{folder}/abc', 'resource_type': resource_type, 'type': 'upload',
+            'version': 123, 'format': extension,
+            'secure_url': f'https://res.cloudinary.com/demo/{resource_type}/upload/v123/{folder}/abc.{extension}',
+        }
+
+
+@override_settings(MEDIA_STORAGE_BACKEND='songs.tests.FakeCloudinaryStorage')
+class UploadPipelineTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', 'uploader@example.com', 'password')
+        cls.group = Group.objects.create(creator=cls.user, name='Choir leaders')
+        GroupMember.objects.create(group=cls.group, user=cls.user, is_admin=True)
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        overrides = override_settings(UPLOAD_SPOOL_DIR=spool_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_authenticate(self.user)
+
+    def test_attachments_keep_resource_type_version_and_format(self):
+        video = SimpleUploadedFile('sermon.mp4', b'\0' * 64, content_type='video/mp4')
+        response = self.client.post(f'/api/groups/{self.group.slug}/posts/', {'content': 'Sunday', 'attachments': [video]})
+        self.assertEqual(response.status_code, 201, response.data)
+        attachment = response.data['attachments'][0]
+        self.assertEqual(attachment['file_type'], 'video')
+        self.assertRegex(attachment['file'], r'^video/upload/v123/group_posts/\d{4}/\d\d/\d\d/abc\.mp4$')
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_track_and_post_media_keep_resource_type_version_and_format(self):
+        audio = SimpleUploadedFile('hymn.mp3', b'ID3' + b'\0' * 64, content_type='audio/mpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/api/upload/track/', {'title': 'Hymn', 'audio_file': audio})
+        track = Track.objects.get(pk=response.data['id'])
+        self.assertEqual(track.upload_status, UPLOAD_READY)
+        self.assertEqual(
+            (track.audio_file.resource_type, str(track.audio_file.version), track.audio_file.format),
+            ('video', '123', 'mp3'),
+        )
+
+    def test_recovers_uploads_whose_worker_died(self):
+        stale = Track.objects.create(title='Lost', artist=self.user, upload_status=UPLOAD_PENDING)
+        Track.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        fresh = SocialPost.objects.create(user=self.user, content_type='image', upload_status=UPLOAD_PENDING)
+        old_file = uploads.spool(SimpleUploadedFile('old.mp3', b'old'))
+        os.utime(old_file, (time.time() - 3600,) * 2)
+        new_file = uploads.spool(SimpleUploadedFile('new.mp3', b'new'))
+
+        call_command('recover_uploads', minutes=30, stdout=io.StringIO())
+
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.upload_status, UPLOAD_FAILED)
+        self.assertEqual(fresh.upload_status, UPLOAD_PENDING)
+        self.assertFalse(os.path.exists(old_file))
+        self.assertTrue(os.path.exists(new_file))
+
+
+class AsyncViewTests(TestCase):
+    """
+    The async handlers behind the WSGI test client (run to completion in
+    the request thread) and behind the ASGI one, next to sync handlers.
+    """
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async', 'async@example.com', 'password')
+        author = User.objects.create_user('author', 'author@example.com', 'password')
+        author.followers.add(cls.user)
+        for n in range(3):
+            fan_out_post(SocialPost.objects.create(user=author, caption=f'post {n}', content_type='image'))
+        Category.objects.create(name='Hymns')
+
+    def setUp(self):
+        cache.clear()
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        overrides = override_settings(UPLOAD_SPOOL_DIR=spool_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_authenticate(self.user)
+
+    def auth_headers(self):
+        return {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_feed(self):
+        response = self.client.get('/api/social-posts/feed/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['caption'] for post in response.data['results']], ['post 2', 'post 1', 'post 0'])
+
+    def test_sync_actions_of_an_async_viewset(self):
+        response = self.client.get('/api/social-posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(self.client.delete('/api/social-posts/feed/').status_code, 405)
+
+    def test_live_event_create(self):
+        data = {'title': 'Sunday service', 'youtube_url': 'https://www.youtube.com/live/abcdefghijk'}
+        with self.captureOnCommitCallbacks():
+            response = self.client.post('/api/live-events/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(LiveEvent.objects.get(pk=response.data['id']).is_live)
+
+        response = self.client.post('/api/live-events/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'You already have an active live event')
+
+    def test_live_event_create_requires_login(self):
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/live-events/', {'title': 'x'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_track_upload_is_pending_until_pushed(self):
+        audio = SimpleUploadedFile('hymn.mp3', b'ID3' + b'\0' * 64, content_type='audio/mpeg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/api/upload/track/', {'title': 'Hymn', 'audio_file': audio})
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(Track.objects.get(pk=response.data['id']).upload_status, UPLOAD_PENDING)
+        self.assertEqual(len(callbacks), 1)
+
+    async def test_feed_under_asgi(self):
+        response = await self.async_client.get('/api/social-posts/feed/', headers=self.auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries')
+
+    async def test_sync_views_under_asgi(self):
+        response = await self.async_client.get('/api/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Hymns')
+
+
+class HitCounterTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = user = User.objects.create_user('seller', 'seller@example.com', 'password')
+        cls.track = Track.objects.create(title='Hymn', artist=user, audio_file='video/upload/v1/audio/hymn.mp3')
+        cls.product = Product.objects.create(
+            seller=user, title='Keyboard', description='Barely used', price=100,
+            category=ProductCategory.objects.create(name='Instruments'),
+        )
+        cls.event = LiveEvent.objects.create(user=user, title='Service', youtube_url='https://youtu.be/abcdefghijk')
+
+    def setUp(self):
+        # Hits other tests left behind would land on these rows' ids
+        hits._pending.clear()
+        self.client.force_authenticate(self.user)
+
+    def view_everything(self):
+        for _ in range(3):
+            self.client.get(f'/api/tracks/{self.track.pk}/')
+        for _ in range(2):
+            self.client.get(f'/api/tracks/{self.track.pk}/download/')
+        self.client.get(f'/api/marketplace/products/{self.product.slug}/')
+        self.client.get(f'/api/live-events/{self.event.pk}/')
+
+    def counts(self):
+        self.track.refresh_from_db()
+        self.product.refresh_from_db()
+        self.event.refresh_from_db()
+        return self.track.views, self.track.downloads, self.product.views, self.event.viewers_count
+
+    def test_hits_are_written_behind_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/api/tracks/{self.track.pk}/')
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+        self.view_everything()
+        self.assertEqual(self.counts(), (0, 0, 0, 0))
+
+        with CaptureQueriesContext(connection) as queries:
+            hits.flush()
+        counter_updates = [
+            q for q in queries if q['sql'].startswith('UPDATE') and 'audiencesketch' not in q['sql']
+        ]
+        self.assertEqual(len(counter_updates), 4)
+        self.assertEqual(self.counts(), (4, 2, 1, 1))
+        hits.flush()
+        self.assertEqual(self.counts(), (4, 2, 1, 1))
+
+    @override_settings(HIT_COUNTERS_FLUSH_INTERVAL=0, BACKGROUND_TASKS_EAGER=True)
+    def test_flush_is_scheduled_once_due(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/api/tracks/{self.track.pk}/')
+        self.assertEqual(self.counts()[0], 1)
+
+    @override_settings(HIT_COUNTERS_FLUSH_INTERVAL=60)
+    def test_quiet_workers_flush_on_their_timer(self):
+        self.client.get(f'/api/tracks/{self.track.pk}/')
+        hits.tick()
+        self.assertEqual(self.counts()[0], 0)
+        # A whole interval later, with no traffic in between
+        hits._last_flush -= 60
+        hits.tick()
+        self.assertEqual(self.counts()[0], 1)
+
+    def test_flusher_thread_stops_and_flushes_the_rest(self):
+        hits.start_flusher()
+        flusher = hits._flusher
+        self.assertTrue(flusher.is_alive())
+        hits.start_flusher()
+        self.assertIs(hits._flusher, flusher)
+        hits.record(Track, self.track.pk)
+        hits.stop_flusher()
+        self.assertFalse(flusher.is_alive())
+        self.assertEqual(self.counts()[0], 1)
+
+
+class AudienceSketchTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user('artist', 'artist@example.com', 'password')
+        cls.tracks = [
+            Track.objects.create(title=f'Hymn {n}', artist=cls.artist, audio_file=f'video/upload/v1/audio/{n}.mp3')
+            for n in range(2)
+        ]
+        cls.listeners = [User.objects.create_user(f'listener{n}', f'listener{n}@example.com', 'password') for n in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        hits._pending.clear()
+        hits._visitors.clear()
+
+    def test_estimates_within_error_bounds(self):
+        sketch = sketches.HyperLogLog()
+        for n in range(20_000):
+            sketch.add(f'user:{n}')
+            sketch.add(f'user:{n}')
+        self.assertAlmostEqual(sketch.count(), 20_000, delta=20_000 * 0.05)
+        self.assertEqual(len(bytes(sketch)), sketches.REGISTERS)
+
+    def test_merge_is_the_union(self):
+        monday, tuesday, both = sketches.HyperLogLog(), sketches.HyperLogLog(), sketches.HyperLogLog()
+        for n in range(3000):
+            monday.add(n)
+            both.add(n)
+        for n in range(2000, 5000):
+            tuesday.add(n)
+            both.add(n)
+        self.assertEqual(bytes(monday.merge(tuesday)), bytes(both))
+
+    def listen(self, user, track):
+        self.client.force_authenticate(user)
+        return self.client.get(f'/api/tracks/{track.pk}/')
+
+    def test_unique_listeners_on_detail_and_in_analytics(self):
+        for user in self.listeners:
+            self.listen(user, self.tracks[0])
+            self.listen(user, self.tracks[0])
+        self.listen(self.listeners[0], self.tracks[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            hits.flush()
+
+        response = self.listen(self.artist, self.tracks[0])
+        self.assertEqual(response.data['views'], 6)
+        self.assertEqual(response.data['unique_listeners'], 3)
+        self.assertNotIn('unique_listeners', self.client.get('/api/tracks/').data['results'][0])
+
+        hits.flush()
+        analytics = self.client.get('/api/tracks/analytics/').data
+        self.assertEqual((analytics['unique_listeners'], analytics['recent_unique_listeners']), (4, 4))
+        self.assertEqual(
+            {track['title']: track['unique_listeners'] for track in analytics['tracks']},
+            {'Hymn 0': 4, 'Hymn 1': 1},
+        )
+        self.assertFalse(analytics['truncated'])
+        with override_settings(ANALYTICS_MAX_TRACKS=1):
+            analytics = self.client.get('/api/tracks/analytics/').data
+        self.assertEqual((len(analytics['tracks']), analytics['truncated']), (1, True))
+
+    def test_recent_estimates_read_week_rows_for_whole_weeks(self):
+        track = self.tracks[0]
+        today = timezone.localdate()
+        for back in range(30):
+            sketch = sketches.HyperLogLog()
+            sketch.add(f'user:{back}')
+            sketches.save(Track, track.pk, today - timedelta(days=back), sketch)
+        since = today - timedelta(days=19)
+        self.assertEqual(sketches.unique_counts(Track, [track.pk], since=since), {track.pk: 20})
+        rows = AudienceSketch.objects.filter(sketches._covering(since, today))
+        periods = list(rows.values_list('period', flat=True))
+        self.assertIn(AudienceSketch.WEEK, periods)
+        self.assertEqual(sum(7 if period == AudienceSketch.WEEK else 1 for period in periods), 20)
+
+
+class TrackSearchTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user('choir', 'choir@example.com', 'password')
+        hymns = [
+            ('Amazing Grace', 'Hymns of Faith', 'Amazing grace how sweet the sound that saved a wretch like me'),
+            ('How Great Thou Art', 'Hymns of Faith', 'O Lord my God when I in awesome wonder consider all the worlds'),
+            ('Blessed Assurance', 'Crosby', 'Blessed assurance Jesus is mine, oh what a foretaste of glory divine'),
+            ('Sweet Hour', 'Evening <Songs>', 'Sweet hour of prayer that calls me from a world of care'),
+        ]
+        cls.tracks = {
+            title: Track.objects.create(
+                title=title, album=album, lyrics=lyrics, artist=cls.artist,
+                audio_file=f'video/upload/v1/audio/{n}.mp3',
+            )
+            for n, (title, album, lyrics) in enumerate(hymns)
+        }
+
+    def setUp(self):
+        self.client.force_authenticate(self.artist)
+
+    def search(self, q, **params):
+        response = self.client.get('/api/tracks/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def titles(self, q):
+        return [track['title'] for track in self.search(q)['results']]
+
+    def test_matches_title_album_lyrics_and_artist(self):
+        self.assertEqual(self.titles('wretch'), ['Amazing Grace'])
+        self.assertEqual(self.titles('crosby'), ['Blessed Assurance'])
+        self.assertEqual(len(self.titles('choir')), 4)
+        self.assertEqual(self.titles('nothing like this'), [])
+
+    def test_title_matches_rank_above_lyrics_matches(self):
+        self.assertEqual(self.titles('sweet'), ['Sweet Hour', 'Amazing Grace'])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        track = Track.objects.get(title='Sweet Hour')
+        track.lyrics = 'Sweet hour of <b>prayer</b>'
+        track.save()
+        result = self.search('prayer')['results'][0]
+        self.assertIn('<mark>prayer</mark>', result['snippet'])
+        self.assertIn('&lt;b&gt;', result['snippet'])
+
+    def test_index_follows_edits_deletes_and_renames(self):
+        track = self.tracks['How Great Thou Art']
+        track.lyrics = 'Then sings my soul'
+        track.save()
+        self.assertEqual(self.titles('soul'), ['How Great Thou Art'])
+        self.assertEqual(self.titles('wonder'), [])
+
+        self.artist.username = 'cathedral'
+        with self.settings(BACKGROUND_TASKS_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            self.artist.save()
+        self.assertEqual(len(self.titles('cathedral')), 4)
+
+        track.delete()
+        self.assertEqual(self.titles('soul'), [])
+
+    def test_only_renames_reindex_the_artists_tracks(self):
+        self.artist.bio = 'Evening hymns'
+        with self.settings(BACKGROUND_TASKS_EAGER=True), CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.artist.save()
+        self.assertFalse([q for q in queries.captured_queries if 'songs_track' in q['sql']])
+
+        self.artist.username = 'cathedral'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.artist.save(update_fields=['username'])
+        # Nothing is re-indexed on the request path
+        self.assertEqual(self.titles('cathedral'), [])
+        with self.settings(BACKGROUND_TASKS_EAGER=True):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(len(self.titles('cathedral')), 4)
+
+    def test_keyset_pages(self):
+        first = self.search('choir', page_size=3)
+        self.assertEqual(len(first['results']), 3)
+        second = self.client.get(first['next']).data
+        seen = [t['id'] for t in first['results'] + second['results']]
+        self.assertEqual(sorted(seen), sorted(t.pk for t in self.tracks.values()))
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/tracks/search/').status_code, 400)
+
+
+class UnifiedSearchTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('zion', 'zion@example.com', 'password', first_name='Mount', last_name='Zion')
+        cls.member = User.objects.create_user('member', 'member@example.com', 'password')
+        cls.stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password')
+        cls.church = Church.objects.create(
+            name='Zion Cathedral', continent='Africa', country='Kenya', conference='Central',
+            location='Nairobi', created_by=cls.owner,
+        )
+        Choir.objects.create(name='Nairobi Voices', description='Zion youth choir', location='Nairobi', created_by=cls.owner)
+        Videostudio.objects.create(name='Lens House', description='Films sermons', location='Mombasa', created_by=cls.owner)
+        Product.objects.create(seller=cls.owner, title='Zion hymnal', description='Hardcover', price=10)
+        cls.private = Group.objects.create(creator=cls.owner, name='Zion elders', is_private=True)
+        GroupMember.objects.create(group=cls.private, user=cls.member)
+        Group.objects.create(creator=cls.owner, name='Zion singers', is_private=False)
+
+    def hits(self, q, user=None, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(hit['kind'], hit['title']) for hit in response.data['results']]
+
+    def test_one_ranked_stream_across_kinds(self):
+        hits = self.hits('zion', self.owner)
+        self.assertEqual({kind for kind, _ in hits}, {'church', 'choir', 'group', 'product', 'user'})
+        # Title matches outrank the choir's description match
+        self.assertEqual(hits[-1], ('choir', 'Nairobi Voices'))
+        self.assertEqual(self.hits('sermons'), [('videostudio', 'Lens House')])
+        self.assertCountEqual(self.hits('zion', kind='church,user'), [('church', 'Zion Cathedral'), ('user', 'zion')])
+
+    def test_private_groups_only_for_creator_and_members(self):
+        private = ('group', 'Zion elders')
+        self.assertIn(private, self.hits('elders', self.owner))
+        self.assertIn(private, self.hits('elders', self.member))
+        self.assertNotIn(private, self.hits('elders', self.stranger))
+        self.assertNotIn(private, self.hits('elders'))
+
+        self.private.is_private = False
+        self.private.save()
+        self.assertIn(private, self.hits('elders', self.stranger))
+
+    def test_index_follows_edits_deletes_and_renames(self):
+        self.church.name = 'Bethel Cathedral'
+        self.church.save()
+        self.assertEqual(self.hits('bethel'), [('church', 'Bethel Cathedral')])
+
+        self.owner.username = 'shepherd'
+        with self.settings(BACKGROUND_TASKS_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            self.owner.save()
+        self.assertEqual(self.hits('shepherd'), [('user', 'shepherd'), ('product', 'Zion hymnal')])
+
+        self.owner.bio = 'Choir director'
+        with self.settings(BACKGROUND_TASKS_EAGER=True), CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.owner.save()
+        self.assertFalse([q for q in queries.captured_queries if 'songs_product' in q['sql']])
+
+        self.church.delete()
+        self.assertEqual(self.hits('bethel'), [])
+        self.stranger.is_active = False
+        self.stranger.save()
+        self.assertEqual(self.hits('stranger'), [])
+
+    def test_query_and_kinds_are_validated(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'zion', 'kind': 'track'}).status_code, 400)
+
+
+class AutocompleteTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('Grace', 'grace@example.com', 'password')
+        User.objects.create_user('gracious', 'gracious@example.com', 'password')
+        User.objects.create_user('gone', 'gone@example.com', 'password', is_active=False)
+        cls.track = Track.objects.create(title='Amazing Grace', artist=cls.user, audio_file='video/upload/v1/audio/1.mp3')
+        Track.objects.create(title='Grace Alone', artist=cls.user, audio_file='video/upload/v1/audio/2.mp3',
+                             upload_status=UPLOAD_PENDING)
+        Product.objects.create(seller=cls.user, title='Grace hymnal', description='Hardcover', price=10)
+
+    def setUp(self):
+        autocomplete.rebuild()
+        self.client.force_authenticate(self.user)
+
+    def labels(self, q, **params):
+        response = self.client.get('/api/autocomplete/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(hit['kind'], hit['label']) for hit in response.data['results']]
+
+    def test_prefixes_of_names_and_title_words(self):
+        self.assertEqual(self.labels('GRA'), [
+            ('user', 'Grace'), ('user', 'gracious'), ('track', 'Amazing Grace'), ('product', 'Grace hymnal'),
+        ])
+        self.assertEqual(self.labels('grace h', kind='product'), [('product', 'Grace hymnal')])
+        self.assertEqual(self.labels('gra', kind='user', limit=1), [('user', 'Grace')])
+        self.assertEqual(self.labels('go'), [])
+
+    def test_served_from_memory_once_built(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(len(autocomplete.complete('user', 'gr')), 2)
+        for kind in autocomplete.SOURCES:
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    autocomplete._complete_from_database(kind, 'gra', 10),
+                    sorted(autocomplete.complete(kind, 'gra'), key=lambda hit: (hit[1].casefold(), hit[0])),
+                )
+
+    def test_follows_committed_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            newcomer = User.objects.create_user('graham', 'graham@example.com', 'password')
+            self.track.title = 'How Great Thou Art'
+            self.track.save()
+            pending = Track.objects.get(upload_status=UPLOAD_PENDING)
+            pending.upload_status = UPLOAD_READY
+            pending.save(update_fields=['upload_status'])
+        self.assertIn(('user', 'graham'), self.labels('grah'))
+        self.assertEqual(self.labels('great'), [('track', 'How Great Thou Art')])
+        self.assertEqual(self.labels('amaz'), [])
+        self.assertEqual(self.labels('alone'), [('track', 'Grace Alone')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            newcomer.delete()
+        self.assertEqual(self.labels('grah'), [])
+
+    def test_changes_committed_during_a_build_survive_it(self):
+        index = autocomplete.PrefixIndex()
+
+        def rows():
+            # Both changes commit after the build read its rows
+            yield 1, 'grace', 1
+            yield 2, 'gone', 2
+            index.put(1, 'graham', 1)
+            index.discard(2)
+
+        index.load(rows())
+        self.assertEqual(index.complete('g', 10), [(1, 'graham', '1')])
+        index.put(3, 'gracious', 3)
+        self.assertEqual(len(index), 2)
+
+    def test_query_kind_and_limit_are_validated(self):
+        self.assertEqual(self.client.get('/api/autocomplete/').status_code, 400)
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': 'g', 'kind': 'church'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': 'g', 'limit': 'ten'}).status_code, 400)
@@ -0,0 +1,55 @@
+"""
+YouTube thumbnail resolution for live events.
+
+Not every video has every thumbnail size, and the only way to find out is
+to probe img.youtube.com. Events are saved with the `mqdefault` URL, which
+always exists, and a background task upgrades them to the best available
+size. Results are cached per video id so a video is only probed once.
+"""
+import logging
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Best first
+THUMBNAIL_QUALITIES = ('maxresdefault', 'hqdefault', 'mqdefault', 'default')
+DEFAULT_QUALITY = 'mqdefault'
+
+
+def _base_url():
+    return getattr(settings, 'YOUTUBE_THUMBNAIL_BASE_URL', 'https://img.youtube.com/vi').rstrip('/')
+
+
+def thumbnail_url(video_id, quality=DEFAULT_QUALITY):
+    return f"{_base_url()}/{video_id}/{quality}.jpg"
+
+
+def _cache_key(video_id):
+    return f'youtube-thumbnail:{video_id}'
+
+
+def _exists(url):
+    try:
+        response = requests.head(url, timeout=getattr(settings, 'YOUTUBE_THUMBNAIL_TIMEOUT', 2))
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def resolve_thumbnail(video_id):
+    """URL of the best thumbnail YouTube has for `video_id`."""
+    url = cache.get(_cache_key(video_id))
+    if url is not None:
+        return url
+    for quality in THUMBNAIL_QUALITIES:
+        url = thumbnail_url(video_id, quality)
+        if _exists(url):
+            cache.set(_cache_key(video_id), url,
+                      getattr(settings, 'YOUTUBE_THUMBNAIL_CACHE_TIMEOUT', 60 * 60 * 24))
+            logger.debug("Resolved thumbnail for %s: %s", video_id, url)
+            return url
+    # Nothing answered (e.g. YouTube unreachable): keep the default, uncached
+    return thumbnail_url(video_id)
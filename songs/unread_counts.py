@@ -0,0 +1,70 @@
+"""
+Per-user unread notification counters kept in the cache.
+
+The app polls the unread badge constantly, so the count lives under one
+cache key per user: notification creation increments it, marking as read
+decrements it, and the database is only counted again after a cache miss.
+That needs a cache with an atomic INCR shared by all workers (Redis); with
+UNREAD_COUNT_CACHED off every read counts the database.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _enabled():
+    return getattr(settings, 'UNREAD_COUNT_CACHED', False)
+
+
+def _timeout():
+    # Expiry bounds how long a counter that drifted can stay wrong
+    return getattr(settings, 'UNREAD_COUNT_TIMEOUT', 60 * 60 * 24)
+
+
+def _missed_key(user_id):
+    # Bumped by every change that found no counter to shift
+    return f'notifications:unread:{user_id}:missed'
+
+
+def get_unread_count(user_id):
+    """Cached unread count, rebuilt from the database on a miss."""
+    if not _enabled():
+        return Notification.objects.filter(recipient_id=user_id, read=False).count()
+    count = cache.get(_key(user_id))
+    if count is None:
+        missed = cache.get(_missed_key(user_id))
+        count = Notification.objects.filter(recipient_id=user_id, read=False).count()
+        # A change that committed meanwhile found no counter to shift and may
+        # be missing from this count; caching it would keep it wrong until expiry
+        if cache.get(_missed_key(user_id)) == missed:
+            # add() so a counter written concurrently is not overwritten
+            cache.add(_key(user_id), count, _timeout())
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """Shift a cached counter; a missing counter is left for the next read."""
+    if not _enabled():
+        return
+    key = _key(user_id)
+    try:
+        count = cache.incr(key, delta)
+    except ValueError:
+        missed = _missed_key(user_id)
+        cache.add(missed, 0, _timeout())
+        try:
+            cache.incr(missed)
+        except ValueError:
+            pass  # evicted in between, which readers notice as well
+        return
+    if count < 0:
+        cache.delete(key)
+
+
+def reset_unread_count(user_id):
+    cache.delete(_key(user_id))
@@ -0,0 +1,239 @@
+"""
+Asynchronous media uploads.
+
+Upload views copy the incoming file to a spool directory on local disk,
+create the row as pending and answer 202 straight away. A background task
+(see songs.background) then pushes the file to the configured MediaStorage,
+flips the row to ready (or failed) and removes the spooled copy, so slow
+uploads never hold a web worker.
+
+Tasks only live in the worker's memory. When a worker dies mid-upload (a
+deploy, a crash), `recover_stale` (the recover_uploads command) marks the
+rows it left pending as failed and deletes their spooled files.
+
+Endpoints that must store several files before answering use
+`upload_many`, which pushes them concurrently.
+"""
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import autocomplete
+from .background import submit_on_commit
+from .feed import fan_out_post
+from .media_urls import variant_manifest
+from .models import (
+    UPLOAD_FAILED, UPLOAD_PENDING, UPLOAD_READY, Group, ProductImage, Profile, SocialPost, Track,
+)
+from .storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+def _spool_dir():
+    path = getattr(settings, 'UPLOAD_SPOOL_DIR', None) \
+        or os.path.join(tempfile.gettempdir(), 'light2-uploads')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool(uploaded_file):
+    """Copy an uploaded file to the spool directory and return its path."""
+    extension = os.path.splitext(uploaded_file.name or '')[1]
+    fd, path = tempfile.mkstemp(suffix=extension, dir=_spool_dir())
+    with os.fdopen(fd, 'wb') as out:
+        for chunk in uploaded_file.chunks():
+            out.write(chunk)
+    return path
+
+
+def _discard(*paths):
+    for path in paths:
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def stored_value(result):
+    """
+    What CloudinaryField stores for an upload `result`:
+    `<resource_type>/<type>/v<version>/<public_id>.<format>`. A bare public
+    id would lose the version and format, and read back as an image.
+    """
+    value = result['public_id']
+    if result.get('format'):
+        value = f"{value}.{result['format']}"
+    if result.get('version'):
+        value = f"v{result['version']}/{value}"
+    if result.get('resource_type') in ('image', 'video', 'raw'):
+        value = f"{result['resource_type']}/{result.get('type') or 'upload'}/{value}"
+    return value
+
+
+def _push(path, folder, resource_type, **options):
+    return get_storage().upload(path, folder=folder, resource_type=resource_type, **options)
+
+
+def _push_spooled(path, folder, resource_type, options):
+    try:
+        return _push(path, folder, resource_type, **options)
+    finally:
+        _discard(path)
+
+
+def upload_many(files, folder, resource_type='auto', **options):
+    """
+    Push several uploaded files to storage at once on a bounded thread pool,
+    so a batch takes about as long as its slowest file.
+
+    Returns `(uploaded, failed)`: `(file, storage result)` pairs in input
+    order, and `{'file': name, 'error': message}` for each file that failed.
+    """
+    if not files:
+        return [], []
+    # Spool first: uploaded files are not safe to read from several threads
+    paths = [spool(f) for f in files]
+    workers = min(len(files), getattr(settings, 'UPLOAD_CONCURRENCY', 4))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='songs-upload') as executor:
+        futures = [
+            executor.submit(_push_spooled, path, folder, resource_type, options)
+            for path in paths
+        ]
+    uploaded, failed = [], []
+    for uploaded_file, future in zip(files, futures):
+        try:
+            uploaded.append((uploaded_file, future.result()))
+        except Exception as exc:
+            logger.warning("Upload of %s failed: %s", uploaded_file.name, exc)
+            failed.append({'file': uploaded_file.name, 'error': str(exc)})
+    return uploaded, failed
+
+
+def upload_track_media(track_id, audio_path, cover_path=None):
+    try:
+        audio = _push(audio_path, 'audio', 'video', format='mp3')
+        fields = {'audio_file': stored_value(audio), 'upload_status': UPLOAD_READY}
+        if cover_path:
+            fields['cover_image'] = stored_value(_push(cover_path, 'covers', 'image'))
+            fields['variants'] = variant_manifest(fields['cover_image'], 'image')
+        # update() rather than save() so stored like/comment counters are not overwritten
+        Track.objects.filter(pk=track_id).update(**fields)
+    except Exception:
+        logger.exception("Upload failed for track %s", track_id)
+        Track.objects.filter(pk=track_id).update(upload_status=UPLOAD_FAILED)
+    else:
+        # update() skips post_save; offer the now playable track for typeahead
+        track = Track.objects.filter(pk=track_id).first()
+        if track:
+            autocomplete.refresh('track', track)
+    finally:
+        _discard(audio_path, cover_path)
+
+
+def upload_post_media(post_id, media_path):
+    try:
+        result = _push(media_path, 'social_media', 'auto')
+        content_type = SocialPost.objects.filter(pk=post_id).values_list('content_type', flat=True).first() or 'image'
+        media_file = stored_value(result)
+        fields = {
+            'media_file': media_file,
+            'variants': variant_manifest(media_file, content_type, resource_type=content_type),
+            'upload_status': UPLOAD_READY,
+        }
+        for dimension in ('width', 'height'):
+            if result.get(dimension):
+                fields[dimension] = result[dimension]
+        SocialPost.objects.filter(pk=post_id).update(**fields)
+    except Exception:
+        logger.exception("Upload failed for social post %s", post_id)
+        SocialPost.objects.filter(pk=post_id).update(upload_status=UPLOAD_FAILED)
+        return
+    finally:
+        _discard(media_path)
+    # Followers only get the post once its media can be played
+    post = SocialPost.objects.filter(pk=post_id).first()
+    if post:
+        fan_out_post(post)
+
+
+def upload_product_image(image_id, path):
+    try:
+        result = _push(path, 'products/images', 'image')
+        image = stored_value(result)
+        ProductImage.objects.filter(pk=image_id).update(
+            image=image,
+            variants=variant_manifest(image, 'image'),
+            upload_status=UPLOAD_READY
+        )
+    except Exception:
+        logger.exception("Upload failed for product image %s", image_id)
+        ProductImage.objects.filter(pk=image_id).update(upload_status=UPLOAD_FAILED)
+    finally:
+        _discard(path)
+
+
+def upload_profile_picture(profile_id, path, folder, transformation):
+    try:
+        result = _push(path, folder, 'image', transformation=transformation)
+        profile = Profile.objects.get(pk=profile_id)
+        profile.picture = stored_value(result)
+        profile.save(update_fields=['picture', 'variants', 'updated_at'])
+    except Exception:
+        logger.exception("Upload failed for profile picture %s", profile_id)
+    finally:
+        _discard(path)
+
+
+def upload_group_cover(group_id, path):
+    try:
+        result = _push(path, 'group_covers', 'image', transformation=[
+            {'width': 1200, 'height': 630, 'crop': 'fill'},
+            {'quality': 'auto'}
+        ])
+        group = Group.objects.get(pk=group_id)
+        group.cover_image = stored_value(result)
+        group.save(update_fields=['cover_image', 'variants', 'updated_at'])
+    except Exception:
+        logger.exception("Upload failed for group cover %s", group_id)
+    finally:
+        _discard(path)
+
+
+def schedule(task, *args, **kwargs):
+    """Run an upload task once the pending row it updates is committed."""
+    submit_on_commit(task, *args, **kwargs)
+
+
+# Models uploaded through the pipeline, with the field that dates their rows
+PIPELINE_MODELS = ((Track, 'created_at'), (SocialPost, 'created_at'), (ProductImage, 'uploaded_at'))
+
+
+def recover_stale(minutes):
+    """
+    Fail the rows left pending for more than `minutes` and delete spooled
+    files as old, whose tasks died with their worker. Returns
+    `({model name: rows failed}, files deleted)`.
+    """
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    failed = {
+        model._meta.model_name: model.objects.filter(
+            upload_status=UPLOAD_PENDING, **{f'{field}__lt': cutoff}
+        ).update(upload_status=UPLOAD_FAILED)
+        for model, field in PIPELINE_MODELS
+    }
+    removed = 0
+    oldest = time.time() - minutes * 60
+    with os.scandir(_spool_dir()) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < oldest:
+                _discard(entry.path)
+                removed += 1
+    return failed, removed
@@ -31,7 +31,9 @@ from .views import (
     LiveEventViewSet,
     AvatarUploadView,
     TrackUploadView,
-    SocialPostUploadView
+    SocialPostUploadView,
+    SearchView,
+    AutocompleteView
 
 
 
@@ -80,6 +82,8 @@ products_router.register(r'reviews', ProductReviewViewSet, basename='product-rev
 urlpatterns = [
     # Existing routes
     path('signup/', SignUpView.as_view(), name='signup'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
     path('tracks/<int:pk>/download/', TrackViewSet.as_view({'get': 'download'}), name='track-download'),
     path('tracks/upload/', TrackViewSet.as_view({'post': 'upload_track'}), name='track-upload'),
     path('tracks/favorites/', TrackViewSet.as_view({'get': 'get_favorites'}), name='track-favorites'),
@@ -0,0 +1,164 @@
+"""
+Batched "viewer state" for list pages.
+
+Serializers expose per-row flags such as `is_liked`, `is_saved`,
+`is_following` and `is_member`. Answering them row by row costs one EXISTS
+query per flag per object, so list views collect the ids on the page once,
+fetch the requesting user's likes/saves/follows/memberships with one
+`IN (...)` query per relation, and pass the result to the serializers in
+their context under `viewer_state`.
+"""
+from collections import defaultdict
+
+from .models import (
+    Choir, Comment, Group, GroupMember, Like, LiveEvent, Notification, Playlist,
+    PostComment, PostLike, PostSave, Product, SocialPost, Track, User, Videostudio,
+)
+
+LIKED_POSTS = 'liked_posts'
+SAVED_POSTS = 'saved_posts'
+LIKED_TRACKS = 'liked_tracks'
+FOLLOWING = 'following'
+GROUP_MEMBERS = 'group_members'
+GROUP_ADMINS = 'group_admins'
+
+
+def _loaded(obj, attname):
+    """
+    An attribute already on the instance. Columns deferred by ?fields=
+    pruning read as None instead of costing a query per row; nothing on
+    the page needs them.
+    """
+    return obj.__dict__.get(attname)
+
+
+def _add(ids, key, value):
+    if value is not None:
+        ids[key].add(value)
+
+
+def _collect_post(post, ids):
+    ids['posts'].add(post.pk)
+    _add(ids, 'users', _loaded(post, 'user_id'))
+    if _loaded(post, 'song_id'):
+        ids['tracks'].add(post.song_id)
+        if SocialPost.song.is_cached(post):
+            _add(ids, 'users', post.song.artist_id)
+
+
+def _collect_track(track, ids):
+    ids['tracks'].add(track.pk)
+    _add(ids, 'users', _loaded(track, 'artist_id'))
+
+
+def _collect_group(group, ids):
+    ids['groups'].add(group.pk)
+    _add(ids, 'users', _loaded(group, 'creator_id'))
+
+
+def _collect_notification(notification, ids):
+    _add(ids, 'posts', _loaded(notification, 'post_id'))
+    _add(ids, 'tracks', _loaded(notification, 'track_id'))
+    if Notification.post.is_cached(notification) and notification.post is not None:
+        _collect_post(notification.post, ids)
+    if Notification.track.is_cached(notification) and notification.track is not None:
+        _collect_track(notification.track, ids)
+
+
+def _through(descriptor, collect):
+    """Collect the row a foreign key points at, if it was loaded along with `obj`."""
+    def collector(obj, ids):
+        if descriptor.is_cached(obj):
+            collect(getattr(obj, descriptor.field.name), ids)
+    return collector
+
+
+def _collect_playlist(playlist, ids):
+    # Only tracks that were prefetched; anything else would be a query per row
+    for track in getattr(playlist, '_prefetched_objects_cache', {}).get('tracks', ()):
+        _collect_track(track, ids)
+
+
+COLLECTORS = {
+    SocialPost: _collect_post,
+    Track: _collect_track,
+    User: lambda user, ids: ids['users'].add(user.pk),
+    Group: _collect_group,
+    Notification: _collect_notification,
+    Product: lambda product, ids: _add(ids, 'users', _loaded(product, 'seller_id')),
+    LiveEvent: lambda event, ids: _add(ids, 'users', _loaded(event, 'user_id')),
+    Choir: lambda choir, ids: _add(ids, 'users', _loaded(choir, 'created_by_id')),
+    Videostudio: lambda studio, ids: _add(ids, 'users', _loaded(studio, 'created_by_id')),
+    Like: _through(Like.track, _collect_track),
+    Comment: _through(Comment.track, _collect_track),
+    PostLike: _through(PostLike.post, _collect_post),
+    PostComment: _through(PostComment.post, _collect_post),
+    PostSave: _through(PostSave.post, _collect_post),
+    Playlist: _collect_playlist,
+}
+
+
+class ViewerState:
+    """The requesting user's relations to the objects of one page."""
+
+    def __init__(self, user):
+        self.user = user
+        # relation -> ids that were checked / ids that matched
+        self._scopes = {}
+        self._hits = {}
+
+    @classmethod
+    def for_objects(cls, user, objects):
+        state = cls(user)
+        ids = defaultdict(set)
+        for obj in objects:
+            collector = COLLECTORS.get(type(obj))
+            if collector:
+                collector(obj, ids)
+        state.resolve(**ids)
+        return state
+
+    def lookup(self, relation, pk):
+        """True/False if `pk` was resolved for `relation`, None if unknown."""
+        scope = self._scopes.get(relation)
+        if scope is None or pk not in scope:
+            return None
+        return pk in self._hits[relation]
+
+    def _store(self, relation, scope, hits):
+        self._scopes[relation] = set(scope)
+        self._hits[relation] = set(hits)
+
+    def resolve(self, posts=(), tracks=(), users=(), groups=()):
+        authenticated = self.user is not None and self.user.is_authenticated
+
+        def fetch(ids, queryset_factory):
+            if not ids or not authenticated:
+                return ()
+            return queryset_factory(ids)
+
+        if posts:
+            self._store(LIKED_POSTS, posts, fetch(posts, lambda ids: PostLike.objects.filter(
+                user=self.user, post_id__in=ids).values_list('post_id', flat=True)))
+            self._store(SAVED_POSTS, posts, fetch(posts, lambda ids: PostSave.objects.filter(
+                user=self.user, post_id__in=ids).values_list('post_id', flat=True)))
+        if tracks:
+            self._store(LIKED_TRACKS, tracks, fetch(tracks, lambda ids: Like.objects.filter(
+                user=self.user, track_id__in=ids).values_list('track_id', flat=True)))
+        if users:
+            # `X.followers` holds the users following X, so the viewer is the to_user
+            self._store(FOLLOWING, users, fetch(users, lambda ids: User.followers.through.objects.filter(
+                to_user_id=self.user.id, from_user_id__in=ids).values_list('from_user_id', flat=True)))
+        if groups:
+            memberships = list(fetch(groups, lambda ids: GroupMember.objects.filter(
+                user=self.user, group_id__in=ids).values_list('group_id', 'is_admin')))
+            self._store(GROUP_MEMBERS, groups, [group_id for group_id, _ in memberships])
+            self._store(GROUP_ADMINS, groups, [group_id for group_id, is_admin in memberships if is_admin])
+
+
+def viewer_lookup(context, relation, pk):
+    """Answer from a serializer context's viewer state, or None to fall back."""
+    state = context.get('viewer_state')
+    if state is None:
+        return None
+    return state.lookup(relation, pk)
@@ -15,19 +15,18 @@ from django.http import FileResponse,Http404
 from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from django.shortcuts import get_object_or_404 
-from rest_framework.pagination import PageNumberPagination
 from django.db import transaction
 from django.contrib.auth.decorators import login_required
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser,JSONParser
+from rest_framework.throttling import BaseThrottle
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_control
-from cloudinary.uploader import upload
 from cloudinary.uploader import destroy 
-from cloudinary.exceptions import Error as CloudinaryError
-from .models import User,SocialPost,PostSave,PostComment, PostLike, LiveEvent, Track, Playlist, Profile, Comment, Like, Category, Notification,Church,Videostudio, Choir, Group, GroupMember, GroupJoinRequest, GroupPost,GroupPostAttachment,ProductCategory,ProductImage,Product,CartItem,Cart,OrderItem,Order,ProductReview,Wishlist
+from .models import UPLOAD_PENDING, UPLOAD_READY, User,SocialPost,FeedEntry,PostSave,PostComment, PostLike, LiveEvent, Track, Playlist, Profile, Comment, Like, Category, Notification,Church,Videostudio, Choir, Group, GroupMember, GroupJoinRequest, GroupPost,GroupPostAttachment,ProductCategory,ProductImage,Product,CartItem,Cart,OrderItem,Order,ProductReview,Wishlist
 from .serializers import (
+    CloudinaryFieldSerializer,
     UserSerializer,
     TrackSerializer,
     PlaylistSerializer,
@@ -58,133 +57,203 @@ from .serializers import (
     ProductImageSerializer,
     ProductCategorySerializer,
     LiveEventSerializer,
+    SearchEntrySerializer,
     AvatarUploadSerializer,
     TrackUploadSerializer,
     SocialPostUploadSerializer
 )
+from .feed import fan_out_post, backfill_author, remove_author
+from .pagination import CreatedAtCursorPagination, SearchRankCursorPagination
+from .viewer_state import ViewerState
+from . import caching
+from . import fieldsets, prefetching
+from .thumbnails import thumbnail_url
+from . import autocomplete, hits, search, sketches, uploads
+from .asyncviews import AsyncViewMixin, request_data, serializer_data
+from .unread_counts import adjust_unread_count, get_unread_count, reset_unread_count
 import logging
+import mimetypes
 import time
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from django.conf import settings
-from django.db.models import Count
+from django.db.models import Count, Prefetch
 from datetime import timedelta
 logger = logging.getLogger(__name__)
 
 
+class ViewerStateMixin:
+    """
+    Resolve the requesting user's likes/saves/follows/memberships for a whole
+    page at once, instead of one EXISTS query per row in the serializers.
+    """
+    def get_viewer_context(self, objects):
+        context = self.get_serializer_context()
+        context['viewer_state'] = ViewerState.for_objects(self.request.user, objects)
+        return context
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args and 'context' not in kwargs:
+            kwargs['context'] = self.get_viewer_context(args[0])
+        elif self.action == 'retrieve' and args and 'context' not in kwargs:
+            # A single object can still nest a page's worth (a playlist's tracks)
+            kwargs['context'] = self.get_viewer_context([args[0]])
+        return super().get_serializer(*args, **kwargs)
+
+
+class QueryPlanMixin:
+    """
+    Load what the serializer will read (see songs.prefetching), then trim it
+    to what ?fields= / ?expand= asked for (see songs.fieldsets).
+    """
+
+    def planned(self, queryset, serializer_class=None):
+        """`queryset` with what the serializer reads, for actions that build their own."""
+        serializer = serializer_class(context=self.get_serializer_context()) if serializer_class else self.get_serializer()
+        return prefetching.plan_queryset(queryset, serializer)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer = self.get_serializer()
+        queryset = prefetching.plan_queryset(queryset, serializer)
+        # The cursor paginator reads the ordering columns off each row
+        ordering = getattr(self, 'cursor_ordering', None) or getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return fieldsets.prune_queryset(queryset, serializer, keep=ordering)
+
+
+class CachedListMixin:
+    """
+    Serve `list` through the cache-aside layer, keyed by the full URL so each
+    page/filter combination is cached separately. Only for endpoints whose
+    payload does not depend on the requesting user.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        data = caching.get_or_compute(
+            self.cache_namespace,
+            request.build_absolute_uri(),
+            lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data
+        )
+        return Response(data)
+
 
-class AvatarUploadView(APIView):
+class HitCountMixin:
+    """
+    Count a hit on the object's `hit_counter` field on every retrieve, and
+    its visitor towards the unique audience estimate the detail carries.
+    Both are written behind (see songs.hits), so the detail shows them a
+    few seconds late.
+    """
+    hit_counter = 'views'
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        hits.record(type(instance), instance.pk, self.hit_counter, visitor=self.visitor(request))
+        self.audience = sketches.unique_count(type(instance), instance.pk)
+        return Response(self.get_serializer(instance).data)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if getattr(self, 'audience', None) is not None:
+            context['audience'] = self.audience
+        return context
+
+    def visitor(self, request):
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        # Client address as the throttles see it (honours NUM_PROXIES)
+        return f'ip:{BaseThrottle().get_ident(request)}'
+
+
+class AvatarUploadView(AsyncViewMixin, APIView):
     parser_classes = [MultiPartParser]
     permission_classes = [permissions.IsAuthenticated]
 
-    def put(self, request):
+    async def put(self, request):
         """Alternative endpoint for avatar uploads"""
-        if not hasattr(request.user, 'profile'):
+        profile = await Profile.objects.select_related('user').filter(user=request.user).afirst()
+        if profile is None:
             return Response(
                 {'error': 'Profile does not exist'},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        serializer = AvatarUploadSerializer(data=request.data)
+        serializer = AvatarUploadSerializer(data=await request_data(request))
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            result = upload(
-                serializer.validated_data['avatar'],
-                folder='profile_pictures',
-                resource_type='image',
-                transformation=[
-                    {'width': 300, 'height': 300, 'crop': 'thumb', 'gravity': 'face'},
-                    {'quality': 'auto'}
-                ]
-            )
-            
-            # Update profile with new picture data
-            profile = request.user.profile
-            profile.picture = {
-                'public_id': result['public_id'],
-                'secure_url': result['secure_url']
-            }
-            profile.save()
-            
-            return Response(
-                ProfileSerializer(profile, context={'request': request}).data,
-                status=status.HTTP_200_OK
-            )
-        except Exception as e:
-            logger.error(f"Avatar upload failed: {str(e)}")
-            return Response(
-                {'error': 'Failed to process image upload'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Pushed to storage in the background; the picture changes once it lands
+        avatar = await sync_to_async(uploads.spool)(serializer.validated_data['avatar'])
+        await sync_to_async(uploads.schedule)(
+            uploads.upload_profile_picture,
+            profile.id,
+            avatar,
+            'profile_pictures',
+            [
+                {'width': 300, 'height': 300, 'crop': 'thumb', 'gravity': 'face'},
+                {'quality': 'auto'}
+            ]
+        )
+        data = await serializer_data(ProfileSerializer(profile, context={'request': request}))
+        return Response(dict(data, upload_status=UPLOAD_PENDING), status=status.HTTP_202_ACCEPTED)
 
-class TrackUploadView(APIView):
+class TrackUploadView(AsyncViewMixin, APIView):
     parser_classes = [MultiPartParser]
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        serializer = TrackUploadSerializer(data=request.data)
+    async def post(self, request):
+        data = await request_data(request)
+        serializer = TrackUploadSerializer(data=data)
         if serializer.is_valid():
-            try:
-                # Upload audio file
-                audio_result = upload(
-                    serializer.validated_data['audio_file'],
-                    folder='audio',
-                    resource_type='video',
-                    format='mp3'
-                )
-                
-                # Upload cover image if provided
-                cover_result = None
-                if 'cover_image' in serializer.validated_data:
-                    cover_result = upload(
-                        serializer.validated_data['cover_image'],
-                        folder='covers',
-                        resource_type='image'
-                    )
-                
-                # Create track
-                track_data = {
-                    'title': request.data.get('title', 'Untitled Track'),
-                    'artist': request.user.id,
-                    'audio_file': audio_result['public_id'],
-                    'cover_image': cover_result['public_id'] if cover_result else None,
-                    'album': request.data.get('album', ''),
-                    'lyrics': request.data.get('lyrics', '')
-                }
-                
-                track_serializer = TrackSerializer(data=track_data, context={'request': request})
-                if track_serializer.is_valid():
-                    track = track_serializer.save()
-                    return Response(track_serializer.data, status=status.HTTP_201_CREATED)
-                return Response(track_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-                
-            except CloudinaryError as e:
-                return Response(
-                    {'error': str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            track = await sync_to_async(self.create_pending)(request.user, data, serializer.validated_data)
+            return Response(
+                await serializer_data(TrackSerializer(track, context={'request': request})),
+                status=status.HTTP_202_ACCEPTED
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
+    def create_pending(self, user, data, validated_data):
+        # The track exists straight away as pending; the audio and cover
+        # are pushed to storage in the background and flip it to ready
+        track = Track.objects.create(
+            title=(data.get('title') or 'Untitled Track').strip(),
+            artist=user,
+            album=data.get('album', ''),
+            lyrics=data.get('lyrics', ''),
+            audio_file='',
+            upload_status=UPLOAD_PENDING
+        )
+        cover_image = validated_data.get('cover_image')
+        uploads.schedule(
+            uploads.upload_track_media,
+            track.id,
+            uploads.spool(validated_data['audio_file']),
+            uploads.spool(cover_image) if cover_image else None
+        )
+        return track
+
 class SignUpView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        print("Request data received:", request.data)  # Debug log
-
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
             return Response({"message": "User registered successfully"}, status=status.HTTP_201_CREATED)
         
-        print("Serializer errors:", serializer.errors)  # Debug log
+        logger.debug("Signup rejected: %s", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('-date_joined', '-id')
     def get_queryset(self):
         queryset = super().get_queryset()
         
@@ -224,8 +293,8 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def playlists(self, request, pk=None):
         user = self.get_object()
-        playlists = Playlist.objects.filter(user=user)
-        serializer = PlaylistSerializer(playlists, many=True)
+        playlists = self.planned(Playlist.objects.filter(user=user), PlaylistSerializer)
+        serializer = PlaylistSerializer(playlists, many=True, context=self.get_viewer_context(playlists))
         return Response(serializer.data)
 
 
@@ -242,9 +311,11 @@ class UserViewSet(viewsets.ModelViewSet):
 
         if current_user in user_to_follow.followers.all():
             user_to_follow.followers.remove(current_user)
+            remove_author(current_user, user_to_follow)
             action = 'unfollowed'
         else:
             user_to_follow.followers.add(current_user)
+            backfill_author(current_user, user_to_follow)
             action = 'followed'
             Notification.objects.create(
                 recipient=user_to_follow,
@@ -260,27 +331,45 @@ class UserViewSet(viewsets.ModelViewSet):
             "followers_count": user_to_follow.followers.count(),
             "following_count": user_to_follow.followed_by.count()
         })
+    def _social_posts_page(self, user):
+        """One cursor-paginated page of a user's posts, newest first"""
+        posts = self.planned(
+            SocialPost.objects.filter(user=user, upload_status=UPLOAD_READY),
+            SocialPostSerializer
+        )
+        content_type = self.request.query_params.get('content_type')
+        if content_type in ['image', 'video']:
+            posts = posts.filter(content_type=content_type)
+
+        paginator = CreatedAtCursorPagination()
+        page = paginator.paginate_queryset(posts, self.request)
+        serializer = SocialPostSerializer(
+            page,
+            many=True,
+            context=self.get_viewer_context(page)
+        )
+        return paginator, serializer.data
+
+    def retrieve(self, request, *args, **kwargs):
+        """User detail; posts are only embedded with ?expand=social_posts"""
+        instance = self.get_object()
+        data = self.get_serializer(instance).data
+        expand = request.query_params.get('expand', '').split(',')
+        if 'social_posts' in expand:
+            paginator, posts = self._social_posts_page(instance)
+            data['social_posts'] = {
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'results': posts,
+            }
+        return Response(data)
+
     @action(detail=True, methods=['get'])
     def social_posts(self, request, pk=None):
         """Get user's posts with optimized author pictures"""
         user = self.get_object()
-        posts = SocialPost.objects.filter(user=user).select_related('user__profile')
-        
-        page = self.paginate_queryset(posts)
-        if page is not None:
-            serializer = SocialPostSerializer(
-                page, 
-                many=True,
-                context=self.get_serializer_context()
-            )
-            return self.get_paginated_response(serializer.data)
-            
-        serializer = SocialPostSerializer(
-            posts, 
-            many=True,
-            context=self.get_serializer_context()
-        )
-        return Response(serializer.data)
+        paginator, posts = self._social_posts_page(user)
+        return paginator.get_paginated_response(posts)
     @action(detail=True, methods=['get'])
     def followers_count(self, request, pk=None):
         """Dedicated endpoint just for follower count"""
@@ -302,22 +391,28 @@ class UserViewSet(viewsets.ModelViewSet):
     def followers(self, request, pk=None):
         """Get list of followers"""
         user = self.get_object()
-        followers = user.followers.all()
-        serializer = self.get_serializer(followers, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(self.planned(user.followers.all()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def following(self, request, pk=None):
         """Get list of users this user follows"""
         user = self.get_object()
-        following = user.followed_by.all()
-        serializer = self.get_serializer(following, many=True)
-        return Response(serializer.data)
-class TrackViewSet(viewsets.ModelViewSet):
+        page = self.paginate_queryset(self.planned(user.followed_by.all()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+class TrackViewSet(HitCountMixin, ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Track.objects.all().order_by('-created_at')
     serializer_class = TrackSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # Tracks still uploading (or failed) are only reachable by id
+            queryset = queryset.filter(upload_status=UPLOAD_READY)
+        return queryset
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -368,10 +463,11 @@ class TrackViewSet(viewsets.ModelViewSet):
         if Like.objects.filter(user=user, track=track).exists():
           return Response({"error": "You have already liked this track."}, status=400)
 
-        Like.objects.create(user=user, track=track)
-    # Return the updated like count
-        likes_count = Like.objects.filter(track=track).count()
-        return Response({"status": "Track liked", "likes_count": likes_count})
+        with transaction.atomic():
+            Like.objects.create(user=user, track=track)
+        # Return the updated like count
+        track.refresh_from_db(fields=['likes_count'])
+        return Response({"status": "Track liked", "likes_count": track.likes_count})
 
 
 
@@ -383,14 +479,16 @@ class TrackViewSet(viewsets.ModelViewSet):
         existing_like = Like.objects.filter(user=user, track=track).first()
         if existing_like:
             existing_like.delete()
-            likes_count = track.likes.count()
+            track.refresh_from_db(fields=['likes_count'])
             return Response({
                 "status": "Track unliked",
-                "likes_count": likes_count,
+                "likes_count": track.likes_count,
                 "is_liked": False
             })
-        Like.objects.create(user=user, track=track)
-        likes_count = track.likes.count()
+        with transaction.atomic():
+            Like.objects.create(user=user, track=track)
+        track.refresh_from_db(fields=['likes_count'])
+        likes_count = track.likes_count
         # Create notification
         Notification.objects.create(
             recipient=track.artist,
@@ -411,6 +509,7 @@ class TrackViewSet(viewsets.ModelViewSet):
         track = self.get_object()
         if not track.audio_file:
             return Response({'error': 'Audio file not found'}, status=404)
+        hits.record(Track, track.pk, 'downloads')
         return Response({
             'download_url': CloudinaryFieldSerializer().to_representation(track.audio_file)
         })
@@ -434,19 +533,73 @@ class TrackViewSet(viewsets.ModelViewSet):
             existing_like.delete()
             return Response({"status": "Track unfavorited"}, status=status.HTTP_200_OK)
         
-        Like.objects.create(user=user, track=track)
+        with transaction.atomic():
+            Like.objects.create(user=user, track=track)
         return Response({"status": "Track favorited"}, status=status.HTTP_200_OK)
 
 
     @action(detail=False, methods=['get'], url_path='favorites')
     def get_favorites(self, request):
         user = request.user
-        favorites = Track.objects.filter(likes__user=user)
-        serializer = TrackSerializer(favorites, many=True, context={"request": request})
+        favorites = self.planned(Track.objects.filter(likes__user=user))
+        serializer = TrackSerializer(favorites, many=True, context=self.get_viewer_context(favorites))
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search_tracks(self, request):
+        """
+        Tracks matching ?q= in their title, artist, album or lyrics, best
+        match first, each with its `rank` and a highlighted lyrics `snippet`.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This parameter is required.'})
+        queryset = search.search_tracks(text, self.planned(Track.objects.filter(upload_status=UPLOAD_READY)))
+        paginator = SearchRankCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        data = self.get_serializer(page, many=True).data
+        for item, track in zip(data, page):
+            item['rank'] = track.rank
+            item['snippet'] = search.highlight(track.snippet)
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Stats of the current user's latest ANALYTICS_MAX_TRACKS tracks
+        (`truncated` when they have more): counters, and unique listeners
+        all-time and over the last ?days= (1-90, default 7), per track and
+        across all of them.
+        """
+        try:
+            days = min(max(int(request.query_params.get('days', 7)), 1), 90)
+        except ValueError:
+            raise ValidationError({'days': 'Must be a number of days'})
+        # Every track costs up to 26 sketches of 4 KB to merge
+        limit = getattr(settings, 'ANALYTICS_MAX_TRACKS', 50)
+        tracks = list(
+            Track.objects.filter(artist=request.user).order_by('-created_at')
+            .values('id', 'title', 'views', 'downloads', 'likes_count')[:limit + 1]
+        )
+        truncated = len(tracks) > limit
+        tracks = tracks[:limit]
+        pks = [track['id'] for track in tracks]
+        since = timezone.localdate() - timedelta(days=days - 1)
+        all_time, all_time_total = sketches.audience(Track, pks)
+        recent, recent_total = sketches.audience(Track, pks, since=since)
+        for track in tracks:
+            track['unique_listeners'] = all_time[track['id']]
+            track['recent_unique_listeners'] = recent[track['id']]
+        return Response({
+            'days': days,
+            'truncated': truncated,
+            'unique_listeners': all_time_total,
+            'recent_unique_listeners': recent_total,
+            'tracks': tracks,
+        })
     
 
-class PlaylistViewSet(viewsets.ModelViewSet):
+class PlaylistViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Playlist.objects.all()
     serializer_class = PlaylistSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -457,7 +610,7 @@ class PlaylistViewSet(viewsets.ModelViewSet):
 
 
 
-class ProfileViewSet(viewsets.ModelViewSet):
+class ProfileViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -493,12 +646,10 @@ class ProfileViewSet(viewsets.ModelViewSet):
         # Pass the request to the serializer context
         serializer = ProfileSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            print("Serializer data is valid:", serializer.validated_data)  # Debug log
             serializer.save()  # Save will now correctly handle user
-            print("Profile created successfully")  # Debug log
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        print("Serializer errors:", serializer.errors)  # Debug log
+        logger.debug("Profile rejected: %s", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -550,40 +701,25 @@ class ProfileViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            result = upload(
-                serializer.validated_data['avatar'],
-                folder='profiles',
-                resource_type='image',
-                transformation=[
-                    {'width': 500, 'height': 500, 'crop': 'fill', 'gravity': 'face'},
-                    {'quality': 'auto', 'fetch_format': 'auto'}
-                ]
-            )
-            
-            # Store both public_id and URL for flexibility
-            request.user.profile.picture = {
-                'public_id': result['public_id'],
-                'secure_url': result['secure_url']
-            }
-            request.user.profile.save()
-            
-            return Response(
-                self.get_serializer(request.user.profile).data,
-                status=status.HTTP_200_OK
-            )
-        except CloudinaryError as e:
-            logger.error(f"Cloudinary upload failed: {str(e)}")
-            return Response(
-                {'error': 'Failed to upload image to Cloudinary'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-class CommentViewSet(viewsets.ModelViewSet):
+        profile = request.user.profile
+        uploads.schedule(
+            uploads.upload_profile_picture,
+            profile.id,
+            uploads.spool(serializer.validated_data['avatar']),
+            'profiles',
+            [
+                {'width': 500, 'height': 500, 'crop': 'fill', 'gravity': 'face'},
+                {'quality': 'auto', 'fetch_format': 'auto'}
+            ]
+        )
+        return Response(
+            dict(self.get_serializer(profile).data, upload_status=UPLOAD_PENDING),
+            status=status.HTTP_202_ACCEPTED
+        )
+class CommentViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    pagination_class = PageNumberPagination
-    page_size = 20
 
     def get_queryset(self):
         track_id = self.kwargs.get('track_pk')
@@ -591,11 +727,11 @@ class CommentViewSet(viewsets.ModelViewSet):
             return Comment.objects.filter(track_id=track_id)
         return Comment.objects.all()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         track_id = self.kwargs.get('track_pk')
         track = get_object_or_404(Track, id=track_id)
-        serializer.save(user=self.request.user, track=track)
-        comment = serializer.save(user=self.request.user, track=track)  # <-- This line was missing
+        comment = serializer.save(user=self.request.user, track=track)
 
         if comment.user != track.artist:
             Notification.objects.create(
@@ -605,7 +741,7 @@ class CommentViewSet(viewsets.ModelViewSet):
                 notification_type='comment',
                 track=track
             )
-class LikeViewSet(viewsets.ModelViewSet):
+class LikeViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Like.objects.all()
     serializer_class = LikeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -614,10 +750,12 @@ class LikeViewSet(viewsets.ModelViewSet):
         return self.queryset.filter(user=self.request.user)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedListMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('name',)
+    cache_namespace = caching.CATEGORIES
 
 
 class FavoriteTracksView(APIView):
@@ -629,7 +767,7 @@ class FavoriteTracksView(APIView):
         serializer = TrackSerializer(favorite_tracks, many=True, context={"request": request})
         return Response(serializer.data, status=200)
 
-class SocialPostViewSet(viewsets.ModelViewSet):
+class SocialPostViewSet(AsyncViewMixin, ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = SocialPost.objects.select_related(
         'user', 
         # 'user__avatar',  
@@ -650,10 +788,7 @@ class SocialPostViewSet(viewsets.ModelViewSet):
         user_queryset = User.objects.annotate(
             followers_count=Count('followers', distinct=True)
         )
-        return SocialPost.objects.annotate(
-            likes_count=Count('likes', distinct=True),
-            comments_count=Count('comments', distinct=True)
-        ).select_related('song').prefetch_related(
+        return SocialPost.objects.select_related('song').prefetch_related(
             Prefetch('user', queryset=user_queryset)  # Prefetch with annotation
         ).order_by('-created_at')
     # Add this to ensure request context is available in serializers
@@ -671,34 +806,33 @@ class SocialPostViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         try:
             # Create the post with the authenticated user
-            logger.info(f"Creating post with data: {serializer.validated_data}")
+            logger.debug("Creating post with data: %s", serializer.validated_data)
             post = serializer.save(user=self.request.user)
+            fan_out_post(post)
             if post.media_file:
-                logger.info(f"Created post ID {post.id} with media_file: {post.media_file}")
-                logger.info(f"Media type: {post.content_type}, Size: {post.width}x{post.height}")
+                logger.info("Created post ID %s with media_file: %s", post.id, post.media_file)
+                logger.debug("Media type: %s, Size: %sx%s", post.content_type, post.width, post.height)
             return post
 
         except ValidationError as ve:
-            logger.warning(f"Validation error: {ve}")
+            logger.warning("Validation error: %s", ve)
             raise
         except Exception as e:
-            logger.exception("Post creation failed with exception:")
-            logger.error(f"Post creation failed: {str(e)}", exc_info=True)
-            # Log the serializer data that caused the error
-            logger.error(f"Error data: {serializer.validated_data}")
-            
-            # Also log the request data
-            logger.error(f"Request data: {self.request.data}")
+            logger.exception("Post creation failed: %s", e)
+            # The data that caused the error
+            logger.debug("Error data: %s", serializer.validated_data)
+            logger.debug("Request data: %s", self.request.data)
             raise ValidationError({
                 "non_field_errors": [f"Failed to create post: {str(e)}"]
             })
     
     def get_queryset(self):
-        return SocialPost.objects.annotate(
-            # Add annotations for counts to reduce queries
-            likes_count=Count('likes', distinct=True),
-            comments_count=Count('comments', distinct=True)
-        ).select_related('user', 'song').order_by('-created_at')
+        # likes/comments counts are stored on the row, no annotation needed
+        queryset = SocialPost.objects.select_related('user', 'song').order_by('-created_at')
+        if self.action == 'list':
+            # Posts still uploading (or failed) are only reachable by id
+            queryset = queryset.filter(upload_status=UPLOAD_READY)
+        return queryset
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -753,60 +887,67 @@ class SocialPostViewSet(viewsets.ModelViewSet):
                 
                 try:
                     destroy(public_id, resource_type=resource_type)
-                    logger.info(f"Deleted Cloudinary {resource_type}: {public_id}")
+                    logger.info("Deleted Cloudinary %s: %s", resource_type, public_id)
                 except Exception as e:
-                    logger.error(f"Cloudinary deletion failed: {str(e)}")
+                    logger.error("Cloudinary deletion failed: %s", e)
                     # Continue with DB deletion even if Cloudinary fails
         
         except Exception as e:
-            logger.error(f"Error during post deletion: {str(e)}", exc_info=True)
+            logger.error("Error during post deletion: %s", e, exc_info=True)
         
         instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     # Keep all your existing methods but add this optimization:
     def list(self, request, *args, **kwargs):
         # Add pagination and field selection
-        page = self.paginate_queryset(self.get_queryset())
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = self.get_serializer(self.get_queryset(), many=True)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    async def feed(self, request):
+        """Home timeline of the current user, read from the precomputed feed table"""
+        entries = FeedEntry.objects.filter(recipient=request.user).select_related('post')
+        paginator = CreatedAtCursorPagination()
+        page = await sync_to_async(paginator.paginate_queryset)(entries, request, view=self)
+        posts = [entry.post for entry in page]
+        await prefetching.aprefetch_objects(posts, self.get_serializer())
+        serializer = await sync_to_async(self.get_serializer)(posts, many=True)
+        return paginator.get_paginated_response(await serializer_data(serializer))
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
         post = self.get_object()
         user = request.user
         
-        # Check if like exists
-        like_exists = PostLike.objects.filter(post=post, user=user).exists()
-        
-        if like_exists:
-            # Unlike the post
-            PostLike.objects.filter(post=post, user=user).delete()
-            liked = False
-        else:
-            # Like the post
-            PostLike.objects.create(post=post, user=user)
-            liked = True
-            
-            # Create notification only when liking (not unliking)
-            if user != post.user:  # Don't notify self
-                Notification.objects.create(
-                    recipient=post.user,
-                    sender=user,
-                    message=f"{user.username} liked your post",
-                    notification_type='like',
-                    post=post
-                )
+        with transaction.atomic():
+            # Unlike the post if a like exists, the counter follows via signals
+            deleted, _ = PostLike.objects.filter(post=post, user=user).delete()
+            liked = not deleted
+            if liked:
+                PostLike.objects.create(post=post, user=user)
+
+                # Create notification only when liking (not unliking)
+                if user != post.user:  # Don't notify self
+                    Notification.objects.create(
+                        recipient=post.user,
+                        sender=user,
+                        message=f"{user.username} liked your post",
+                        notification_type='like',
+                        post=post
+                    )
         
         # Get updated like count
-        likes_count = PostLike.objects.filter(post=post).count()
+        post.refresh_from_db(fields=['likes_count'])
         
         return Response({
             'status': 'success',
-            'likes_count': likes_count,
+            'likes_count': post.likes_count,
             'is_liked': liked
         }, status=status.HTTP_200_OK)
 
@@ -816,7 +957,8 @@ class SocialPostViewSet(viewsets.ModelViewSet):
         serializer = PostCommentSerializer(data=request.data, context={'request': request})
         
         if serializer.is_valid():
-            comment = serializer.save(user=request.user, post=post)
+            with transaction.atomic():
+                comment = serializer.save(user=request.user, post=post)
             
             # Create notification if commenter is not the post owner
             if request.user != post.user:
@@ -837,7 +979,8 @@ class SocialPostViewSet(viewsets.ModelViewSet):
         post = self.get_object()
         user = request.user
         
-        save_obj, created = PostSave.objects.get_or_create(user=user, post=post)
+        with transaction.atomic():
+            save_obj, created = PostSave.objects.get_or_create(user=user, post=post)
         
         if created:
             return Response(
@@ -877,57 +1020,41 @@ class SocialPostViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_200_OK)
 
 
-class SocialPostUploadView(APIView):
+class SocialPostUploadView(AsyncViewMixin, APIView):
     """Alternative view for handling file uploads directly to Cloudinary"""
     parser_classes = [MultiPartParser]
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        serializer = SocialPostUploadSerializer(data=request.data)
+    async def post(self, request):
+        serializer = SocialPostUploadSerializer(data=await request_data(request))
         if serializer.is_valid():
-            try:
-                # Determine content type from file
-                media_file = serializer.validated_data['media_file']
-                content_type = 'video' if media_file.content_type.startswith('video/') else 'image'
-                
-                # Upload to Cloudinary
-                result = upload(
-                    media_file,
-                    folder='social_media',
-                    resource_type='auto',
-                    # transformation=[
-                    #     {'quality': 'auto'},
-                    #     {'fetch_format': 'auto'}
-                    # ]
-                )
-                
-                # Create post with Cloudinary public_id
-                post_data = {
-                    'content_type': content_type,
-                    'media_file': result['public_id'],
-                    'caption': serializer.validated_data.get('caption', ''),
-                    'tags': serializer.validated_data.get('tags', ''),
-                    'location': serializer.validated_data.get('location', ''),
-                    'duration': serializer.validated_data.get('duration', None),
-                    'width': result.get('width'),
-                    'height': result.get('height'),
-                }
-                
-                post_serializer = SocialPostSerializer(data=post_data, context={'request': request})
-                if post_serializer.is_valid():
-                    post = post_serializer.save(user=request.user)
-                    return Response(post_serializer.data, status=status.HTTP_201_CREATED)
-                return Response(post_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-                
-            except CloudinaryError as e:
-                return Response(
-                    {'error': str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            # Determine content type from file
+            media_file = serializer.validated_data['media_file']
+            content_type = 'video' if media_file.content_type.startswith('video/') else 'image'
+
+            # Created pending; the upload task stores the media, marks the
+            # post ready and only then fans it out to followers
+            post_data = {
+                'content_type': content_type,
+                'caption': serializer.validated_data.get('caption', ''),
+                'tags': serializer.validated_data.get('tags', ''),
+                'location': serializer.validated_data.get('location', ''),
+                'duration': serializer.validated_data.get('duration', None),
+            }
+            post_serializer = SocialPostSerializer(data=post_data, context={'request': request})
+            if await sync_to_async(post_serializer.is_valid)():
+                await sync_to_async(self.create_pending)(post_serializer, request.user, media_file)
+                return Response(await serializer_data(post_serializer), status=status.HTTP_202_ACCEPTED)
+            return Response(post_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
+    def create_pending(self, post_serializer, user, media_file):
+        post = post_serializer.save(user=user, upload_status=UPLOAD_PENDING)
+        uploads.schedule(uploads.upload_post_media, post.id, uploads.spool(media_file))
+
 
-class PostLikeViewSet(viewsets.ModelViewSet):
+class PostLikeViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = PostLike.objects.all()
     serializer_class = PostLikeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -936,7 +1063,7 @@ class PostLikeViewSet(viewsets.ModelViewSet):
         return self.queryset.filter(user=self.request.user)
 
 
-class PostCommentViewSet(viewsets.ModelViewSet):
+class PostCommentViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = PostComment.objects.all()
     serializer_class = PostCommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -947,6 +1074,7 @@ class PostCommentViewSet(viewsets.ModelViewSet):
             return PostComment.objects.filter(post__id=post_id)
         return super().get_queryset()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         post_id = self.kwargs.get('post_pk')
         try:
@@ -965,7 +1093,7 @@ class PostCommentViewSet(viewsets.ModelViewSet):
             )
 
 
-class PostSaveViewSet(viewsets.ModelViewSet):
+class PostSaveViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = PostSave.objects.all()
     serializer_class = PostSaveSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -973,7 +1101,7 @@ class PostSaveViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -993,6 +1121,11 @@ class NotificationViewSet(viewsets.ModelViewSet):
         context['request'] = self.request
         return context
 
+    def get_viewer_context(self, objects):
+        context = super().get_viewer_context(objects)
+        context['related_comments'] = NotificationSerializer.related_comments(objects)
+        return context
+
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
@@ -1001,22 +1134,34 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 {'error': 'You can only mark your own notifications as read'},
                 status=status.HTTP_403_FORBIDDEN
             )
-        notification.read = True
-        notification.save()
+        # Conditional update so a repeated call cannot decrement twice
+        updated = Notification.objects.filter(pk=notification.pk, read=False).update(read=True)
+        if updated:
+            transaction.on_commit(lambda: adjust_unread_count(request.user.id, -updated))
         return Response({'status': 'notification marked as read'})
 
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        updated = Notification.objects.filter(recipient=request.user, read=False).update(read=True)
+        transaction.on_commit(lambda: reset_unread_count(request.user.id))
+        return Response({'status': 'notifications marked as read', 'updated': updated})
+
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        count = Notification.objects.filter(
-            recipient=request.user, 
-            read=False
-        ).count()
-        return Response({'unread_count': count})
+        return Response({'unread_count': get_unread_count(request.user.id)})
 
-class ChurchViewSet(viewsets.ModelViewSet):
+    def perform_update(self, serializer):
+        was_read = serializer.instance.read
+        notification = serializer.save()
+        if notification.read != was_read:
+            delta = -1 if notification.read else 1
+            transaction.on_commit(lambda: adjust_unread_count(notification.recipient_id, delta))
+
+class ChurchViewSet(CachedListMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Church.objects.all()
     serializer_class = ChurchSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_namespace = caching.CHURCHES
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -1047,7 +1192,7 @@ class ChurchViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def my_churches(self, request):
-        churches = Church.objects.filter(created_by=request.user)
+        churches = self.planned(Church.objects.filter(created_by=request.user))
         serializer = self.get_serializer(churches, many=True)
         return Response(serializer.data)
 
@@ -1057,10 +1202,11 @@ class ChurchViewSet(viewsets.ModelViewSet):
 
 from rest_framework.exceptions import PermissionDenied
 
-class VideoStudioViewSet(viewsets.ModelViewSet):
+class VideoStudioViewSet(CachedListMixin, ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Videostudio.objects.all().order_by('-created_at')
     serializer_class = VideoStudioSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_namespace = caching.VIDEO_STUDIOS
 
      
     def create(self, request, *args, **kwargs):
@@ -1100,14 +1246,15 @@ class VideoStudioViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def my_videostudios(self, request):
-        studios = Videostudio.objects.filter(created_by=request.user)
+        studios = self.planned(Videostudio.objects.filter(created_by=request.user))
         serializer = self.get_serializer(studios, many=True)
         return Response(serializer.data)
 
-class ChoirViewSet(viewsets.ModelViewSet):
+class ChoirViewSet(CachedListMixin, ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Choir.objects.all().order_by('-created_at')
     serializer_class = ChoirSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_namespace = caching.CHOIRS
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -1144,7 +1291,7 @@ class ChoirViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def my_choirs(self, request):
-        choirs = Choir.objects.filter(created_by=request.user)
+        choirs = self.planned(Choir.objects.filter(created_by=request.user))
         serializer = self.get_serializer(choirs, many=True)
         return Response(serializer.data)
 
@@ -1224,7 +1371,7 @@ class IsGroupCreator(BasePermission):
         return obj.creator == request.user
 
 @method_decorator(cache_control(no_cache=True, no_store=True, must_revalidate=True), name='dispatch')
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Group.objects.all().order_by('-created_at')
     serializer_class = GroupSerializer
     permission_classes = [IsAuthenticated]
@@ -1381,31 +1528,14 @@ class GroupViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        try:
-            # Upload to Cloudinary
-            result = upload(
-                request.FILES['cover_image'],
-                folder='group_covers',
-                resource_type='image',
-                transformation=[
-                    {'width': 1200, 'height': 630, 'crop': 'fill'},
-                    {'quality': 'auto'}
-                ]
-            )
-            # Save to group
-            group.cover_image = result['public_id']
-            group.save()
-            return Response(
-                GroupSerializer(group, context={'request': request}).data,
-                status=status.HTTP_200_OK
-            )
-        except CloudinaryError as e:
-            return Response(
-                {"error": str(e)},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # The cover is swapped in by the upload task once it is stored
+        uploads.schedule(uploads.upload_group_cover, group.id, uploads.spool(request.FILES['cover_image']))
+        return Response(
+            dict(GroupSerializer(group, context={'request': request}).data, upload_status=UPLOAD_PENDING),
+            status=status.HTTP_202_ACCEPTED
+        )
 
-class GroupPostViewSet(viewsets.ModelViewSet):
+class GroupPostViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = GroupPost.objects.all()
     serializer_class = GroupPostSerializer
     permission_classes = [IsAuthenticated]
@@ -1425,8 +1555,14 @@ class GroupPostViewSet(viewsets.ModelViewSet):
         
         post = serializer.save(user=self.request.user, group=group)
         
-        # Handle attachments
-        for file in self.request.FILES.getlist('attachments'):
+        # Handle attachments: uploaded concurrently, then inserted in one go
+        uploaded, self.failed_uploads = uploads.upload_many(
+            self.request.FILES.getlist('attachments'),
+            timezone.now().strftime('group_posts/%Y/%m/%d'),
+            'auto'
+        )
+        attachments = []
+        for file, result in uploaded:
             mime_type, _ = mimetypes.guess_type(file.name)
             file_type = 'document'
             if mime_type:
@@ -1436,12 +1572,12 @@ class GroupPostViewSet(viewsets.ModelViewSet):
                     file_type = 'video'
                 elif mime_type.startswith('audio/'):
                     file_type = 'audio'
-            
-            GroupPostAttachment.objects.create(
+            attachments.append(GroupPostAttachment(
                 post=post,
-                file=file,
+                file=uploads.stored_value(result),
                 file_type=file_type
-            )
+            ))
+        GroupPostAttachment.objects.bulk_create(attachments)
         return post  # Make sure to return the post object
 
     def create(self, request, *args, **kwargs):
@@ -1454,7 +1590,10 @@ class GroupPostViewSet(viewsets.ModelViewSet):
         # Serialize the complete post with attachments
         complete_serializer = self.get_serializer(post)
         headers = self.get_success_headers(complete_serializer.data)
-        return Response(complete_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        data = complete_serializer.data
+        if self.failed_uploads:
+            data = dict(data, failed_uploads=self.failed_uploads)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -1470,7 +1609,7 @@ class GroupPostViewSet(viewsets.ModelViewSet):
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class GroupJoinRequestViewSet(viewsets.ModelViewSet):
+class GroupJoinRequestViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = GroupJoinRequest.objects.all()
     serializer_class = GroupJoinRequestSerializer
     permission_classes = [IsAuthenticated]
@@ -1522,7 +1661,7 @@ class GroupJoinRequestViewSet(viewsets.ModelViewSet):
 
 
 # Add to existing views.py
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(HitCountMixin, ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by('-created_at')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -1535,24 +1674,24 @@ class ProductViewSet(viewsets.ModelViewSet):
             try:
                 queryset = queryset.filter(seller__id=seller_id)
             except ValueError:
-                logger.warning(f"Invalid seller ID: {seller_id}")
+                logger.warning("Invalid seller ID: %s", seller_id)
                 return queryset.none()
         return queryset
 
     def list(self, request, *args, **kwargs):
         try:
-            logger.debug(f"Listing products with query params: {request.query_params}")
+            logger.debug("Listing products with query params: %s", request.query_params)
             return super().list(request, *args, **kwargs)
         except Exception as e:
-            logger.error(f"Error listing products: {str(e)}", exc_info=True)
+            logger.error("Error listing products: %s", e, exc_info=True)
             return Response(
                 {"error": f"An unexpected error occurred while fetching products: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     def create(self, request, *args, **kwargs):
-        logger.debug(f"Received product creation request: {request.data}")
-        logger.debug(f"FILES: {request.FILES}")
+        logger.debug("Received product creation request: %s", request.data)
+        logger.debug("FILES: %s", request.FILES)
         if not request.user.is_authenticated:
             logger.error("Unauthenticated user attempted to create a product")
             return Response(
@@ -1562,7 +1701,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         try:
             return super().create(request, *args, **kwargs)
         except Exception as e:
-            logger.error(f"Error creating product: {str(e)}", exc_info=True)
+            logger.error("Error creating product: %s", e, exc_info=True)
             return Response(
                 {"error": f"An unexpected error occurred while creating the product: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -1574,7 +1713,7 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def upload_images(self, request, slug=None):
-        logger.debug(f"Received image upload request for slug {slug}: {request.FILES}")
+        logger.debug("Received image upload request for slug %s: %s", slug, request.FILES)
         try:
             product = self.get_object()
             if product.seller != request.user:
@@ -1583,25 +1722,35 @@ class ProductViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
             images = request.FILES.getlist('images')
-            for image in images:
-                ProductImage.objects.create(product=product, image=image)
+            with transaction.atomic():
+                pending = ProductImage.objects.bulk_create([
+                    ProductImage(product=product, image='', upload_status=UPLOAD_PENDING)
+                    for _ in images
+                ])
+                for product_image, image in zip(pending, images):
+                    uploads.schedule(uploads.upload_product_image, product_image.id, uploads.spool(image))
             return Response(
-                {"status": "Images uploaded successfully"},
-                status=status.HTTP_201_CREATED
+                {
+                    "status": "Images accepted for upload",
+                    "images": ProductImageSerializer(pending, many=True, context={'request': request}).data
+                },
+                status=status.HTTP_202_ACCEPTED
             )
         except Exception as e:
-            logger.error(f"Error uploading images: {str(e)}", exc_info=True)
+            logger.error("Error uploading images: %s", e, exc_info=True)
             return Response(
                 {"error": f"An unexpected error occurred while uploading images: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class ProductCategoryViewSet(viewsets.ModelViewSet):
+class ProductCategoryViewSet(CachedListMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('name',)
+    cache_namespace = caching.PRODUCT_CATEGORIES
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -1621,7 +1770,7 @@ class CartViewSet(viewsets.ModelViewSet):
             )
     @action(detail=False, methods=['get'])
     def my_cart(self, request):
-        cart = get_object_or_404(Cart, user=request.user)
+        cart = get_object_or_404(self.planned(Cart.objects.filter(user=request.user)))
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
     
@@ -1692,7 +1841,7 @@ class CartViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -1723,7 +1872,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             status=status.HTTP_403_FORBIDDEN
         )
 
-class ProductReviewViewSet(viewsets.ModelViewSet):
+class ProductReviewViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = ProductReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     
@@ -1737,7 +1886,7 @@ class ProductReviewViewSet(viewsets.ModelViewSet):
         product = get_object_or_404(Product, id=self.kwargs.get('product_pk'))
         serializer.save(reviewer=self.request.user, product=product)
 
-class WishlistViewSet(viewsets.ModelViewSet):
+class WishlistViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -1786,10 +1935,12 @@ class WishlistViewSet(viewsets.ModelViewSet):
 
 
 
-class LiveEventViewSet(viewsets.ModelViewSet):
+class LiveEventViewSet(AsyncViewMixin, HitCountMixin, ViewerStateMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = LiveEvent.objects.all().order_by('-start_time')
     serializer_class = LiveEventSerializer
+    hit_counter = 'viewers_count'
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('-start_time', '-id')
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -1802,29 +1953,26 @@ class LiveEventViewSet(viewsets.ModelViewSet):
                 Q(end_time__gte=twenty_four_hours_ago) |  # Changed from start_time
                 Q(end_time__isnull=True, start_time__gte=twenty_four_hours_ago)
             )
-        
-        # Add debug logging
-        logger.info(f"Final queryset SQL: {str(queryset.query)}")
-        logger.info(f"Found {queryset.count()} events")
-        
+
         return queryset.select_related('user')
     
-    def create(self, request, *args, **kwargs):
+    async def create(self, request, *args, **kwargs):
         """Enhanced create with comprehensive logging"""
-        logger.info(f"Creating live event with data: {request.data}")
+        data = await request_data(request)
+        logger.debug("Creating live event with data: %s", data)
         
         try:
             # Validate input
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
+            serializer = self.get_serializer(data=data)
+            await sync_to_async(serializer.is_valid)(raise_exception=True)
             
             # Check for existing active events
-            active_events = LiveEvent.objects.filter(
+            active_events = await LiveEvent.objects.filter(
                 user=request.user,
                 is_live=True
-            ).count()
+            ).acount()
             
-            logger.info(f"User {request.user.id} has {active_events} active events")
+            logger.debug("User %s has %s active events", request.user.id, active_events)
             
             if active_events > 0:
                 logger.warning("User already has an active live event")
@@ -1838,23 +1986,23 @@ class LiveEventViewSet(viewsets.ModelViewSet):
             video_id = LiveEvent.extract_youtube_id(youtube_url)
             
             if not video_id:
-                logger.error(f"Invalid YouTube URL: {youtube_url}")
+                logger.error("Invalid YouTube URL: %s", youtube_url)
                 raise serializers.ValidationError({
                     'youtube_url': 'Invalid YouTube URL format'
                 })
             
             # Create the event
-            logger.info("Creating new live event")
-            self.perform_create(serializer)
+            logger.debug("Creating new live event")
+            await sync_to_async(self.perform_create)(serializer)
             instance = serializer.instance
             
             # Ensure we have the saved instance
             if not instance.id:
                 logger.warning("Instance not saved, trying to retrieve")
-                instance = LiveEvent.objects.filter(
+                instance = await LiveEvent.objects.filter(
                     youtube_url=youtube_url,
                     user=request.user
-                ).order_by('-start_time').first()
+                ).order_by('-start_time').afirst()
             
             if not instance:
                 logger.error("Failed to create or retrieve event")
@@ -1863,17 +2011,17 @@ class LiveEventViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
-            logger.info(f"Successfully created event ID {instance.id}")
+            logger.info("Successfully created event ID %s", instance.id)
             
             # Return response
             return Response(
-                self.get_serializer(instance).data,
+                await serializer_data(self.get_serializer(instance)),
                 status=status.HTTP_201_CREATED,
-                headers=self.get_success_headers(serializer.data)
+                headers=self.get_success_headers(await serializer_data(serializer))
             )
             
         except Exception as e:
-            logger.error(f"Error creating live event: {str(e)}", exc_info=True)
+            logger.error("Error creating live event: %s", e, exc_info=True)
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_400_BAD_REQUEST
@@ -1884,8 +2032,8 @@ class LiveEventViewSet(viewsets.ModelViewSet):
         youtube_url = serializer.validated_data['youtube_url']
         video_id = LiveEvent.extract_youtube_id(youtube_url)
         
-        # Generate thumbnail URL
-        thumbnail = f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"
+        # Default thumbnail; upgraded in the background after commit
+        thumbnail = thumbnail_url(video_id)
         
         serializer.save(
             user=self.request.user,
@@ -1899,19 +2047,25 @@ class LiveEventViewSet(viewsets.ModelViewSet):
     def featured(self, request):
         """Simplified featured events endpoint"""
         try:
-            # Get active events (live or recently started)
-            featured = self.get_queryset().filter(
-                Q(is_live=True) |
-                Q(start_time__gte=timezone.now() - timedelta(hours=24))
-            ).order_by('-viewers_count')[:6]
+            # Get active events (live or recently started). The events are
+            # cached rather than the payload, since is_owner depends on the viewer.
+            featured = caching.get_or_compute(
+                caching.FEATURED_LIVE_EVENTS,
+                request.get_full_path(),
+                lambda: list(self.planned(self.get_queryset()).filter(
+                    Q(is_live=True) |
+                    Q(start_time__gte=timezone.now() - timedelta(hours=24))
+                ).order_by('-viewers_count')[:6]),
+                timeout=60
+            )
             
-            logger.info(f"Found {featured.count()} featured events")
+            logger.debug("Found %s featured events", len(featured))
             
             serializer = self.get_serializer(featured, many=True)
             return Response(serializer.data)
             
         except Exception as e:
-            logger.error(f"Error getting featured events: {str(e)}")
+            logger.error("Error getting featured events: %s", e)
             return Response(
                 {"error": "Failed to load featured events"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -1919,11 +2073,61 @@ class LiveEventViewSet(viewsets.ModelViewSet):
     
     def list(self, request, *args, **kwargs):
         """Enhanced list with debugging"""
-        logger.info("Listing live events")
+        logger.debug("Listing live events")
         try:
             response = super().list(request, *args, **kwargs)
-            logger.info(f"Returning {len(response.data)} events")
+            logger.debug("Returning %s events", len(response.data['results']))
             return response
         except Exception as e:
-            logger.error(f"Error listing events: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error listing events: %s", e)
+            raise
+
+class SearchView(APIView):
+    """
+    One search box over churches, choirs, video studios, groups, products,
+    live events and users: hits matching ?q= of every kind (or of the
+    comma-separated ?kind=), best match first, in one ranked stream.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This parameter is required.'})
+        kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+        unknown = set(kinds) - set(search.ENTRY_SOURCES)
+        if unknown:
+            raise ValidationError({'kind': f"Unknown kind(s): {', '.join(sorted(unknown))}."})
+        queryset = search.search_entries(text, request.user, kinds)
+        paginator = SearchRankCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(SearchEntrySerializer(page, many=True).data)
+
+
+class AutocompleteView(APIView):
+    """
+    Typeahead for ?q=: users by username, tracks and products by title (or
+    a word in it), up to ?limit= (1-20, default 10) of each ?kind= asked
+    for (comma-separated; all by default). Served from the worker's
+    in-memory prefix index, see songs.autocomplete.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        prefix = request.query_params.get('q', '').strip()
+        if not prefix:
+            raise ValidationError({'q': 'This parameter is required.'})
+        kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+        unknown = set(kinds) - set(autocomplete.SOURCES)
+        if unknown:
+            raise ValidationError({'kind': f"Unknown kind(s): {', '.join(sorted(unknown))}."})
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 20)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be a number of results'})
+        results = [
+            {'kind': kind, 'id': pk, 'lookup': lookup, 'label': label}
+            for kind in kinds or autocomplete.SOURCES
+            for pk, label, lookup in autocomplete.complete(kind, prefix, limit)
+        ]
+        return Response({'results': results})